@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+向量化聚合
+把测试数据一次性转换为DataFrame，用pandas/NumPy批量计算各维度统计量
+"""
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DIMENSIONS
+
+# DataFrame中的非维度列
+META_COLUMNS = ['date', 'mainRoute', 'deviceType', 'completionMinutes']
+
+PERCENTILES = [0.25, 0.75, 0.9, 0.99]
+
+
+def build_frame(records):
+    """
+    把 Submission 列表转换为一个DataFrame（只遍历一次）
+
+    每行一条测试数据：日期、主路线、设备类型、完成时长(分钟)以及各维度得分，
+    缺失的字段为空值。维度得分直接由各记录的定长数组拼成矩阵。
+    """
+    records = list(records)
+    completion = [np.nan if record.completion_time is None else record.completion_time for record in records]
+
+    frame = pd.DataFrame({
+        'date': [record.date for record in records],
+        'mainRoute': [record.main_route for record in records],
+        'deviceType': [record.device_type for record in records],
+        'completionMinutes': np.array(completion, dtype=float) / 1000 / 60
+    })
+    scores = np.array([record.scores for record in records], dtype=float).reshape(-1, len(DIMENSIONS))
+    return pd.concat([frame, pd.DataFrame(scores, columns=DIMENSIONS)], axis=1)
+
+
+def dimension_columns(frame):
+    """返回DataFrame中的维度列（按固定顺序）"""
+    return [col for col in frame.columns if col not in META_COLUMNS]
+
+
+def describe_dimensions(frame):
+    """
+    批量计算每个维度的统计量
+
+    Returns:
+        {维度: {average, min, max, median, std, p25, p75, p90, p99, count}}
+    """
+    scores = frame[dimension_columns(frame)]
+    if scores.empty:
+        return {}
+
+    quantiles = scores.quantile(PERCENTILES)
+    table = pd.DataFrame({
+        'average': scores.mean(),
+        'min': scores.min(),
+        'max': scores.max(),
+        'median': scores.median(),
+        'std': scores.std(ddof=0),
+        'p25': quantiles.loc[0.25],
+        'p75': quantiles.loc[0.75],
+        'p90': quantiles.loc[0.9],
+        'p99': quantiles.loc[0.99],
+        'count': scores.count()
+    })
+    table = table[table['count'] > 0]
+
+    stats = {}
+    for dim, row in table.iterrows():
+        stats[dim] = {key: (int(value) if key == 'count' else round(float(value), 2)) for key, value in row.items()}
+    return stats
+
+
+def value_distribution(series):
+    """统计一列的取值分布（忽略空值）"""
+    return {key: int(count) for key, count in series.dropna().value_counts().items()}
+
+
+def describe_completion_time(frame):
+    """完成时长统计（分钟），没有数据时返回None"""
+    minutes = frame['completionMinutes'].dropna()
+    if minutes.empty:
+        return None
+
+    return {
+        'average_minutes': round(float(minutes.mean()), 2),
+        'min_minutes': round(float(minutes.min()), 2),
+        'max_minutes': round(float(minutes.max()), 2),
+        'median_minutes': round(float(minutes.median()), 2),
+        'p90_minutes': round(float(minutes.quantile(0.9)), 2),
+        'p99_minutes': round(float(minutes.quantile(0.99)), 2)
+    }
+
+
+def describe_value_counts(counts):
+    """
+    根据 {取值: 次数} 计算与 describe_dimensions 相同的统计量
+
+    流式导出时每个维度只保留取值分布（得分取值有限），
+    内存占用与数据条数无关，分位数与pandas的线性插值结果一致。
+    """
+    if not counts:
+        return None
+
+    values = np.array(sorted(counts), dtype=float)
+    weights = np.array([counts[value] for value in sorted(counts)], dtype=float)
+    total = int(weights.sum())
+    cumulative = np.cumsum(weights)
+    mean = float((values * weights).sum() / total)
+
+    def quantile(q):
+        position = (total - 1) * q
+        lower = int(np.floor(position))
+        upper = int(np.ceil(position))
+        lower_value = values[np.searchsorted(cumulative, lower, side='right')]
+        upper_value = values[np.searchsorted(cumulative, upper, side='right')]
+        fraction = position - lower
+        # 与NumPy的线性插值写法一致，避免舍入差异
+        if fraction >= 0.5:
+            return float(upper_value - (upper_value - lower_value) * (1 - fraction))
+        return float(lower_value + (upper_value - lower_value) * fraction)
+
+    return {
+        'average': round(mean, 2),
+        'min': round(float(values[0]), 2),
+        'max': round(float(values[-1]), 2),
+        'median': round(quantile(0.5), 2),
+        'std': round(float(np.sqrt((weights * (values - mean) ** 2).sum() / total)), 2),
+        'p25': round(quantile(0.25), 2),
+        'p75': round(quantile(0.75), 2),
+        'p90': round(quantile(0.9), 2),
+        'p99': round(quantile(0.99), 2),
+        'count': total
+    }
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+规模基准测试
+在临时目录中生成不同规模的合成数据，逐个运行数据处理脚本，
+记录耗时、峰值内存、打开文件数和读取字节数，结果写入JSON文件
+
+用法:
+  python scripts/benchmark.py --scales 1000,10000
+  python scripts/benchmark.py --scales 100000 --scripts update_summary,export_to_excel --output bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from generate_synthetic_data import generate_payloads, write_payloads
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+# (脚本名, 参数)，按顺序运行；清理会删除数据，放在最后
+BENCHMARK_SCRIPTS = [
+    ('update_summary', []),
+    ('generate_daily_report', ['--force']),
+    ('export_to_excel', ['--force']),
+    ('export_to_excel_streaming', ['--force', '--streaming']),
+    ('cleanup_old_data', ['--days', '30'])
+]
+
+# 在子进程中运行脚本的包装代码：用审计钩子统计打开的文件数，退出时记录 /proc/self/io 中的读取字节数
+RUNNER = '''
+import atexit, json, os, runpy, sys
+stats_file, script = sys.argv[1], sys.argv[2]
+opened = [0]
+def audit(event, args):
+    if event == 'open':
+        opened[0] += 1
+def report():
+    read_bytes = None
+    try:
+        with open('/proc/self/io') as f:
+            read_bytes = int(next(line for line in f if line.startswith('rchar:')).split()[1])
+    except (OSError, StopIteration):
+        pass
+    with open(stats_file, 'w') as f:
+        json.dump({'files_opened': opened[0], 'bytes_read': read_bytes}, f)
+sys.addaudithook(audit)
+atexit.register(report)
+sys.argv = sys.argv[2:]
+sys.path.insert(0, os.path.dirname(script))
+runpy.run_path(script, run_name='__main__')
+'''
+
+
+def script_path(name):
+    """基准名称对应的脚本文件（同一脚本的不同模式用 _streaming 等后缀区分）"""
+    return SCRIPTS_DIR / f'{name.removesuffix("_streaming")}.py'
+
+
+def run_script(name, args, work_dir):
+    """
+    在工作目录中运行一个脚本，返回测量结果
+
+    峰值内存来自 os.wait4 返回的 ru_maxrss（Linux上单位为KB），只统计脚本进程本身。
+    """
+    stats_file = Path(work_dir) / '.bench_stats.json'
+    log_file = Path(work_dir) / f'.bench_{name}.log'
+    command = [sys.executable, '-c', RUNNER, str(stats_file), str(script_path(name))] + args
+
+    with open(log_file, 'w', encoding='utf-8') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    stats = {}
+    if stats_file.exists():
+        with open(stats_file, 'r', encoding='utf-8') as f:
+            stats = json.load(f)
+        stats_file.unlink()
+
+    return {
+        'script': name,
+        'exit_code': process.returncode,
+        'wall_seconds': round(wall_seconds, 3),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'files_opened': stats.get('files_opened'),
+        'bytes_read': stats.get('bytes_read'),
+        'log': str(log_file) if process.returncode else None
+    }
+
+
+def run_scale(count, scripts, seed=0, keep=False):
+    """在临时目录中生成count条数据并依次运行脚本"""
+    work_dir = tempfile.mkdtemp(prefix=f'bench_{count}_')
+    start = time.perf_counter()
+    write_payloads(generate_payloads(count, days=90, seed=seed), Path(work_dir) / 'data' / 'raw')
+    print(f'  - 生成 {count} 条数据: {time.perf_counter() - start:.1f} s（{work_dir}）')
+
+    results = []
+    for name, args in BENCHMARK_SCRIPTS:
+        if name not in scripts:
+            continue
+        result = run_script(name, args, work_dir)
+        result['scale'] = count
+        results.append(result)
+        status = '✅' if result['exit_code'] == 0 else f'❌ 退出码 {result["exit_code"]}，日志: {result["log"]}'
+        print(f'    {name:<28} {result["wall_seconds"]:>8.2f} s {result["peak_rss_mb"]:>8.1f} MB {status}')
+
+    # 有脚本失败时保留目录，便于查看日志
+    if not keep and all(result['exit_code'] == 0 for result in results):
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def print_table(results):
+    """打印结果汇总表"""
+    print(f'\n{"脚本":<28}{"规模":>10}{"耗时(s)":>10}{"峰值内存(MB)":>14}{"打开文件":>10}{"读取(MB)":>10}')
+    for result in results:
+        read_mb = f'{result["bytes_read"] / 1024 / 1024:.1f}' if result['bytes_read'] is not None else 'N/A'
+        print(f'{result["script"]:<28}{result["scale"]:>10}{result["wall_seconds"]:>10.2f}'
+              f'{result["peak_rss_mb"]:>14.1f}{result["files_opened"] or 0:>10}{read_mb:>10}')
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='数据处理脚本规模基准测试')
+    parser.add_argument('--scales', default='1000,10000', help='数据规模，逗号分隔（默认 1000,10000）')
+    parser.add_argument('--scripts', help='只运行指定脚本，逗号分隔（默认全部）')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据随机种子（默认0）')
+    parser.add_argument('--output', default='benchmark_results.json', help='结果文件（默认 benchmark_results.json）')
+    parser.add_argument('--keep', action='store_true', help='保留临时数据目录')
+
+    args = parser.parse_args()
+
+    scales = [int(scale) for scale in args.scales.split(',') if scale]
+    scripts = args.scripts.split(',') if args.scripts else [name for name, _ in BENCHMARK_SCRIPTS]
+    unknown = set(scripts) - {name for name, _ in BENCHMARK_SCRIPTS}
+    if unknown:
+        parser.error(f'未知脚本: {", ".join(sorted(unknown))}')
+
+    print('⏱️ 开始基准测试...')
+    results = []
+    for count in scales:
+        results.extend(run_scale(count, scripts, seed=args.seed, keep=args.keep))
+
+    print_table(results)
+
+    output = {
+        'generated_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f'\n✅ 基准结果已保存: {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+报表图表
+只根据报表中的聚合数据（路线、设备、每日计数、维度统计和分桶直方图）绘图，不读取原始数据。
+
+每张图表是一个独立的任务：输入聚合数据的摘要未变化时直接复用缓存中的图片，
+其余任务可在进程池中并行绘制；每个子进程只在启动时设置一次字体和样式，并复用同尺寸的画布。
+单进程绘制时样式只在绘制期间生效，缓存清单在全部图表绘制完后只保存一次。
+
+用法:
+  python scripts/charts.py data/reports/daily_report_20250101.json --workers 4
+  python scripts/charts.py data/reports/rollup_report_20250101.json    # 为每个窗口分别绘图
+"""
+
+import argparse
+import json
+from bisect import bisect_right
+from datetime import datetime
+from pathlib import Path
+
+import instrumentation
+from data_loader import DATA_DIR, DIMENSIONS
+from report_cache import ReportCache, digest
+
+CHARTS_DIR = DATA_DIR / 'reports' / 'charts'
+
+# 与 app.js 中 QUESTIONS 的维度名称一致
+DIMENSION_NAMES = {
+    'TB': '技术基础',
+    'LS': '学习策略',
+    'TI': '时间投入',
+    'GO': '目标明确度',
+    'AI': 'AI认知水平',
+    'DM': '数据思维',
+    'CC': '内容创作能力',
+    'CR': '批判性思维'
+}
+
+# 分桶的下边界：最后一个桶包含其后的全部取值
+SCORE_EDGES = [0, 10, 20, 30, 40, 50, 60, 70, 80, 90]
+COMPLETION_EDGES = [0, 2, 4, 6, 8, 10, 15, 20, 30]
+
+# 修改绘图样式时递增，使缓存的图片全部失效
+STYLE_VERSION = 2
+
+# 图表样式：中文字体缺失时回退到 DejaVu Sans
+STYLE = {
+    'font.sans-serif': ['SimHei', 'Arial Unicode MS', 'DejaVu Sans'],
+    'axes.unicode_minus': False,
+    'axes.grid': False
+}
+
+# 绘图时复用的 pyplot 和画布
+_SHARED = {}
+
+
+def bin_counts(counts, edges):
+    """把 {取值: 次数} 按分桶下边界汇总为各桶的次数列表（小于第一个边界的计入第一个桶）"""
+    bins = [0] * len(edges)
+    for value, count in counts.items():
+        bins[max(bisect_right(edges, value) - 1, 0)] += int(count)
+    return bins
+
+
+def bin_labels(edges):
+    """分桶的标签，如 0-10、…、≥90"""
+    return [f'{low}-{high}' for low, high in zip(edges, edges[1:])] + [f'≥{edges[-1]}']
+
+
+def chart_jobs(report, prefix=''):
+    """
+    根据报表中的聚合数据生成绘图任务 [(名称, 类型, 数据)]
+
+    日报和窗口报表都可以使用，缺少对应聚合数据的图表跳过。
+    """
+    jobs = []
+    if report.get('route_distribution'):
+        jobs.append(('routes', 'pie', {'title': '学习路线分布', 'counts': report['route_distribution']}))
+    if report.get('daily_counts'):
+        jobs.append(('daily_trend', 'trend', {'title': '每日测试数量趋势', 'counts': report['daily_counts']}))
+    if report.get('device_distribution'):
+        jobs.append(('devices', 'bar', {'title': '设备类型分布', 'counts': report['device_distribution']}))
+
+    # 日报记录维度统计量，窗口报表和汇总记录维度平均分
+    averages = report.get('dimension_averages') or {
+        dim: stats['average'] for dim, stats in report.get('dimension_stats', {}).items()
+    }
+    if averages:
+        jobs.append(('radar', 'radar', {'title': '维度平均得分', 'averages': averages}))
+
+    for dim, bins in report.get('dimension_histograms', {}).items():
+        jobs.append((f'dimension_{dim}', 'histogram', {
+            'title': f'{DIMENSION_NAMES.get(dim, dim)}（{dim}）得分分布',
+            'labels': bin_labels(SCORE_EDGES), 'bins': bins, 'xlabel': '得分'
+        }))
+    if report.get('completion_histogram'):
+        jobs.append(('completion', 'histogram', {
+            'title': '完成时长分布',
+            'labels': bin_labels(COMPLETION_EDGES), 'bins': report['completion_histogram'], 'xlabel': '分钟'
+        }))
+
+    return [(f'{prefix}{name}', kind, data) for name, kind, data in jobs]
+
+
+def _load_pyplot():
+    """按需导入matplotlib.pyplot（调用方尚未导入时使用无GUI后端，已导入时保留其后端）"""
+    import sys
+
+    import matplotlib
+    if 'matplotlib.pyplot' not in sys.modules:
+        matplotlib.use('Agg')  # 无GUI后端
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _quiet_fonts():
+    """缺少的字体不逐个字形告警"""
+    import logging
+    import warnings
+
+    logging.getLogger('matplotlib.font_manager').setLevel(logging.ERROR)
+    warnings.filterwarnings('ignore', message='Glyph .* missing')
+
+
+def _init_worker():
+    """子进程初始化：导入matplotlib并设置一次字体和样式"""
+    plt = _load_pyplot()
+    plt.rcParams.update(STYLE)
+    _quiet_fonts()
+
+    _SHARED['plt'] = plt
+    _SHARED['figures'] = {}
+
+
+def _render_serial(tasks):
+    """
+    在当前进程中绘制
+
+    样式、日志级别和告警过滤只在绘制期间生效，结束后恢复并关闭画布，不影响调用方的全局设置。
+    """
+    import logging
+    import warnings
+
+    plt = _load_pyplot()
+    logger = logging.getLogger('matplotlib.font_manager')
+    level = logger.level
+    _SHARED['plt'] = plt
+    _SHARED['figures'] = {}
+    try:
+        with plt.rc_context(STYLE), warnings.catch_warnings():
+            _quiet_fonts()
+            return [render_chart(task) for task in tasks]
+    finally:
+        logger.setLevel(level)
+        for figure in _SHARED['figures'].values():
+            plt.close(figure)
+        _SHARED.clear()
+
+
+def _figure(size):
+    """取出同尺寸的画布并清空（每个进程中每种尺寸只创建一次）"""
+    figures = _SHARED['figures']
+    if size not in figures:
+        figures[size] = _SHARED['plt'].figure(figsize=size)
+    figure = figures[size]
+    figure.clf()
+    return figure
+
+
+def _draw_pie(figure, data):
+    """饼图（路线分布）"""
+    ax = figure.add_subplot()
+    ax.pie(list(data['counts'].values()), labels=list(data['counts']), autopct='%1.1f%%', startangle=90)
+
+
+def _draw_trend(figure, data):
+    """折线图（每日趋势）"""
+    ax = figure.add_subplot()
+    ax.plot(list(data['counts']), list(data['counts'].values()), marker='o', linewidth=2, markersize=8)
+    ax.set_xlabel('日期')
+    ax.set_ylabel('测试数量')
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.grid(True, alpha=0.3)
+
+
+def _draw_bar(figure, data):
+    """柱状图（设备分布）"""
+    ax = figure.add_subplot()
+    ax.bar(list(data['counts']), list(data['counts'].values()), color='#7C3AED')
+    ax.set_ylabel('测试数量')
+
+
+def _draw_radar(figure, data):
+    """
+    与 app.js 的 renderChart 相同的雷达图：0-100刻度，每20一格
+
+    平均分可以超过100（如 LS、AI 可达约127），此时上限取能容纳最大值的20的倍数，不截断。
+    """
+    import math
+
+    dims = [dim for dim in DIMENSIONS if dim in data['averages']]
+    values = [data['averages'][dim] for dim in dims]
+    angles = [2 * math.pi * i / len(dims) for i in range(len(dims))]
+
+    ax = figure.add_subplot(projection='polar')
+    ax.plot(angles + angles[:1], values + values[:1], color='#7C3AED', linewidth=2)
+    ax.fill(angles + angles[:1], values + values[:1], color='#7C3AED', alpha=0.2)
+    ax.scatter(angles, values, color='#FF6FBF', zorder=3)
+    ax.set_xticks(angles)
+    ax.set_xticklabels([DIMENSION_NAMES.get(dim, dim) for dim in dims])
+    top = max(100, math.ceil(max(values) / 20) * 20)
+    ax.set_ylim(0, top)
+    ax.set_yticks(range(20, top + 1, 20))
+
+
+def _draw_histogram(figure, data):
+    """分桶直方图（维度得分、完成时长）"""
+    ax = figure.add_subplot()
+    ax.bar(data['labels'], data['bins'], color='#7C3AED', width=0.9)
+    ax.set_xlabel(data['xlabel'])
+    ax.set_ylabel('测试数量')
+    ax.tick_params(axis='x', labelrotation=45)
+
+
+# 图表类型 -> (绘图函数, 画布尺寸)
+RENDERERS = {
+    'pie': (_draw_pie, (10, 6)),
+    'trend': (_draw_trend, (12, 6)),
+    'bar': (_draw_bar, (8, 5)),
+    'radar': (_draw_radar, (8, 8)),
+    'histogram': (_draw_histogram, (10, 5))
+}
+
+
+def render_chart(task):
+    """绘制一张图表，返回 (名称, 路径或None, 错误信息或None)"""
+    name, kind, data, chart_file = task
+    draw, size = RENDERERS[kind]
+    try:
+        figure = _figure(size)
+        draw(figure, data)
+        figure.suptitle(data['title'])
+        figure.tight_layout()
+        figure.savefig(chart_file, dpi=150, bbox_inches='tight')
+        return name, str(chart_file), None
+    except Exception as e:
+        return name, None, str(e)
+
+
+def render_charts(jobs, workers=1, force=False, charts_dir=CHARTS_DIR, cache=None):
+    """
+    绘制 chart_jobs 生成的图表，输入数据未变化的图表复用缓存
+
+    Returns:
+        (按任务顺序的图表文件列表, 本次绘制的数量, 复用缓存的数量)
+    """
+    cache = cache or ReportCache()
+    charts_dir = Path(charts_dir)
+    charts_dir.mkdir(parents=True, exist_ok=True)
+    today = datetime.now().strftime('%Y%m%d')
+
+    files = {}
+    keys = {}
+    tasks = []
+    for name, kind, data in jobs:
+        keys[name] = digest({'kind': kind, 'data': data, 'style': STYLE_VERSION})
+        entry = None if force else cache.lookup(f'chart:{name}', keys[name])
+        if entry:
+            files[name] = Path(entry['paths'][0])
+        else:
+            tasks.append((name, kind, data, charts_dir / f'{name}_{today}.png'))
+    skipped = len(files)
+
+    if not tasks:
+        results = []
+    elif workers <= 1 or len(tasks) <= 1:
+        results = _render_serial(tasks)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init_worker) as executor:
+            results = list(executor.map(render_chart, tasks))
+
+    for name, chart_file, error in results:
+        if error:
+            print(f'⚠️ 图表生成失败 {name}: {error}')
+            continue
+        files[name] = Path(chart_file)
+        cache.store(f'chart:{name}', keys[name], [chart_file], save=False)
+
+    rendered = len(files) - skipped
+    if rendered:
+        cache.save()
+    instrumentation.count('charts_rendered', rendered)
+    instrumentation.count('charts_skipped', skipped)
+    return [files[name] for name, _, _ in jobs if name in files], rendered, skipped
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='根据已保存的报表绘制图表')
+    parser.add_argument('report', help='日报（daily_report_*.json）或窗口报表（rollup_report_*.json）')
+    parser.add_argument('--workers', type=int, default=1, help='并行绘图的进程数（默认1）')
+    parser.add_argument('--force', action='store_true', help='忽略缓存，全部重新绘制')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    with open(args.report, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+
+    # 窗口报表中的每个窗口分别绘图（文件名以窗口名开头），所有窗口的图表在同一个进程池中绘制
+    if 'windows' in report:
+        jobs = [job for name, window in report['windows'].items() for job in chart_jobs(window, f'{name}_')]
+    else:
+        jobs = chart_jobs(report)
+
+    with instrumentation.run('charts', args):
+        with instrumentation.stage('render'):
+            files, rendered, skipped = render_charts(jobs, args.workers, args.force)
+        print(f'📊 共 {len(files)} 张图表：本次绘制 {rendered} 张，输入未变化复用 {skipped} 张（{CHARTS_DIR}）')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,46 +2,136 @@
 """
 清理旧数据
 保留最近N天的数据，删除更早的数据
+
+按日期分区目录和文件名判断数据日期，整天的分区直接删除。
+删除前先把这些数据累加进永久归档状态 data/archive/summary_state.json 并保存，再删除文件
+（删除中途中断时，下次清理只删除剩余的已归档文件，不重复归档），全量重建汇总时会合并归档状态，总数、路线分布和首次测试时间不会因清理而减少；
+加 --cold-archive 时原始数据另外按月追加到压缩的冷归档 data/archive/cold/YYYY-MM.ndjson.gz。
 """
 
 import argparse
+import gzip
 import json
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
-def cleanup_old_data(days=90, dry_run=False):
+import instrumentation
+from data_loader import (DATA_DIR, RAW_DIR, file_date, invalidate_cache, iter_partition_dirs,
+                         iter_test_files, parse_timestamp, read_test_file, remove_empty_partition_dirs)
+from startup_profile import profile_startup
+
+COMPACTED_DIR = DATA_DIR / 'compacted'
+COLD_ARCHIVE_DIR = DATA_DIR / 'archive' / 'cold'
+
+def day_start(day):
+    """某一天0点（UTC）"""
+    return datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+
+def find_old_partitions(cutoff_date):
+    """找出完全早于截止日期的压缩分区（整个分区删除，无需读取内容）"""
+    if not COMPACTED_DIR.exists():
+        return []
+
+    from columnar_store import iter_partitions, partition_date_range
+
+    old_partitions = []
+    for partition_file in iter_partitions():
+        _, end_date = partition_date_range(partition_file)
+        if end_date < cutoff_date.date():
+            old_partitions.append((partition_file, day_start(end_date), partition_file.stat().st_size))
+    return old_partitions
+
+def find_old_raw_files(cutoff_date):
+    """
+    找出早于截止日期的原始数据文件
+
+    日期分区目录和文件名都带有日期，只有文件名无法识别日期时才读取JSON内容。
+    """
+    old_files = []
+
+    # 日期分区：整个目录早于截止日期
+    for day, day_dir in iter_partition_dirs(until=cutoff_date.date()):
+        for json_file in sorted(day_dir.glob('test_*.json')):
+            old_files.append((json_file, day_start(day)))
+
+    # 旧版平铺在 data/raw 下的文件
+    for json_file in iter_test_files(until=cutoff_date.date()):
+        if json_file.parent != RAW_DIR:
+            continue
+
+        day = file_date(json_file)
+        if day is not None:
+            old_files.append((json_file, day_start(day)))
+            continue
+
+        data = read_test_file(json_file)
+        if data is None:
+            continue
+        try:
+            test_time = parse_timestamp(data['timestamp'])
+            if test_time < cutoff_date:
+                old_files.append((json_file, test_time))
+        except Exception as e:
+            print(f"⚠️ 处理文件失败 {json_file}: {e}")
+
+    return old_files
+
+def read_expiring(file_path):
+    """读取即将删除的文件中的测试数据（原始JSON或压缩分区）"""
+    if file_path.suffix == '.npz':
+        from columnar_store import columns_to_records, read_partition
+
+        return list(columns_to_records(read_partition(file_path)))
+    data = read_test_file(file_path)
+    return [] if data is None else [data]
+
+def write_cold_archive(records_by_file):
+    """把即将删除的数据按月追加到 gzip 压缩的NDJSON冷归档，返回写入条数"""
+    COLD_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    archives = {}
+    written = 0
+    try:
+        for records in records_by_file.values():
+            for data in records:
+                month = str(data.get('timestamp', ''))[:7] or 'unknown'
+                if month not in archives:
+                    # 追加模式会新增一个gzip成员，多成员文件可以被 gzip.open 连续读取
+                    archives[month] = gzip.open(COLD_ARCHIVE_DIR / f'{month}.ndjson.gz', 'at', encoding='utf-8')
+                archives[month].write(json.dumps(data, ensure_ascii=False) + '\n')
+                written += 1
+    finally:
+        for archive in archives.values():
+            archive.close()
+    return written
+
+def cleanup_old_data(days=90, dry_run=False, cold_archive=False):
     """
-    清理旧数据
+    清理旧数据（删除前累加进永久归档状态）
 
     Args:
         days: 保留最近N天的数据
         dry_run: 只预览不实际删除
+        cold_archive: 删除前把原始数据写入压缩冷归档
     """
-    data_dir = Path('data/raw')
-    if not data_dir.exists():
+    if not RAW_DIR.exists() and not COMPACTED_DIR.exists():
         print('⚠️ 数据目录不存在')
         return
 
-    cutoff_date = datetime.now() - timedelta(days=days)
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
     print(f'📅 清理日期: {cutoff_date.strftime("%Y-%m-%d")}之前的数据')
 
     old_files = []
     total_size = 0
 
-    for json_file in data_dir.glob('test_*.json'):
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                test_time = datetime.fromisoformat(data['timestamp'].replace('Z', '+00:00'))
+    for json_file, test_time in find_old_raw_files(cutoff_date):
+        file_size = json_file.stat().st_size
+        old_files.append((json_file, test_time, file_size))
+        total_size += file_size
 
-                if test_time < cutoff_date:
-                    file_size = json_file.stat().st_size
-                    old_files.append((json_file, test_time, file_size))
-                    total_size += file_size
-
-        except Exception as e:
-            print(f"⚠️ 处理文件失败 {json_file}: {e}")
+    for partition_file, end_time, file_size in find_old_partitions(cutoff_date):
+        old_files.append((partition_file, end_time, file_size))
+        total_size += file_size
 
     if not old_files:
         print('✅ 没有需要清理的旧数据')
@@ -61,30 +151,72 @@ def cleanup_old_data(days=90, dry_run=False):
         print('\n🔍 预览模式，不会实际删除文件')
         return
 
+    from records import Submission
+    from update_summary import ARCHIVE_STATE_FILE, SummaryState, load_state, save_state
+
+    # 归档状态的 folded_files 记录已累加但可能尚未删除的文件：上次删除中途中断时，这些文件只删除、不再重复归档
+    archived = load_state(ARCHIVE_STATE_FILE) or SummaryState()
+    pending = [file_path for file_path, _, _ in old_files if file_path.as_posix() in archived.folded_files]
+    if pending:
+        print(f'♻️ 上次清理已归档但未删除的文件: {len(pending)} 个（只删除，不重复归档）')
+
+    # 删除前读取数据；冷归档在删除任何文件之前写完
+    records_by_file = {
+        file_path: read_expiring(file_path)
+        for file_path, _, _ in old_files if file_path.as_posix() not in archived.folded_files
+    }
+    if cold_archive:
+        written = write_cold_archive(records_by_file)
+        print(f'🧊 已写入冷归档: {written} 条（{COLD_ARCHIVE_DIR}）')
+
+    # 先累加进归档状态并保存，再删除文件：删除中途中断时已删除文件的计数不会丢失
+    archived_count = 0
+    for file_path, records in records_by_file.items():
+        for data in records:
+            archived.add(Submission.from_payload(data))
+            archived_count += 1
+        archived.folded_files.add(file_path.as_posix())
+    save_state(archived, ARCHIVE_STATE_FILE)
+
     # 确认删除
     print(f'\n⚠️ 即将删除 {len(old_files)} 个文件')
 
-    # 执行删除
+    # 执行删除；删除失败的文件保留在 folded_files 中，下次清理时再删除
     deleted_count = 0
     for file_path, _, _ in old_files:
         try:
             file_path.unlink()
             deleted_count += 1
+            instrumentation.count('files_deleted')
         except Exception as e:
             print(f"❌ 删除失败 {file_path}: {e}")
 
+    archived.prune_folded_files()
+    save_state(archived, ARCHIVE_STATE_FILE)
+    remove_empty_partition_dirs()
+    invalidate_cache()
     print(f'\n✅ 已删除 {deleted_count} 个旧文件（释放 {total_size / 1024:.1f} KB）')
+    print(f'📚 已归档 {archived_count} 条数据，归档累计 {archived.total_tests} 条（{ARCHIVE_STATE_FILE}）')
 
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description='清理旧数据')
     parser.add_argument('--days', type=int, default=90, help='保留最近N天的数据（默认90天）')
     parser.add_argument('--dry-run', action='store_true', help='只预览不实际删除')
+    parser.add_argument('--cold-archive', action='store_true', help='删除前把原始数据写入压缩冷归档')
+    parser.add_argument('--profile-startup', action='store_true', help='打印模块导入耗时后退出')
+    instrumentation.add_arguments(parser)
 
     args = parser.parse_args()
 
-    print(f'🧹 开始清理数据（保留最近 {args.days} 天）...')
-    cleanup_old_data(days=args.days, dry_run=args.dry_run)
+    if args.profile_startup:
+        profile_startup('cleanup_old_data')
+        return
+
+    with instrumentation.run('cleanup_old_data', args):
+        print(f'🧹 开始清理数据（保留最近 {args.days} 天）...')
+        with instrumentation.stage('cleanup'):
+            cleanup_old_data(days=args.days, dry_run=args.dry_run, cold_archive=args.cold_archive)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+列式压缩存储
+把历史测试数据按天或按月存为 NumPy .npz 分区，每一列对应一个字段
+"""
+
+import json
+import os
+from calendar import monthrange
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+
+from data_loader import DATA_DIR, DIMENSIONS
+from records import Submission
+
+COMPACTED_DIR = DATA_DIR / 'compacted'
+
+QUESTIONS_PER_DIMENSION = 3
+
+STRING_COLUMNS = ['timestamp', 'anonymousId', 'mainRoute', 'subRoute', 'deviceType', 'userAgent', 'extra']
+FLOAT_COLUMNS = ['completionTime', 'pageLoadTime', 'estimatedPageViews']
+ANSWER_COLUMNS = [f'answer_{dim}{i + 1}' for dim in DIMENSIONS for i in range(QUESTIONS_PER_DIMENSION)]
+
+# 有单独列的字段，其余字段（解释文本、屏幕分辨率等）以JSON保存在 extra 列
+RESULT_FIELDS = {'mainRoute', 'subRoute', 'isDirect', 'main_route', 'sub_route'}
+METADATA_FIELDS = {'deviceType', 'userAgent'}
+USAGE_FIELDS = set(FLOAT_COLUMNS)
+ANSWER_FIELDS = set(DIMENSIONS) | {'B1', 'B2', 'hours_per_week'}
+TOP_LEVEL_FIELDS = {'timestamp', 'anonymousId', 'userId', 'answers', 'dimensionScores', 'dimension_scores',
+                    'result', 'final', 'metadata', 'usageStats'}
+
+
+def partition_key(timestamp, by='month'):
+    """根据时间戳计算分区名：按月 YYYY-MM，按天 YYYY-MM-DD"""
+    return timestamp[:7] if by == 'month' else timestamp[:10]
+
+
+def partition_date_range(partition_file):
+    """返回分区覆盖的日期范围 (起始日, 结束日)"""
+    name = Path(partition_file).stem
+    parts = [int(p) for p in name.split('-')]
+    if len(parts) == 2:
+        year, month = parts
+        return date(year, month, 1), date(year, month, monthrange(year, month)[1])
+    day = date(*parts)
+    return day, day
+
+
+def iter_partitions(compacted_dir=COMPACTED_DIR):
+    """按名称顺序列出所有分区文件"""
+    compacted_dir = Path(compacted_dir)
+    if not compacted_dir.exists():
+        return []
+    return sorted(compacted_dir.glob('*.npz'))
+
+
+def is_number(value):
+    """JSON 数字（布尔值除外）"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def fits_column(key, value):
+    """
+    取值能否无损地存入对应的列
+
+    超过3题或超出 int8 范围的答案列表、非数字的每周时长（包括 null）等整体保存在 extra 中，
+    对应的列写空值，压缩既不截断数据也不会因个别记录失败。
+    """
+    if key in USAGE_FIELDS or key == 'hours_per_week':
+        return is_number(value)
+    if key in DIMENSIONS:
+        return (isinstance(value, list) and len(value) == QUESTIONS_PER_DIMENSION and any(value)
+                and all(isinstance(v, int) and not isinstance(v, bool) and -128 <= v <= 127 for v in value))
+    if key in ('B1', 'B2'):
+        return isinstance(value, str) and value != ''
+    return True
+
+
+def extra_fields(data):
+    """
+    没有单独列的字段 {字段: 取值}
+
+    sample_results 格式的 final 与网页格式的 result 合并保存在 result 下，
+    还原时统一为网页格式，Submission.from_payload 得到的结果不变。
+    """
+    extra = {key: value for key, value in data.items() if key not in TOP_LEVEL_FIELDS}
+    sections = (
+        ('result', data.get('final') if 'final' in data or 'dimension_scores' in data else data.get('result'),
+         RESULT_FIELDS),
+        ('metadata', data.get('metadata'), METADATA_FIELDS),
+        ('usageStats', data.get('usageStats'), USAGE_FIELDS),
+        ('answers', data.get('answers'), ANSWER_FIELDS)
+    )
+    for section, values, known in sections:
+        rest = {key: value for key, value in (values or {}).items()
+                if key not in known or not fits_column(key, value)}
+        if rest:
+            extra[section] = rest
+    return extra
+
+
+def records_to_columns(records):
+    """
+    把测试数据转换为列
+
+    路线、得分、设备等字段统一由 Submission.from_payload 解码，两种数据格式都不会丢失。
+    """
+    columns = {name: [] for name in STRING_COLUMNS + FLOAT_COLUMNS + ANSWER_COLUMNS}
+    columns['isDirect'] = []
+    for dim in DIMENSIONS:
+        columns[f'dim_{dim}'] = []
+    columns['answer_B1'] = []
+    columns['answer_B2'] = []
+    columns['answer_hours_per_week'] = []
+
+    for data in records:
+        record = Submission.from_payload(data)
+        usage = data.get('usageStats') or {}
+        answers = data.get('answers') or {}
+        extra = extra_fields(data)
+
+        columns['timestamp'].append(record.timestamp)
+        columns['anonymousId'].append(record.anonymous_id)
+        columns['mainRoute'].append(record.main_route or '')
+        columns['subRoute'].append(record.sub_route or '')
+        columns['isDirect'].append(record.is_direct)
+        columns['deviceType'].append(record.device_type or '')
+        columns['userAgent'].append(record.user_agent or '')
+        columns['extra'].append(json.dumps(extra, ensure_ascii=False) if extra else '')
+        for name in FLOAT_COLUMNS:
+            value = usage.get(name)
+            columns[name].append(value if fits_column(name, value) else np.nan)
+        for dim, score in zip(DIMENSIONS, record.scores):
+            columns[f'dim_{dim}'].append(score)
+            values = answers.get(dim)
+            if not fits_column(dim, values):
+                values = [0] * QUESTIONS_PER_DIMENSION
+            for i in range(QUESTIONS_PER_DIMENSION):
+                columns[f'answer_{dim}{i + 1}'].append(values[i])
+        for key in ('B1', 'B2'):
+            value = answers.get(key)
+            columns[f'answer_{key}'].append(value if fits_column(key, value) else '')
+        hours = answers.get('hours_per_week')
+        columns['answer_hours_per_week'].append(hours if fits_column('hours_per_week', hours) else np.nan)
+
+    arrays = {name: np.array(columns[name], dtype=str) for name in STRING_COLUMNS}
+    arrays['isDirect'] = np.array(columns['isDirect'], dtype=bool)
+    for name in FLOAT_COLUMNS:
+        arrays[name] = np.array(columns[name], dtype=np.float64)
+    for dim in DIMENSIONS:
+        arrays[f'dim_{dim}'] = np.array(columns[f'dim_{dim}'], dtype=np.float64)
+    for name in ANSWER_COLUMNS:
+        arrays[name] = np.array(columns[name], dtype=np.int8)
+    arrays['answer_B1'] = np.array(columns['answer_B1'], dtype=str)
+    arrays['answer_B2'] = np.array(columns['answer_B2'], dtype=str)
+    arrays['answer_hours_per_week'] = np.array(columns['answer_hours_per_week'], dtype=np.float64)
+    return arrays
+
+
+def empty_column(like, count):
+    """旧分区缺少的列：字符串为空串，数值为NaN"""
+    if like.dtype.kind == 'U':
+        return np.full(count, '', dtype=str)
+    if like.dtype.kind == 'b':
+        return np.zeros(count, dtype=bool)
+    if like.dtype.kind == 'f':
+        return np.full(count, np.nan)
+    return np.zeros(count, dtype=like.dtype)
+
+
+def columns_to_records(columns):
+    """
+    把列还原为网页提交格式的测试数据（生成器）
+
+    result 总是输出（路线为空时为None）；旧版本写入的分区没有 userAgent 等列，对应字段省略。
+    """
+    count = len(columns['timestamp'])
+    extras = columns.get('extra')
+    for i in range(count):
+        extra = json.loads(str(extras[i])) if extras is not None and extras[i] else {}
+        data = {
+            'timestamp': str(columns['timestamp'][i]),
+            'anonymousId': str(columns['anonymousId'][i])
+        }
+
+        answers = extra.pop('answers', {})
+        for dim in DIMENSIONS:
+            values = [int(columns[f'answer_{dim}{q + 1}'][i]) for q in range(QUESTIONS_PER_DIMENSION)]
+            if any(values):
+                answers[dim] = values
+        for key in ('B1', 'B2'):
+            value = str(columns[f'answer_{key}'][i])
+            if value:
+                answers[key] = value
+        hours = columns['answer_hours_per_week'][i]
+        if not np.isnan(hours):
+            answers['hours_per_week'] = hours.item()
+        if answers:
+            data['answers'] = answers
+
+        scores = {
+            dim: columns[f'dim_{dim}'][i].item()
+            for dim in DIMENSIONS
+            if not np.isnan(columns[f'dim_{dim}'][i])
+        }
+        if scores:
+            data['dimensionScores'] = scores
+
+        data['result'] = {
+            'mainRoute': str(columns['mainRoute'][i]) or None,
+            'subRoute': str(columns['subRoute'][i]) or None,
+            'isDirect': bool(columns['isDirect'][i]),
+            **extra.pop('result', {})
+        }
+
+        metadata = extra.pop('metadata', {})
+        for name in ('deviceType', 'userAgent'):
+            value = str(columns[name][i]) if name in columns else ''
+            if value:
+                metadata[name] = value
+        if metadata:
+            data['metadata'] = metadata
+
+        usage = extra.pop('usageStats', {})
+        for name in FLOAT_COLUMNS:
+            if name in columns and not np.isnan(columns[name][i]):
+                usage[name] = columns[name][i].item()
+        if usage:
+            data['usageStats'] = usage
+
+        data.update(extra)
+        yield data
+
+
+def read_partition(partition_file, names=None):
+    """读取一个分区的所有列（names 指定时只读取这些列）"""
+    with np.load(partition_file, allow_pickle=False) as npz:
+        return {name: npz[name] for name in (names or npz.files)}
+
+
+def partition_day_stats(partition_file):
+    """
+    分区中每天的行数和首末时间戳 {日期YYYY-MM-DD: (行数, 最早时间戳, 最晚时间戳)}
+
+    只读取时间戳列；分区按时间戳排序，同一天的行是连续的。
+    """
+    with np.load(partition_file, allow_pickle=False) as npz:
+        timestamps = npz['timestamp']
+    days, first, counts = np.unique(timestamps.astype('U10'), return_index=True, return_counts=True)
+    return {
+        str(day): (int(count), str(timestamps[start]), str(timestamps[start + count - 1]))
+        for day, start, count in zip(days, first, counts)
+    }
+
+
+def write_partition(partition_file, columns):
+    """原子写入一个分区（先写临时文件再替换）"""
+    partition_file = Path(partition_file)
+    partition_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = partition_file.with_name(partition_file.name + '.tmp')
+    with open(tmp_file, 'wb') as f:
+        np.savez_compressed(f, **columns)
+    os.replace(tmp_file, partition_file)
+
+
+def append_to_partition(partition_file, records):
+    """把测试数据追加到分区（分区已存在时合并后重写）"""
+    new_columns = records_to_columns(records)
+    if Path(partition_file).exists():
+        old_columns = read_partition(partition_file)
+        old_count = len(old_columns['timestamp'])
+        merged = {}
+        for name, values in new_columns.items():
+            old_values = old_columns[name] if name in old_columns else empty_column(values, old_count)
+            merged[name] = np.concatenate([old_values, values])
+        new_columns = merged
+
+    order = np.argsort(new_columns['timestamp'], kind='stable')
+    write_partition(partition_file, {name: values[order] for name, values in new_columns.items()})
+    return len(order)
+
+
+def iter_compacted_records(compacted_dir=COMPACTED_DIR, since=None, until=None):
+    """
+    流式读取分区中的测试数据
+
+    since/until 为日期：与窗口没有交集的分区直接跳过，不会被打开。
+    """
+    for partition_file in iter_partitions(compacted_dir):
+        start_date, end_date = partition_date_range(partition_file)
+        if (since and end_date < since) or (until and start_date >= until):
+            continue
+
+        columns = read_partition(partition_file)
+        if since or until:
+            # ISO时间戳可以直接与 YYYY-MM-DD 按字符串比较
+            timestamps = columns['timestamp']
+            mask = np.ones(len(timestamps), dtype=bool)
+            if since:
+                mask &= timestamps >= since.isoformat()
+            if until:
+                mask &= timestamps < until.isoformat()
+            columns = {name: values[mask] for name, values in columns.items()}
+
+        yield from columns_to_records(columns)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+压缩历史数据
+把较早的 test_*.json 合并为按天或按月的列式分区（data/compacted/*.npz），
+报表脚本会同时读取分区和尚未压缩的原始文件
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+import instrumentation
+from columnar_store import COMPACTED_DIR, append_to_partition, partition_key
+from data_loader import invalidate_cache, iter_records, parse_timestamp, remove_empty_partition_dirs
+
+def compact_old_data(older_than=7, by='month', dry_run=False):
+    """
+    压缩旧数据
+
+    Args:
+        older_than: 压缩N天之前的数据
+        by: 分区粒度，month 或 day
+        dry_run: 只预览不实际写入
+    """
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=older_than)
+    print(f'📅 压缩 {cutoff_date.strftime("%Y-%m-%d")} 之前的数据（按{"月" if by == "month" else "天"}分区）')
+
+    partitions = defaultdict(list)
+    # 只读取截止日期之前（按分区/文件名日期）的原始文件
+    with instrumentation.stage('load'):
+        for json_file, data in iter_records(with_path=True, until=cutoff_date.date() + timedelta(days=1)):
+            try:
+                if parse_timestamp(data['timestamp']) < cutoff_date:
+                    partitions[partition_key(data['timestamp'], by)].append((json_file, data))
+            except Exception as e:
+                print(f"⚠️ 处理文件失败 {json_file}: {e}")
+
+    if not partitions:
+        print('✅ 没有需要压缩的数据')
+        return
+
+    total_files = sum(len(items) for items in partitions.values())
+    print(f'\n📋 发现 {total_files} 个待压缩文件，共 {len(partitions)} 个分区')
+
+    if dry_run:
+        for key, items in sorted(partitions.items()):
+            print(f'  - {key}: {len(items)} 条')
+        print('\n🔍 预览模式，不会实际写入')
+        return
+
+    compacted_count = 0
+    for key, items in sorted(partitions.items()):
+        partition_file = COMPACTED_DIR / f'{key}.npz'
+        with instrumentation.stage('write'):
+            rows = append_to_partition(partition_file, [data for _, data in items])
+
+        # 分区写入成功后才删除原始文件
+        with instrumentation.stage('cleanup'):
+            for json_file, _ in items:
+                try:
+                    json_file.unlink()
+                    compacted_count += 1
+                except Exception as e:
+                    print(f"❌ 删除失败 {json_file}: {e}")
+
+        print(f'  ✅ {partition_file.name}: 新增 {len(items)} 条，共 {rows} 条')
+
+    remove_empty_partition_dirs()
+    invalidate_cache()
+    print(f'\n✅ 已压缩 {compacted_count} 个文件')
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='压缩历史数据为列式分区')
+    parser.add_argument('--older-than', type=int, default=7, help='压缩N天之前的数据（默认7天）')
+    parser.add_argument('--by', choices=['month', 'day'], default='month', help='分区粒度（默认按月）')
+    parser.add_argument('--dry-run', action='store_true', help='只预览不实际写入')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    with instrumentation.run('compact_data', args):
+        print('🗜️ 开始压缩历史数据...')
+        compact_old_data(older_than=args.older_than, by=args.by, dry_run=args.dry_run)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+计数立方体
+一次遍历把提交计入 主路线 × 副路线 × 是否直达 × 设备类型 × 日期 的稀疏计数立方体，
+路线、设备、每日等任意切片和汇总都由立方体回答，不需要再读取原始数据。
+
+每个轴是一组分类取值（首次出现的顺序即编号顺序，缺失值编号为-1），只保存非零的格子；
+格子保持首次出现的顺序，因此汇总结果在计数相同时的先后顺序与逐条累加一致。
+全量数据的立方体保存在 data/cube.npz，新数据到达时增量累加（只有读写文件时才导入NumPy）。
+
+用法:
+  python scripts/cube.py --rebuild
+  python scripts/cube.py --by main_route,is_direct --since 2025-01-01
+  python scripts/cube.py --by day,device_type --where main_route=T3
+"""
+
+import argparse
+from collections import Counter
+
+import instrumentation
+from data_loader import DATA_DIR
+
+CUBE_FILE = DATA_DIR / 'cube.npz'
+
+AXES = ['main_route', 'sub_route', 'is_direct', 'device_type', 'day']
+
+# 缺失值的编号
+MISSING = -1
+
+
+class Cube:
+    """稀疏计数立方体：cells 为 {各轴编号组成的元组: 数量}"""
+
+    def __init__(self):
+        self.labels = {axis: [] for axis in AXES}
+        self._codes = {axis: {} for axis in AXES}
+        self.cells = Counter()
+
+    @property
+    def total(self):
+        """总数"""
+        return sum(self.cells.values())
+
+    def code(self, axis, value):
+        """取值在轴上的编号（新取值追加到轴末尾）"""
+        if value is None:
+            return MISSING
+        codes = self._codes[axis]
+        index = codes.get(value)
+        if index is None:
+            index = codes[value] = len(self.labels[axis])
+            self.labels[axis].append(value)
+        return index
+
+    def label(self, axis, index):
+        """编号对应的取值"""
+        return None if index == MISSING else self.labels[axis][index]
+
+    def add_cell(self, values, count=1):
+        """按各轴取值（AXES顺序）累加一个格子"""
+        key = tuple(self.code(axis, value) for axis, value in zip(AXES, values))
+        self.cells[key] += count
+
+    def add(self, record):
+        """累加一条测试数据（Submission）"""
+        self.add_cell((record.main_route, record.sub_route, record.is_direct, record.device_type, record.date))
+
+    def merge(self, other):
+        """合并另一个立方体"""
+        for values, count in other.iter_cells():
+            self.add_cell(values, count)
+        return self
+
+    def iter_cells(self):
+        """按首次出现的顺序产出 (各轴取值, 数量)"""
+        for key, count in self.cells.items():
+            yield tuple(self.label(axis, index) for axis, index in zip(AXES, key)), count
+
+    def rollup(self, axes, where=None, since=None, until=None):
+        """
+        按指定的轴汇总（其余轴求和）
+
+        Args:
+            axes: 保留的轴，如 ['day', 'main_route']
+            where: {轴: 取值} 只统计匹配的格子
+            since/until: 只统计 [since, until) 内的日期（YYYY-MM-DD）
+
+        Returns:
+            {取值元组: 数量}，按首次出现的顺序
+        """
+        positions = [AXES.index(axis) for axis in axes]
+        filters = [(AXES.index(axis), value) for axis, value in (where or {}).items()]
+        day_position = AXES.index('day')
+
+        result = {}
+        for values, count in self.iter_cells():
+            day = values[day_position]
+            if (since and day < since) or (until and day >= until):
+                continue
+            if any(values[position] != value for position, value in filters):
+                continue
+            key = tuple(values[position] for position in positions)
+            result[key] = result.get(key, 0) + count
+        return result
+
+    def drop_days(self, days):
+        """删除指定日期（YYYY-MM-DD）的全部格子"""
+        days = set(days)
+        day_position = AXES.index('day')
+        for key in [key for key in self.cells if self.label('day', key[day_position]) in days]:
+            del self.cells[key]
+
+    def to_arrays(self):
+        """导出为NumPy数组：各轴的取值、格子坐标 (n, 轴数) 和数量"""
+        import numpy as np
+
+        arrays = {
+            'coords': np.array(list(self.cells), dtype=np.int32).reshape(-1, len(AXES)),
+            'counts': np.array(list(self.cells.values()), dtype=np.int64)
+        }
+        for axis in AXES:
+            labels = self.labels[axis]
+            arrays[f'labels_{axis}'] = np.array(labels, dtype=bool if axis == 'is_direct' else str)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """从 to_arrays 的结果恢复"""
+        cube = cls()
+        for axis in AXES:
+            for value in arrays[f'labels_{axis}'].tolist():
+                cube.code(axis, value)
+        for key, count in zip(arrays['coords'].tolist(), arrays['counts'].tolist()):
+            cube.cells[tuple(key)] += count
+        return cube
+
+
+def build_cube(records):
+    """一次遍历把测试数据计入立方体"""
+    cube = Cube()
+    for record in records:
+        cube.add(record)
+    return cube
+
+
+def load_cube(cube_file=CUBE_FILE):
+    """读取已保存的立方体，不存在时返回None"""
+    if not cube_file.exists():
+        return None
+
+    import numpy as np
+
+    with np.load(cube_file, allow_pickle=False) as npz:
+        return Cube.from_arrays({name: npz[name] for name in npz.files})
+
+
+def save_cube(cube, cube_file=CUBE_FILE):
+    """原子写入立方体"""
+    from columnar_store import write_partition
+
+    write_partition(cube_file, cube.to_arrays())
+
+
+def add_records(records, cube_file=CUBE_FILE):
+    """把新数据累加进已保存的立方体"""
+    cube = load_cube(cube_file) or Cube()
+    cube.merge(build_cube(records))
+    save_cube(cube, cube_file)
+    return cube
+
+
+def rebuild_cube(records, cube_file=CUBE_FILE):
+    """
+    从全部数据重建立方体
+
+    与每日草图相同，只替换数据中出现的日期；原始数据已被清理的日期保留原有计数。
+    """
+    return replace_days(build_cube(records), cube_file)
+
+
+def replace_days(rebuilt, cube_file=CUBE_FILE):
+    """用全量重建得到的立方体替换已保存立方体中的相同日期，并保存"""
+    cube = load_cube(cube_file) or Cube()
+    cube.drop_days(rebuilt.labels['day'])
+    cube.merge(rebuilt)
+    save_cube(cube, cube_file)
+    return cube
+
+
+def parse_where(items):
+    """解析 --where axis=value（is_direct 接受 true/false，空值写作 none）"""
+    where = {}
+    for item in items:
+        axis, _, value = item.partition('=')
+        if axis not in AXES:
+            raise ValueError(f'未知的轴: {axis}')
+        if value.lower() == 'none':
+            value = None
+        elif axis == 'is_direct':
+            value = value.lower() in ('true', '1', 'yes')
+        where[axis] = value
+    return where
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='计数立方体（路线 × 副路线 × 直达 × 设备 × 日期）')
+    parser.add_argument('--rebuild', action='store_true', help='从全部数据重建立方体')
+    parser.add_argument('--by', default='main_route', help=f'汇总保留的轴，逗号分隔（可选：{",".join(AXES)}）')
+    parser.add_argument('--where', action='append', default=[], help='只统计匹配的格子，如 device_type=mobile（可重复）')
+    parser.add_argument('--since', help='起始日期 YYYY-MM-DD（包含）')
+    parser.add_argument('--until', help='结束日期 YYYY-MM-DD（不包含）')
+    parser.add_argument('--workers', type=int, default=1, help='重建时并行读取数据的进程数（默认1）')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    axes = [axis for axis in args.by.split(',') if axis]
+    unknown = set(axes) - set(AXES)
+    if unknown:
+        parser.error(f'未知的轴: {", ".join(sorted(unknown))}')
+    try:
+        where = parse_where(args.where)
+    except ValueError as e:
+        parser.error(str(e))
+
+    with instrumentation.run('cube', args):
+        if args.rebuild:
+            from data_loader import load_submissions
+
+            records = load_submissions(workers=args.workers)
+            with instrumentation.stage('write'):
+                cube = rebuild_cube(records)
+            print(f'✅ 已重建立方体: {len(cube.cells)} 个格子（{len(records)} 条数据）')
+        else:
+            cube = load_cube()
+            if cube is None:
+                print('⚠️ 立方体不存在，请先运行 --rebuild')
+                return
+
+        with instrumentation.stage('aggregate'):
+            result = cube.rollup(axes, where, args.since, args.until)
+
+        total = sum(result.values())
+        print(f'\n🧊 {" × ".join(axes)}（共 {total} 条）:')
+        for key, count in sorted(result.items(), key=lambda item: item[1], reverse=True):
+            share = count / total * 100 if total else 0
+            print(f'  - {" | ".join(str(value) for value in key)}: {count}（{share:.1f}%）')
+
+
+if __name__ == '__main__':
+    main()
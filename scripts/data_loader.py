@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""
+共享数据加载模块
+所有脚本统一通过这里读取 data/raw 下的测试数据，保证一次运行内每个文件只解析一次
+
+原始数据按日期分区存放：data/raw/YYYY/MM/DD/test_YYYYMMDD_HHMMSS_<id>.json，
+按时间窗口查询时只访问相关日期的分区目录。旧版直接放在 data/raw 下的文件仍可读取。
+
+无法解析或结构无效的文件会按 (路径, 修改时间, 大小) 记入 data/quarantine/bad_files.jsonl，
+之后的运行直接跳过，文件被修改后才会重新读取。
+"""
+
+import json
+import re
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+
+from instrumentation import add_time, count, stage
+
+DATA_DIR = Path('data')
+RAW_DIR = DATA_DIR / 'raw'
+QUARANTINE_DIR = DATA_DIR / 'quarantine'
+
+# 已知无效文件的记录（只追加，每行一个JSON对象，同一路径以最后一条为准）
+BAD_FILES_LOG = QUARANTINE_DIR / 'bad_files.jsonl'
+
+# 8个维度的固定顺序（与 app.js 中的 dimOrder 一致）
+DIMENSIONS = ['TB', 'LS', 'TI', 'GO', 'AI', 'DM', 'CC', 'CR']
+
+# 文件名中的日期：test_YYYYMMDD_HHMMSS_<id>.json
+FILENAME_DATE = re.compile(r'^test_(\d{4})(\d{2})(\d{2})_')
+
+# 并行读取时每个任务处理的文件数
+DEFAULT_CHUNK_SIZE = 500
+
+# 一次运行内已解析的数据缓存：{原始数据目录: ([(文件路径, 数据), ...], [压缩分区中的数据, ...])}
+_RECORD_CACHE = {}
+
+# 解码后的 Submission 缓存：{原始数据目录: [Submission, ...]}
+_SUBMISSION_CACHE = {}
+
+# 已知无效文件：{路径: (修改时间ns, 大小)}，首次使用时从 BAD_FILES_LOG 读取
+_BAD_FILES = None
+
+
+def file_date(json_file):
+    """根据文件名推断数据日期，无法推断时返回None"""
+    match = FILENAME_DATE.match(Path(json_file).name)
+    if not match:
+        return None
+    try:
+        return date(*(int(part) for part in match.groups()))
+    except ValueError:
+        return None
+
+
+def partition_dir(day, raw_dir=RAW_DIR):
+    """某一天的分区目录 data/raw/YYYY/MM/DD"""
+    return Path(raw_dir) / f'{day.year:04d}' / f'{day.month:02d}' / f'{day.day:02d}'
+
+
+def _numeric_dirs(parent):
+    """按数值顺序列出名称为纯数字的子目录"""
+    return sorted((p for p in parent.iterdir() if p.is_dir() and p.name.isdigit()), key=lambda p: int(p.name))
+
+
+def iter_partition_dirs(raw_dir=RAW_DIR, since=None, until=None):
+    """
+    按日期顺序列出分区目录，产出 (日期, 目录)
+
+    只进入与 [since, until) 有交集的年/月目录，不读取任何文件内容。
+    """
+    raw_dir = Path(raw_dir)
+    if not raw_dir.exists():
+        return
+
+    for year_dir in _numeric_dirs(raw_dir):
+        year = int(year_dir.name)
+        if (since and year < since.year) or (until and year > until.year):
+            continue
+        for month_dir in _numeric_dirs(year_dir):
+            month = int(month_dir.name)
+            if (since and (year, month) < (since.year, since.month)) or \
+                    (until and (year, month) > (until.year, until.month)):
+                continue
+            for day_dir in _numeric_dirs(month_dir):
+                try:
+                    day = date(year, month, int(day_dir.name))
+                except ValueError:
+                    continue
+                if (since and day < since) or (until and day >= until):
+                    continue
+                yield day, day_dir
+
+
+def remove_empty_partition_dirs(raw_dir=RAW_DIR):
+    """删除已经清空的日/月/年分区目录"""
+    for _, day_dir in list(iter_partition_dirs(raw_dir)):
+        for directory in (day_dir, day_dir.parent, day_dir.parent.parent):
+            try:
+                directory.rmdir()
+            except OSError:
+                break
+
+
+def _in_window(day, since, until):
+    """日期未知时视为在窗口内（由调用方按时间戳精确过滤）"""
+    if day is None:
+        return True
+    return not ((since and day < since) or (until and day >= until))
+
+
+def iter_test_files(raw_dir=RAW_DIR, since=None, until=None):
+    """
+    按文件名（即提交时间）顺序列出测试数据文件
+
+    Args:
+        raw_dir: 原始数据目录
+        since: 只包含该日期及之后的文件
+        until: 只包含该日期之前的文件
+    """
+    raw_dir = Path(raw_dir)
+    if not raw_dir.exists():
+        return []
+
+    files = [f for f in raw_dir.glob('test_*.json') if _in_window(file_date(f), since, until)]
+    for _, day_dir in iter_partition_dirs(raw_dir, since, until):
+        files.extend(day_dir.glob('test_*.json'))
+    if known_bad_files():
+        files = [f for f in files if not is_known_bad(f)]
+    return sorted(files, key=lambda f: f.name)
+
+
+def compacted_dir_for(raw_dir=RAW_DIR):
+    """原始数据目录对应的压缩分区目录（与之同级，默认 data/compacted）"""
+    return Path(raw_dir).parent / 'compacted'
+
+
+def dataset_fingerprint(raw_dir=RAW_DIR):
+    """
+    数据集指纹：所有原始文件和压缩分区的 (路径, 大小, 修改时间ns)
+
+    只读取目录和文件属性，不解析内容；用于判断输入数据是否变化（大小不变的原地修改也能发现）。
+    """
+    files = list(iter_test_files(raw_dir))
+    compacted_dir = compacted_dir_for(raw_dir)
+    if compacted_dir.exists():
+        files.extend(sorted(compacted_dir.glob('*.npz')))
+    fingerprint = []
+    for f in files:
+        stat = f.stat()
+        fingerprint.append((f.as_posix(), stat.st_size, stat.st_mtime_ns))
+    return fingerprint
+
+
+def _is_number(value):
+    """是否为数值（bool除外）"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_record(data):
+    """
+    校验一条已保存的测试数据，合法时返回None，否则返回原因
+
+    同时接受 github-data-collector.js 和 sample_results 两种格式，
+    只检查聚合时会用到的字段：时间戳可解析、得分为数值、嵌套字段为对象。
+    """
+    if not isinstance(data, dict):
+        return '不是JSON对象'
+
+    timestamp = data.get('timestamp')
+    if not isinstance(timestamp, str):
+        return '缺少timestamp'
+    try:
+        parse_timestamp(timestamp)
+    except ValueError:
+        return f'timestamp格式无效: {timestamp}'
+
+    for key in ('result', 'final', 'metadata', 'usageStats', 'answers'):
+        if data.get(key) is not None and not isinstance(data[key], dict):
+            return f'{key}不是JSON对象'
+
+    for key in ('dimensionScores', 'dimension_scores'):
+        scores = data.get(key)
+        if scores is not None and not (isinstance(scores, dict) and all(_is_number(v) for v in scores.values())):
+            return f'{key}无效'
+
+    completion_time = (data.get('usageStats') or {}).get('completionTime')
+    if completion_time is not None and not _is_number(completion_time):
+        return 'usageStats.completionTime无效'
+
+    return None
+
+
+def file_key(json_file):
+    """负缓存的键：(修改时间ns, 大小)"""
+    stat = Path(json_file).stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def known_bad_files(reload=False):
+    """已知无效的文件 {路径: (修改时间ns, 大小)}"""
+    global _BAD_FILES
+    if _BAD_FILES is None or reload:
+        _BAD_FILES = {}
+        if BAD_FILES_LOG.exists():
+            with open(BAD_FILES_LOG, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        _BAD_FILES[entry['path']] = (entry['mtime_ns'], entry['size'])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+    return _BAD_FILES
+
+
+def is_known_bad(json_file):
+    """文件是否已记录为无效且之后未被修改"""
+    key = known_bad_files().get(Path(json_file).as_posix())
+    if key is None:
+        return False
+    try:
+        return file_key(json_file) == key
+    except OSError:
+        return False
+
+
+def mark_bad_file(json_file, reason):
+    """
+    把无效文件记入负缓存
+
+    每条记录单独追加一行，多个读取进程同时写入也不会互相覆盖。
+    """
+    path = Path(json_file).as_posix()
+    try:
+        key = file_key(json_file)
+    except OSError:
+        return
+    if known_bad_files().get(path) == key:
+        return
+    _BAD_FILES[path] = key
+
+    BAD_FILES_LOG.parent.mkdir(parents=True, exist_ok=True)
+    entry = {'path': path, 'mtime_ns': key[0], 'size': key[1], 'reason': reason,
+             'recorded_at': datetime.now(timezone.utc).isoformat()}
+    with open(BAD_FILES_LOG, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def _read_bytes(json_file):
+    """读取文件内容并计数"""
+    with open(json_file, 'rb') as f:
+        raw = f.read()
+    count('files_read')
+    count('bytes_read', len(raw))
+    return raw
+
+
+def load_test_file(json_file):
+    """读取并校验单个测试数据文件，返回 (数据或None, 错误原因或None)"""
+    try:
+        raw = _read_bytes(json_file)
+    except OSError as e:
+        return None, f'读取失败: {e}'
+
+    import fast_json
+
+    start = time.perf_counter()
+    try:
+        data = fast_json.loads(raw)
+    except ValueError as e:
+        return None, f'JSON解析失败: {e}'
+    finally:
+        add_time('parse', time.perf_counter() - start)
+
+    reason = validate_record(data)
+    if reason:
+        return None, reason
+    return data, None
+
+
+def _report_bad_file(json_file, reason):
+    """打印警告并记入负缓存"""
+    print(f"⚠️ 读取文件失败 {json_file}: {reason}")
+    count('bad_files')
+    mark_bad_file(json_file, reason)
+
+
+def read_test_file(json_file):
+    """读取单个测试数据文件，失败时打印警告、记入负缓存并返回None"""
+    data, reason = load_test_file(json_file)
+    if reason:
+        _report_bad_file(json_file, reason)
+    return data
+
+
+def read_submission(json_file):
+    """
+    读取单个测试数据文件并直接解码为 Submission（不构造完整的字典），失败时与 read_test_file 相同
+    """
+    try:
+        raw = _read_bytes(json_file)
+    except OSError as e:
+        _report_bad_file(json_file, f'读取失败: {e}')
+        return None
+
+    import fast_json
+
+    start = time.perf_counter()
+    record, reason = fast_json.decode_submission(raw)
+    add_time('parse', time.perf_counter() - start)
+    if reason:
+        _report_bad_file(json_file, reason)
+    return record
+
+
+def chunked(items, chunk_size=DEFAULT_CHUNK_SIZE):
+    """把列表按固定大小切块"""
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+
+def map_file_chunks(func, files, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    把文件按固定大小分块，在进程池中对每块执行 func(文件列表)
+
+    结果按分块顺序返回，与进程调度无关，因此合并结果是确定的。
+    func 必须是模块级函数（子进程需要能导入）。
+    """
+    chunks = chunked(list(files), chunk_size)
+    if workers <= 1 or len(chunks) <= 1:
+        return [func(chunk) for chunk in chunks]
+
+    # 只有真正并行时才导入（concurrent.futures 会带入 multiprocessing）
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        return list(executor.map(func, chunks))
+
+
+def _read_chunk(files):
+    """子进程任务：读取一块文件，返回 [(文件路径, 数据), ...]"""
+    records = []
+    for json_file in files:
+        data = read_test_file(json_file)
+        if data is not None:
+            records.append((json_file, data))
+    return records
+
+
+def read_test_files(files, workers=1, chunk_size=DEFAULT_CHUNK_SIZE):
+    """读取一批文件（可多进程并行），按文件顺序返回 [(文件路径, 数据), ...]"""
+    if workers <= 1:
+        return _read_chunk(files)
+
+    records = []
+    for chunk_records in map_file_chunks(_read_chunk, files, workers, chunk_size):
+        records.extend(chunk_records)
+    return records
+
+
+def iter_compacted_records(since=None, until=None, raw_dir=RAW_DIR):
+    """流式读取列式压缩分区中的数据（没有分区时不导入NumPy）"""
+    compacted_dir = compacted_dir_for(raw_dir)
+    if not compacted_dir.exists():
+        return
+
+    from columnar_store import iter_compacted_records as _iter_partitions
+    yield from _iter_partitions(compacted_dir, since=since, until=until)
+
+
+def iter_records(raw_dir=RAW_DIR, with_path=False, since=None, until=None):
+    """
+    流式读取测试数据（生成器）
+
+    先读取尚未压缩的原始JSON文件，再读取列式压缩分区。
+    since/until 按文件所在日期粗筛，调用方需要按时间戳精确过滤。
+
+    Args:
+        raw_dir: 原始数据目录
+        with_path: 为True时产出 (文件路径, 数据) 元组，只包含原始JSON文件
+        since: 只读取该日期及之后的数据
+        until: 只读取该日期之前的数据
+    """
+    key = Path(raw_dir)
+    if key in _RECORD_CACHE:
+        raw_records, compacted_records = _RECORD_CACHE[key]
+        for json_file, data in raw_records:
+            if _in_window(file_date(json_file), since, until):
+                yield (json_file, data) if with_path else data
+        if not with_path:
+            for data in compacted_records:
+                if _in_window(date.fromisoformat(data['timestamp'][:10]), since, until):
+                    yield data
+        return
+
+    for json_file in iter_test_files(raw_dir, since, until):
+        data = read_test_file(json_file)
+        if data is not None:
+            yield (json_file, data) if with_path else data
+
+    if not with_path:
+        yield from iter_compacted_records(since, until, raw_dir)
+
+
+def load_records(raw_dir=RAW_DIR, with_path=False, workers=1):
+    """
+    加载所有测试数据（原始文件 + 压缩分区），并在本次运行内缓存
+
+    同一进程中的多个消费者（报表、Excel、清理）共享同一份解析结果，
+    不会重复读取文件。with_path为True时只返回原始JSON文件及其路径。
+
+    Args:
+        workers: 大于1时用多进程并行读取和解析原始JSON文件
+    """
+    key = Path(raw_dir)
+    if key not in _RECORD_CACHE:
+        with stage('load'):
+            _RECORD_CACHE[key] = (
+                read_test_files(iter_test_files(raw_dir), workers=workers),
+                list(iter_compacted_records(raw_dir=raw_dir))
+            )
+        count('records', sum(len(records) for records in _RECORD_CACHE[key]))
+
+    raw_records, compacted_records = _RECORD_CACHE[key]
+    if with_path:
+        return list(raw_records)
+    return [data for _, data in raw_records] + compacted_records
+
+
+def _decode_chunk(files):
+    """子进程任务：读取一块文件并解码为 Submission"""
+    records = (read_submission(json_file) for json_file in files)
+    return [record for record in records if record is not None]
+
+
+def iter_submissions(raw_dir=RAW_DIR, since=None, until=None):
+    """
+    流式读取测试数据并解码为 Submission（生成器）
+
+    since/until 的含义与 iter_records 相同，调用方需要按时间戳精确过滤。
+    """
+    key = Path(raw_dir)
+    if key in _SUBMISSION_CACHE:
+        for record in _SUBMISSION_CACHE[key]:
+            if _in_window(date.fromisoformat(record.date), since, until):
+                yield record
+        return
+
+    if key in _RECORD_CACHE:
+        from records import decode_records
+
+        yield from decode_records(iter_records(raw_dir, since=since, until=until))
+        return
+
+    for json_file in iter_test_files(raw_dir, since, until):
+        record = read_submission(json_file)
+        if record is not None:
+            yield record
+
+    from records import decode_records
+    yield from decode_records(iter_compacted_records(since, until, raw_dir))
+
+
+def load_submissions(raw_dir=RAW_DIR, workers=1):
+    """
+    加载所有测试数据并解码为 Submission，在本次运行内缓存
+
+    聚合脚本只需要 Submission，不保留原始字典，内存占用远小于 load_records。
+    workers大于1时在子进程中完成解析和解码。
+    """
+    key = Path(raw_dir)
+    if key not in _SUBMISSION_CACHE:
+        from records import decode_records
+
+        if key in _RECORD_CACHE:
+            submissions = list(decode_records(load_records(raw_dir)))
+        else:
+            with stage('load'):
+                submissions = []
+                for chunk in map_file_chunks(_decode_chunk, iter_test_files(raw_dir), workers):
+                    submissions.extend(chunk)
+                submissions.extend(decode_records(iter_compacted_records(raw_dir=raw_dir)))
+            count('records', len(submissions))
+        _SUBMISSION_CACHE[key] = submissions
+
+    return list(_SUBMISSION_CACHE[key])
+
+
+def invalidate_cache(raw_dir=None):
+    """清空缓存（数据目录被修改后调用）"""
+    if raw_dir is None:
+        _RECORD_CACHE.clear()
+        _SUBMISSION_CACHE.clear()
+    else:
+        _RECORD_CACHE.pop(Path(raw_dir), None)
+        _SUBMISSION_CACHE.pop(Path(raw_dir), None)
+
+
+def parse_timestamp(timestamp):
+    """解析ISO时间戳，统一返回带时区的UTC时间"""
+    test_time = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if test_time.tzinfo is None:
+        test_time = test_time.replace(tzinfo=timezone.utc)
+    return test_time.astimezone(timezone.utc)
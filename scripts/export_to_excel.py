@@ -4,148 +4,205 @@
 生成完整的Excel报表，包含多个工作表
 """
 
+import argparse
 import json
 import os
 from datetime import datetime
 from pathlib import Path
-from collections import defaultdict
-
-try:
-    import pandas as pd
-    HAS_PANDAS = True
-except ImportError:
-    HAS_PANDAS = False
-    print('❌ 未安装pandas，无法生成Excel')
-    import sys
-    sys.exit(1)
-
-def load_all_data():
+from collections import Counter, defaultdict
+
+import sys
+
+import instrumentation
+from cube import AXES, Cube
+from data_loader import DIMENSIONS, dataset_fingerprint, iter_submissions, load_submissions
+from report_cache import ReportCache, digest
+from startup_profile import profile_startup
+
+def require_pandas():
+    """按需导入pandas（只在真正生成工作簿时加载），未安装时退出"""
+    try:
+        import pandas as pd
+    except ImportError:
+        print('❌ 未安装pandas，无法生成Excel')
+        sys.exit(1)
+    return pd
+
+def load_all_data(workers=1):
     """加载所有测试数据"""
-    data_dir = Path('data/raw')
-    all_data = []
-
-    if not data_dir.exists():
-        return all_data
-
-    for json_file in sorted(data_dir.glob('test_*.json')):
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                all_data.append(data)
-        except Exception as e:
-            print(f"⚠️ 读取文件失败 {json_file}: {e}")
-
-    return all_data
+    return load_submissions(workers=workers)
+
+# Excel单个工作表最多 1,048,576 行（含表头）
+MAX_SHEET_ROWS = 1048575
+
+MAIN_SHEET_COLUMNS = ['提交时间', '匿名ID', '主路线', '副路线', '是否直达', '设备类型', '浏览器', '完成时长(分钟)']
+ROUTE_SHEET_COLUMNS = ['学习路线', '总数', '占比', '桌面端', '移动端', '平板']
+BREAKDOWN_SHEET_COLUMNS = ['主路线', '副路线', '是否直达', '总数', '占比', '桌面端', '移动端', '平板']
+DIMENSION_SHEET_COLUMNS = ['维度', '平均分', '最高分', '最低分', '中位数', '标准差', 'P25', 'P75', 'P90', '样本数']
+DAILY_SHEET_COLUMNS = ['日期', '测试总数', '最热路线', '桌面端', '移动端', '平板']
+
+def main_sheet_row(record):
+    """主数据表中的一行"""
+    row = {
+        '提交时间': record.timestamp,
+        '匿名ID': record.anonymous_id[:8] + '...',  # 只显示前8位
+        '主路线': record.main_route or '',
+        '副路线': record.sub_route or '',
+        '是否直达': '是' if record.is_direct else '否',
+        '设备类型': record.device_type or '',
+        '浏览器': (record.user_agent or '')[:50] + '...',
+        '完成时长(分钟)': round((record.completion_time or 0) / 1000 / 60, 2)
+    }
+
+    # 添加维度得分
+    for dim, score in record.iter_scores():
+        row[f'维度_{dim}'] = score
+
+    return row
+
+def dimension_sheet_row(dim, dim_stats):
+    """维度得分汇总表中的一行"""
+    return {
+        '维度': dim,
+        '平均分': dim_stats['average'],
+        '最高分': dim_stats['max'],
+        '最低分': dim_stats['min'],
+        '中位数': dim_stats['median'],
+        '标准差': dim_stats['std'],
+        'P25': dim_stats['p25'],
+        'P75': dim_stats['p75'],
+        'P90': dim_stats['p90'],
+        '样本数': dim_stats['count']
+    }
+
+class SummaryAccumulator:
+    """
+    汇总表累加器
+
+    路线、副路线、直达、设备和日期计入一个计数立方体（cube.py），维度得分只保留取值分布；
+    各汇总表都是立方体的切片，流式导出时不需要保留原始数据。
+    """
+
+    def __init__(self):
+        self.cube = Cube()
+        self.dimension_values = defaultdict(Counter)
+
+    @property
+    def total(self):
+        """总数"""
+        return self.cube.total
+
+    def add(self, record):
+        """累加一条测试数据（Submission）"""
+        self.cube.add(record)
+        for dim, score in record.iter_scores():
+            self.dimension_values[dim][score] += 1
+
+    def _device_rows(self, axes, key_columns):
+        """按 axes 分组、设备类型分列的计数行（按总数降序）"""
+        groups = {}
+        for values, count in self.cube.rollup(axes + ['device_type']).items():
+            *key, device = values
+            group = groups.setdefault(tuple(key), Counter())
+            group[device] += count
+
+        total = self.total
+        rows = []
+        for key, devices in groups.items():
+            count = sum(devices.values())
+            row = dict(zip(key_columns, key))
+            row.update({
+                '总数': count,
+                '占比': f"{count / total * 100:.1f}%",
+                '桌面端': devices.get('desktop', 0),
+                '移动端': devices.get('mobile', 0),
+                '平板': devices.get('tablet', 0)
+            })
+            rows.append(row)
+        return sorted(rows, key=lambda row: row['总数'], reverse=True)
+
+    def route_rows(self):
+        """路线汇总行（按总数降序）"""
+        rows = self._device_rows(['main_route'], ['学习路线'])
+        for row in rows:
+            row['学习路线'] = row['学习路线'] or 'Unknown'
+        return rows
+
+    def breakdown_rows(self):
+        """主路线 × 副路线 × 是否直达的细分行（按总数降序）"""
+        rows = self._device_rows(['main_route', 'sub_route', 'is_direct'], ['主路线', '副路线', '是否直达'])
+        for row in rows:
+            row['主路线'] = row['主路线'] or 'Unknown'
+            row['副路线'] = row['副路线'] or ''
+            row['是否直达'] = '是' if row['是否直达'] else '否'
+        return rows
+
+    def dimension_rows(self):
+        """维度得分汇总行（按平均分降序）"""
+        dims = [dim for dim in DIMENSIONS if dim in self.dimension_values]
+        from aggregation import describe_value_counts
+
+        rows = [dimension_sheet_row(dim, describe_value_counts(self.dimension_values[dim])) for dim in dims]
+        return sorted(rows, key=lambda row: row['平均分'], reverse=True)
+
+    def daily_rows(self):
+        """每日汇总行（按日期升序）"""
+        routes = defaultdict(dict)
+        for (date, route), count in self.cube.rollup(['day', 'main_route']).items():
+            routes[date][route or 'Unknown'] = routes[date].get(route or 'Unknown', 0) + count
+        devices = defaultdict(Counter)
+        for (date, device), count in self.cube.rollup(['day', 'device_type']).items():
+            devices[date][device] += count
+
+        rows = []
+        for date in sorted(routes):
+            day_routes = routes[date]
+            row = {
+                '日期': date,
+                '测试总数': sum(day_routes.values()),
+                '最热路线': max(day_routes, key=day_routes.get) if day_routes else 'N/A',
+                '桌面端': devices[date].get('desktop', 0),
+                '移动端': devices[date].get('mobile', 0),
+                '平板': devices[date].get('tablet', 0)
+            }
+            rows.append(row)
+        return rows
+
+def accumulate(all_data):
+    """把全部数据累加到汇总累加器"""
+    accumulator = SummaryAccumulator()
+    for record in all_data:
+        accumulator.add(record)
+    return accumulator
 
 def create_main_sheet(all_data):
     """创建主数据表"""
-    rows = []
-
-    for data in all_data:
-        row = {
-            '提交时间': data.get('timestamp', ''),
-            '匿名ID': data.get('anonymousId', '')[:8] + '...',  # 只显示前8位
-            '主路线': data.get('result', {}).get('mainRoute', ''),
-            '副路线': data.get('result', {}).get('subRoute', ''),
-            '是否直达': '是' if data.get('result', {}).get('isDirect', False) else '否',
-            '设备类型': data.get('metadata', {}).get('deviceType', ''),
-            '浏览器': data.get('metadata', {}).get('userAgent', '')[:50] + '...',
-            '完成时长(分钟)': round(data.get('usageStats', {}).get('completionTime', 0) / 1000 / 60, 2)
-        }
-
-        # 添加维度得分
-        if 'dimensionScores' in data:
-            for dim, score in data['dimensionScores'].items():
-                row[f'维度_{dim}'] = score
-
-        rows.append(row)
-
-    return pd.DataFrame(rows)
-
-def create_route_summary(all_data):
+    pd = require_pandas()
+    return pd.DataFrame([main_sheet_row(record) for record in all_data])
+
+def create_route_summary(accumulator):
     """创建路线汇总表"""
-    route_counts = defaultdict(int)
-    route_details = defaultdict(lambda: {
-        'count': 0,
-        'devices': defaultdict(int)
-    })
-
-    for data in all_data:
-        main_route = data.get('result', {}).get('mainRoute', 'Unknown')
-        device = data.get('metadata', {}).get('deviceType', 'Unknown')
-
-        route_counts[main_route] += 1
-        route_details[main_route]['count'] += 1
-        route_details[main_route]['devices'][device] += 1
-
-    rows = []
-    for route, details in route_details.items():
-        row = {
-            '学习路线': route,
-            '总数': details['count'],
-            '占比': f"{details['count'] / len(all_data) * 100:.1f}%",
-            '桌面端': details['devices'].get('desktop', 0),
-            '移动端': details['devices'].get('mobile', 0),
-            '平板': details['devices'].get('tablet', 0)
-        }
-        rows.append(row)
-
-    df = pd.DataFrame(rows)
-    return df.sort_values('总数', ascending=False)
+    pd = require_pandas()
+    return pd.DataFrame(accumulator.route_rows(), columns=ROUTE_SHEET_COLUMNS)
+
+def create_route_breakdown(accumulator):
+    """创建路线细分表（主路线 × 副路线 × 是否直达）"""
+    pd = require_pandas()
+    return pd.DataFrame(accumulator.breakdown_rows(), columns=BREAKDOWN_SHEET_COLUMNS)
 
 def create_dimension_summary(all_data):
     """创建维度得分汇总表"""
-    dimension_scores = defaultdict(list)
-
-    for data in all_data:
-        if 'dimensionScores' in data:
-            for dim, score in data['dimensionScores'].items():
-                dimension_scores[dim].append(score)
-
-    rows = []
-    for dim, scores in dimension_scores.items():
-        row = {
-            '维度': dim,
-            '平均分': round(sum(scores) / len(scores), 2),
-            '最高分': max(scores),
-            '最低分': min(scores),
-            '中位数': sorted(scores)[len(scores) // 2],
-            '样本数': len(scores)
-        }
-        rows.append(row)
-
-    return pd.DataFrame(rows).sort_values('平均分', ascending=False)
-
-def create_daily_summary(all_data):
+    pd = require_pandas()
+    from aggregation import build_frame, describe_dimensions
+
+    stats = describe_dimensions(build_frame(all_data))
+    rows = [dimension_sheet_row(dim, dim_stats) for dim, dim_stats in stats.items()]
+    return pd.DataFrame(rows, columns=DIMENSION_SHEET_COLUMNS).sort_values('平均分', ascending=False)
+
+def create_daily_summary(accumulator):
     """创建每日汇总表"""
-    daily_data = defaultdict(lambda: {
-        'count': 0,
-        'routes': defaultdict(int),
-        'devices': defaultdict(int)
-    })
-
-    for data in all_data:
-        date = data['timestamp'][:10]  # YYYY-MM-DD
-        main_route = data.get('result', {}).get('mainRoute', 'Unknown')
-        device = data.get('metadata', {}).get('deviceType', 'Unknown')
-
-        daily_data[date]['count'] += 1
-        daily_data[date]['routes'][main_route] += 1
-        daily_data[date]['devices'][device] += 1
-
-    rows = []
-    for date, stats in sorted(daily_data.items()):
-        row = {
-            '日期': date,
-            '测试总数': stats['count'],
-            '最热路线': max(stats['routes'], key=stats['routes'].get) if stats['routes'] else 'N/A',
-            '桌面端': stats['devices'].get('desktop', 0),
-            '移动端': stats['devices'].get('mobile', 0),
-            '平板': stats['devices'].get('tablet', 0)
-        }
-        rows.append(row)
-
-    return pd.DataFrame(rows)
+    pd = require_pandas()
+    return pd.DataFrame(accumulator.daily_rows(), columns=DAILY_SHEET_COLUMNS)
 
 def export_to_excel(all_data):
     """导出到Excel"""
@@ -158,44 +215,171 @@ def export_to_excel(all_data):
     output_dir.mkdir(parents=True, exist_ok=True)
     output_file = output_dir / f'完整数据报表_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
 
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        # 工作表1: 主数据
-        df_main = create_main_sheet(all_data)
-        df_main.to_excel(writer, sheet_name='所有测试数据', index=False)
+    with instrumentation.stage('aggregate'):
+        # 路线、细分和每日汇总表共用一次遍历得到的立方体
+        accumulator = accumulate(all_data)
+        sheets = [
+            ('所有测试数据', create_main_sheet(all_data)),      # 工作表1: 主数据
+            ('路线分布汇总', create_route_summary(accumulator)),  # 工作表2: 路线汇总
+            ('维度得分汇总', create_dimension_summary(all_data)),  # 工作表3: 维度汇总
+            ('每日统计', create_daily_summary(accumulator)),     # 工作表4: 每日汇总
+            ('路线细分', create_route_breakdown(accumulator))     # 工作表5: 副路线和直达细分
+        ]
+
+    pd = require_pandas()
+    with instrumentation.stage('write'), pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        for sheet_name, df in sheets:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
 
-        # 工作表2: 路线汇总
-        df_routes = create_route_summary(all_data)
-        df_routes.to_excel(writer, sheet_name='路线分布汇总', index=False)
+    print(f'✅ Excel报表已生成: {output_file}')
+    print(f'   - 总测试数: {len(all_data)}')
+    print(f'   - 工作表数: {len(sheets)} 个')
+    print(f'   - 文件大小: {output_file.stat().st_size / 1024:.1f} KB')
 
-        # 工作表3: 维度汇总
-        df_dimensions = create_dimension_summary(all_data)
-        df_dimensions.to_excel(writer, sheet_name='维度得分汇总', index=False)
+    return output_file
 
-        # 工作表4: 每日汇总
-        df_daily = create_daily_summary(all_data)
-        df_daily.to_excel(writer, sheet_name='每日统计', index=False)
+def write_sheet(workbook, title, columns, rows):
+    """向只写工作簿追加一个工作表"""
+    sheet = workbook.create_sheet(title=title)
+    sheet.append(columns)
+    for row in rows:
+        sheet.append([row.get(column) for column in columns])
+
+def accumulator_from_store(conn):
+    """用SQL分组统计填充汇总表累加器（与逐条累加的结果相同）"""
+    import query_store
+
+    accumulator = SummaryAccumulator()
+    # 一次分组统计填满立方体（查询库的列名与立方体的轴相同）
+    is_direct = AXES.index('is_direct')
+    for *values, count in query_store.group_counts(conn, AXES):
+        values[is_direct] = bool(values[is_direct])
+        accumulator.cube.add_cell(values, count)
+
+    accumulator.dimension_values.update(query_store.score_value_counts(conn))
+    return accumulator
+
+def export_to_excel_streaming(records, rows_per_sheet=MAX_SHEET_ROWS, accumulator=None):
+    """
+    流式导出到Excel（内存占用恒定）
+
+    主数据表逐行写入openpyxl的只写工作簿，写满后自动切换到新的工作表
+    （所有测试数据_2、所有测试数据_3……）；汇总表由边写边累加的聚合结果生成，
+    全程不保留原始数据列表。传入已算好的 accumulator（如来自查询库）时不再逐条累加。
+    """
+    from openpyxl import Workbook
 
-    print(f'✅ Excel报表已生成: {output_file}')
-    print(f'   - 总测试数: {len(all_data)}')
-    print(f'   - 工作表数: 4 个')
+    output_dir = Path('data/reports')
+    output_dir.mkdir(parents=True, exist_ok=True)
+    output_file = output_dir / f'完整数据报表_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+
+    columns = MAIN_SHEET_COLUMNS + [f'维度_{dim}' for dim in DIMENSIONS]
+    workbook = Workbook(write_only=True)
+    precomputed = accumulator is not None
+    accumulator = accumulator if precomputed else SummaryAccumulator()
+    main_sheets = 0
+    rows = 0
+    sheet = None
+    sheet_rows = rows_per_sheet
+
+    # 读取、逐行写入和累加交替进行，统一计入 aggregate 阶段（解析耗时另计在 parse 中）
+    with instrumentation.stage('aggregate'):
+        for record in records:
+            if sheet_rows >= rows_per_sheet:
+                main_sheets += 1
+                title = '所有测试数据' if main_sheets == 1 else f'所有测试数据_{main_sheets}'
+                sheet = workbook.create_sheet(title=title)
+                sheet.append(columns)
+                sheet_rows = 0
+
+            row = main_sheet_row(record)
+            sheet.append([row.get(column) for column in columns])
+            sheet_rows += 1
+            rows += 1
+            if not precomputed:
+                accumulator.add(record)
+    instrumentation.count('exported_rows', rows)
+
+    if not rows:
+        print('⚠️ 没有数据可导出')
+        return
+
+    with instrumentation.stage('write'):
+        write_sheet(workbook, '路线分布汇总', ROUTE_SHEET_COLUMNS, accumulator.route_rows())
+        write_sheet(workbook, '维度得分汇总', DIMENSION_SHEET_COLUMNS, accumulator.dimension_rows())
+        write_sheet(workbook, '每日统计', DAILY_SHEET_COLUMNS, accumulator.daily_rows())
+        write_sheet(workbook, '路线细分', BREAKDOWN_SHEET_COLUMNS, accumulator.breakdown_rows())
+        workbook.save(output_file)
+
+    print(f'✅ Excel报表已生成（流式）: {output_file}')
+    print(f'   - 总测试数: {rows}')
+    print(f'   - 工作表数: {main_sheets + 4} 个')
     print(f'   - 文件大小: {output_file.stat().st_size / 1024:.1f} KB')
 
     return output_file
 
-def main():
-    """主函数"""
-    print('📊 开始导出Excel报表...')
+def export_from_store(rows_per_sheet=MAX_SHEET_ROWS, workers=1):
+    """从SQLite查询库流式导出：主数据表按与直接读取文件相同的顺序逐行读取，汇总表由SQL分组统计"""
+    import query_store
 
-    # 加载所有数据
-    all_data = load_all_data()
-    print(f'📁 已加载 {len(all_data)} 条数据')
+    with query_store.open_store(workers=workers, sync_first=False) as conn:
+        with instrumentation.stage('load'):
+            query_store.sync(conn, workers=workers)
+        with instrumentation.stage('aggregate'):
+            accumulator = accumulator_from_store(conn)
+        return export_to_excel_streaming(query_store.iter_submissions(conn), rows_per_sheet, accumulator)
 
-    if not all_data:
-        print('⚠️ 没有数据，退出')
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description='导出数据到Excel')
+    parser.add_argument('--workers', type=int, default=1, help='并行读取数据的进程数（默认1）')
+    parser.add_argument('--streaming', action='store_true', help='流式导出，内存占用与数据量无关')
+    parser.add_argument('--rows-per-sheet', type=int, default=MAX_SHEET_ROWS, help='流式导出时每个主数据表的最大行数')
+    parser.add_argument('--force', action='store_true', help='忽略缓存，强制重新生成')
+    parser.add_argument('--sql', action='store_true', help='从SQLite查询库导出，汇总表用SQL统计（先增量同步查询库）')
+    parser.add_argument('--profile-startup', action='store_true', help='打印模块导入耗时后退出')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    if args.profile_startup:
+        profile_startup('export_to_excel')
         return
 
-    # 导出Excel
-    export_to_excel(all_data)
+    with instrumentation.run('export_to_excel', args):
+        print('📊 开始导出Excel报表...')
+
+        # 输入数据（文件列表、大小和修改时间）未变化时直接复用上次的报表
+        cache = ReportCache()
+        export_key = digest({
+            'dataset': dataset_fingerprint(),
+            'streaming': args.streaming,
+            'sql': args.sql,
+            'rows_per_sheet': args.rows_per_sheet
+        })
+        cached = None if args.force else cache.lookup('excel', export_key)
+        if cached:
+            print(f'♻️ 数据未变化，沿用已有报表: {cached["paths"][0]}')
+            return
+
+        if args.sql:
+            output_file = export_from_store(rows_per_sheet=args.rows_per_sheet, workers=args.workers)
+        elif args.streaming:
+            output_file = export_to_excel_streaming(iter_submissions(), rows_per_sheet=args.rows_per_sheet)
+        else:
+            # 加载所有数据
+            all_data = load_all_data(workers=args.workers)
+            print(f'📁 已加载 {len(all_data)} 条数据')
+
+            if not all_data:
+                print('⚠️ 没有数据，退出')
+                return
+
+            # 导出Excel
+            output_file = export_to_excel(all_data)
+
+        if output_file:
+            cache.store('excel', export_key, [output_file])
 
 if __name__ == '__main__':
     main()
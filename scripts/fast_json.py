@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+快速JSON解码
+已安装 msgspec 时按提交结构的类型定义直接解码出报表需要的字段（answers 等其余内容只校验不构造），
+只安装了 orjson 时用它解码为字典，都没有时使用标准库 json。
+
+任何后端解码失败或类型不符时都改用标准库重新解码和校验，
+因此无论使用哪个后端，得到的数据、Submission 以及无效文件的判断和原因都完全相同。
+
+用法:
+  python scripts/fast_json.py --benchmark --count 20000   # 比较各后端的解码速度并核对结果一致
+"""
+
+import argparse
+import gc
+import json
+import time
+from typing import Any, Dict, Union
+
+from data_loader import parse_timestamp, validate_record
+from records import Submission, score_array
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 可用的后端（按优先级），默认使用第一个
+BACKENDS = [name for name, module in (('msgspec', msgspec), ('orjson', orjson)) if module is not None] + ['json']
+BACKEND = BACKENDS[0]
+
+# 快速后端的解码错误（orjson 的错误是 ValueError 的子类）
+_DECODE_ERRORS = (ValueError, msgspec.DecodeError) if msgspec is not None else (ValueError,)
+
+
+if msgspec is not None:
+    _Scores = Union[Dict[str, Union[int, float]], None]
+
+    class _Result(msgspec.Struct):
+        mainRoute: Any = None
+        subRoute: Any = None
+        isDirect: Any = False
+
+    class _Final(msgspec.Struct):
+        main_route: Any = None
+        sub_route: Any = None
+        isDirect: Any = False
+
+    class _Metadata(msgspec.Struct):
+        deviceType: Any = None
+        userAgent: Any = None
+
+    class _UsageStats(msgspec.Struct):
+        completionTime: Union[int, float, None] = None
+
+    class _Payload(msgspec.Struct):
+        """两种数据格式的并集；UNSET 表示字段不存在（用于区分 sample_results 格式）"""
+        timestamp: str
+        anonymousId: Any = None
+        userId: Any = None
+        result: Union[_Result, None] = None
+        final: Union[_Final, None, msgspec.UnsetType] = msgspec.UNSET
+        dimensionScores: _Scores = None
+        dimension_scores: Union[_Scores, msgspec.UnsetType] = msgspec.UNSET
+        metadata: Union[_Metadata, None] = None
+        usageStats: Union[_UsageStats, None] = None
+        # 报表不需要答题明细，只保留原始字节用于校验类型
+        answers: msgspec.Raw = msgspec.Raw()
+
+    _GENERIC_DECODER = msgspec.json.Decoder()
+    _PAYLOAD_DECODER = msgspec.json.Decoder(_Payload)
+
+
+def loads(raw, backend=None):
+    """把JSON解码为Python对象，结果与 json.loads 相同"""
+    backend = backend or BACKEND
+    try:
+        if backend == 'msgspec':
+            return _GENERIC_DECODER.decode(raw)
+        if backend == 'orjson':
+            return orjson.loads(raw)
+    except _DECODE_ERRORS:
+        pass
+    # 标准库：快速后端不接受但标准库接受的输入（NaN、超长整数等）也由这里处理，错误信息保持一致
+    return json.loads(raw)
+
+
+def _decode_submission_json(raw, backend):
+    """通用路径：解码为字典、校验，再转换为 Submission"""
+    try:
+        data = loads(raw, backend)
+    except ValueError as e:
+        return None, f'JSON解析失败: {e}'
+    reason = validate_record(data)
+    if reason:
+        return None, reason
+    return Submission.from_payload(data), None
+
+
+def decode_submission(raw, backend=None):
+    """
+    把一个文件的内容直接解码为 Submission
+
+    Returns:
+        (Submission或None, 错误原因或None)
+    """
+    backend = backend or BACKEND
+    if backend != 'msgspec':
+        return _decode_submission_json(raw, backend)
+
+    try:
+        payload = _PAYLOAD_DECODER.decode(raw)
+        parse_timestamp(payload.timestamp)
+    except _DECODE_ERRORS:
+        return _decode_submission_json(raw, 'json')
+    answers = memoryview(payload.answers)
+    if answers and answers[:1] != b'{' and answers != b'null':
+        return _decode_submission_json(raw, 'json')
+
+    if payload.final is not msgspec.UNSET or payload.dimension_scores is not msgspec.UNSET:
+        final = payload.final or _Final()
+        route = (final.main_route, final.sub_route, final.isDirect)
+        dimension_scores = payload.dimension_scores or None
+    else:
+        result = payload.result or _Result()
+        route = (result.mainRoute, result.subRoute, result.isDirect)
+        dimension_scores = payload.dimensionScores
+
+    metadata = payload.metadata or _Metadata()
+    usage = payload.usageStats or _UsageStats()
+
+    return Submission(
+        timestamp=payload.timestamp,
+        anonymous_id=payload.anonymousId or payload.userId or '',
+        main_route=route[0],
+        sub_route=route[1],
+        is_direct=route[2],
+        device_type=metadata.deviceType,
+        user_agent=metadata.userAgent,
+        completion_time=usage.completionTime,
+        scores=score_array(dimension_scores)
+    ), None
+
+
+def _submission_key(record):
+    """用于核对结果的元组（得分数组按字节比较，NaN也能比较）"""
+    return tuple(getattr(record, name) for name in record.__slots__[:-1]) + (record.scores.tobytes(),)
+
+
+def _best_time(func, blobs, repeat):
+    """多次解码取最短耗时（计时期间关闭垃圾回收，避免大量新对象触发回收造成的偏差），返回 (秒, 最后一次的结果)"""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            decoded = [func(raw) for raw in blobs]
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, decoded
+
+
+def benchmark(count, seed=0, repeat=3):
+    """在合成数据上比较各后端，返回 [{backend, loads_per_second, submissions_per_second, identical}]"""
+    from generate_synthetic_data import generate_payloads
+
+    # 与 data/raw 中的文件格式相同（indent=2）
+    blobs = [json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+             for data in generate_payloads(count, seed=seed)]
+    expected_data = [json.loads(raw) for raw in blobs]
+    expected = [_submission_key(_decode_submission_json(raw, 'json')[0]) for raw in blobs]
+
+    results = []
+    for backend in BACKENDS:
+        loads_seconds, decoded = _best_time(lambda raw: loads(raw, backend), blobs, repeat)
+        submission_seconds, submissions = _best_time(lambda raw: decode_submission(raw, backend)[0], blobs, repeat)
+        results.append({
+            'backend': backend,
+            'loads_per_second': round(count / loads_seconds),
+            'submissions_per_second': round(count / submission_seconds),
+            'identical': decoded == expected_data and [_submission_key(s) for s in submissions] == expected
+        })
+    return results
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='快速JSON解码')
+    parser.add_argument('--benchmark', action='store_true', help='比较各后端的解码速度')
+    parser.add_argument('--count', type=int, default=20000, help='基准测试的数据条数（默认20000）')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据的随机种子（默认0）')
+
+    args = parser.parse_args()
+
+    print(f'🔧 可用后端: {", ".join(BACKENDS)}（当前使用 {BACKEND}）')
+    if not args.benchmark:
+        return
+
+    print(f'⏱️ 解码 {args.count} 条合成数据...')
+    results = benchmark(args.count, args.seed)
+    baseline = results[-1]
+    print(f'\n{"后端":<10}{"字典/秒":>12}{"Submission/秒":>16}{"加速":>8}  结果一致')
+    for row in results:
+        speedup = row['submissions_per_second'] / baseline['submissions_per_second']
+        print(f'{row["backend"]:<10}{row["loads_per_second"]:>12}{row["submissions_per_second"]:>16}'
+              f'{speedup:>7.1f}x  {"✅" if row["identical"] else "❌"}')
+
+
+if __name__ == '__main__':
+    main()
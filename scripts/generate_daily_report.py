@@ -4,42 +4,37 @@
 包含详细的统计分析和可视化图表
 """
 
+import argparse
+import importlib.util
 import json
 import os
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from collections import Counter, defaultdict
 import sys
 
-# 尝试导入可视化库（如果可用）
-try:
-    import matplotlib
-    matplotlib.use('Agg')  # 无GUI后端
-    import matplotlib.pyplot as plt
-    import seaborn as sns
-    HAS_VIZ = True
-except ImportError:
-    HAS_VIZ = False
-    print('⚠️ 未安装matplotlib/seaborn，将跳过图表生成')
+import instrumentation
+from data_loader import iter_submissions, parse_timestamp
+from report_cache import ReportCache, digest
+from startup_profile import profile_startup
+
+# 可视化库只检查是否安装，真正绘图时才导入（导入matplotlib本身就要几百毫秒）
+HAS_VIZ = importlib.util.find_spec('matplotlib') is not None
+if not HAS_VIZ:
+    print('⚠️ 未安装matplotlib，将跳过图表生成')
 
 def load_recent_data(days=7):
     """加载最近N天的数据"""
-    data_dir = Path('data/raw')
-    cutoff_date = datetime.now() - timedelta(days=days)
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
     recent_data = []
 
-    if not data_dir.exists():
-        return recent_data
-
-    for json_file in data_dir.glob('test_*.json'):
+    # 先按日期分区粗筛（多留一天余量），再按时间戳精确过滤
+    for record in iter_submissions(since=(cutoff_date - timedelta(days=1)).date()):
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                test_time = datetime.fromisoformat(data['timestamp'].replace('Z', '+00:00'))
-                if test_time >= cutoff_date:
-                    recent_data.append(data)
+            if parse_timestamp(record.timestamp) >= cutoff_date:
+                recent_data.append(record)
         except Exception as e:
-            print(f"⚠️ 读取文件失败 {json_file}: {e}")
+            print(f"⚠️ 时间戳无效 {record.anonymous_id}: {e}")
 
     return recent_data
 
@@ -54,53 +49,95 @@ def generate_report_data(recent_data):
     if not recent_data:
         return report
 
+    # pandas只在有数据时导入
+    from aggregation import build_frame, describe_completion_time, describe_dimensions, value_distribution
+
+    # 一次性构建DataFrame，后续统计均为向量化计算
+    frame = build_frame(recent_data)
+
     # 每日测试数量
-    daily_counts = defaultdict(int)
-    for data in recent_data:
-        date_str = data['timestamp'][:10]
-        daily_counts[date_str] += 1
-    report['daily_counts'] = dict(sorted(daily_counts.items()))
+    report['daily_counts'] = dict(sorted(value_distribution(frame['date']).items()))
 
     # 路线分布
-    routes = [d['result']['mainRoute'] for d in recent_data if 'result' in d]
-    report['route_distribution'] = dict(Counter(routes))
+    report['route_distribution'] = value_distribution(frame['mainRoute'])
 
     # 维度得分分析
-    dimension_scores = defaultdict(list)
-    for data in recent_data:
-        if 'dimensionScores' in data:
-            for dim, score in data['dimensionScores'].items():
-                dimension_scores[dim].append(score)
-
-    report['dimension_stats'] = {
-        dim: {
-            'average': round(sum(scores) / len(scores), 2),
-            'min': min(scores),
-            'max': max(scores),
-            'count': len(scores)
-        }
-        for dim, scores in dimension_scores.items()
-    }
+    report['dimension_stats'] = describe_dimensions(frame)
 
     # 设备统计
-    devices = [d['metadata']['deviceType'] for d in recent_data if 'metadata' in d]
-    report['device_distribution'] = dict(Counter(devices))
+    report['device_distribution'] = value_distribution(frame['deviceType'])
 
     # 完成时间分析
-    completion_times = [d['usageStats']['completionTime'] / 1000 / 60
-                       for d in recent_data if 'usageStats' in d]
-    if completion_times:
-        report['completion_time_stats'] = {
-            'average_minutes': round(sum(completion_times) / len(completion_times), 2),
-            'min_minutes': round(min(completion_times), 2),
-            'max_minutes': round(max(completion_times), 2)
-        }
+    completion_time_stats = describe_completion_time(frame)
+    if completion_time_stats:
+        report['completion_time_stats'] = completion_time_stats
+
+    # 图表用的分桶直方图
+    add_histograms(report, {dim: value_distribution(frame[dim]) for dim in report['dimension_stats']},
+                   value_distribution(frame['completionMinutes']))
+
+    return report
+
+def generate_report_from_store(days=7, workers=1):
+    """
+    在SQLite查询库中生成报表数据（与 generate_report_data 的结构相同）
+
+    计数直接用SQL分组统计；维度得分和完成时长只取回取值分布，再计算分位数等统计量。
+    """
+    import query_store
+
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
+    with query_store.open_store(workers=workers, sync_first=False) as conn:
+        with instrumentation.stage('load'):
+            query_store.sync(conn, workers=workers)
+
+        with instrumentation.stage('aggregate'):
+            report = {
+                'generated_at': datetime.now().isoformat(),
+                'period': f'最近{days}天',
+                'total_tests': query_store.count_submissions(conn, since=cutoff_date)
+            }
+            if not report['total_tests']:
+                return report
+
+            from aggregation import describe_value_counts
+
+            def by_count(counts):
+                return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+
+            report['daily_counts'] = dict(sorted(query_store.value_counts(conn, 'day', cutoff_date).items()))
+            report['route_distribution'] = by_count(query_store.value_counts(conn, 'main_route', cutoff_date))
+            score_counts = query_store.score_value_counts(conn, cutoff_date)
+            report['dimension_stats'] = {dim: describe_value_counts(counts) for dim, counts in score_counts.items()}
+            report['device_distribution'] = by_count(query_store.value_counts(conn, 'device_type', cutoff_date))
+
+            completion = Counter()
+            for milliseconds, count in query_store.completion_value_counts(conn, cutoff_date).items():
+                completion[milliseconds / 1000 / 60] += count
+            minutes = describe_value_counts(completion)
+            if minutes:
+                report['completion_time_stats'] = {
+                    f'{key}_minutes': minutes[key] for key in ('average', 'min', 'max', 'median', 'p90', 'p99')
+                }
+            add_histograms(report, score_counts, completion)
 
     return report
 
+def add_histograms(report, score_counts, completion_counts):
+    """把维度得分和完成时长（分钟）的取值分布汇总为图表用的分桶直方图"""
+    from charts import COMPLETION_EDGES, SCORE_EDGES, bin_counts
+
+    report['dimension_histograms'] = {dim: bin_counts(counts, SCORE_EDGES) for dim, counts in score_counts.items()}
+    if completion_counts:
+        report['completion_histogram'] = bin_counts(completion_counts, COMPLETION_EDGES)
+
+def report_path():
+    """今天的报表文件路径"""
+    return Path(f'data/reports/daily_report_{datetime.now().strftime("%Y%m%d")}.json')
+
 def save_report(report):
     """保存报表为JSON"""
-    report_file = Path(f'data/reports/daily_report_{datetime.now().strftime("%Y%m%d")}.json')
+    report_file = report_path()
     report_file.parent.mkdir(parents=True, exist_ok=True)
 
     with open(report_file, 'w', encoding='utf-8') as f:
@@ -109,74 +146,72 @@ def save_report(report):
     print(f'✅ 报表已保存: {report_file}')
     return report_file
 
-def generate_charts(report):
-    """生成可视化图表"""
-    if not HAS_VIZ:
-        return
+def report_digest(report):
+    """报表内容摘要（不含生成时间）"""
+    return digest({key: value for key, value in report.items() if key != 'generated_at'})
 
-    try:
-        charts_dir = Path('data/reports/charts')
-        charts_dir.mkdir(parents=True, exist_ok=True)
-
-        # 设置中文字体
-        plt.rcParams['font.sans-serif'] = ['SimHei', 'Arial Unicode MS']
-        plt.rcParams['axes.unicode_minus'] = False
-
-        # 1. 路线分布饼图
-        if 'route_distribution' in report and report['route_distribution']:
-            plt.figure(figsize=(10, 6))
-            routes = list(report['route_distribution'].keys())
-            counts = list(report['route_distribution'].values())
-            plt.pie(counts, labels=routes, autopct='%1.1f%%', startangle=90)
-            plt.title('学习路线分布')
-            plt.savefig(charts_dir / f'routes_{datetime.now().strftime("%Y%m%d")}.png', dpi=150, bbox_inches='tight')
-            plt.close()
-
-        # 2. 每日测试趋势图
-        if 'daily_counts' in report and report['daily_counts']:
-            plt.figure(figsize=(12, 6))
-            dates = list(report['daily_counts'].keys())
-            counts = list(report['daily_counts'].values())
-            plt.plot(dates, counts, marker='o', linewidth=2, markersize=8)
-            plt.title('每日测试数量趋势')
-            plt.xlabel('日期')
-            plt.ylabel('测试数量')
-            plt.xticks(rotation=45)
-            plt.grid(True, alpha=0.3)
-            plt.tight_layout()
-            plt.savefig(charts_dir / f'daily_trend_{datetime.now().strftime("%Y%m%d")}.png', dpi=150, bbox_inches='tight')
-            plt.close()
-
-        print(f'📊 图表已生成: {charts_dir}')
-
-    except Exception as e:
-        print(f'⚠️ 图表生成失败: {e}')
-
-def main():
+def main(argv=None):
     """主函数"""
-    print('📈 开始生成每日报表...')
-
-    # 加载最近7天数据
-    recent_data = load_recent_data(days=7)
-    print(f'📁 已加载 {len(recent_data)} 条最近数据')
+    parser = argparse.ArgumentParser(description='生成每日数据报表')
+    parser.add_argument('--force', action='store_true', help='忽略缓存，强制重新生成')
+    parser.add_argument('--sql', action='store_true', help='在SQLite查询库中统计（先增量同步查询库）')
+    parser.add_argument('--workers', type=int, default=1, help='并行绘图和同步查询库的进程数（默认1）')
+    parser.add_argument('--profile-startup', action='store_true', help='打印模块导入耗时后退出')
+    instrumentation.add_arguments(parser)
 
-    # 生成报表
-    report = generate_report_data(recent_data)
+    args = parser.parse_args(argv)
 
-    # 保存报表
-    save_report(report)
-
-    # 生成图表
-    if HAS_VIZ and report['total_tests'] > 0:
-        generate_charts(report)
+    if args.profile_startup:
+        profile_startup('generate_daily_report')
+        return
 
-    # 打印摘要
-    print('\n📊 报表摘要:')
-    print(f'  - 最近7天测试数: {report["total_tests"]}')
-    if 'daily_counts' in report:
-        print(f'  - 日期范围: {min(report["daily_counts"].keys())} ~ {max(report["daily_counts"].keys())}')
-    if 'route_distribution' in report:
-        print(f'  - 最热门路线: {max(report["route_distribution"], key=report["route_distribution"].get)}')
+    with instrumentation.run('generate_daily_report', args):
+        print('📈 开始生成每日报表...')
+
+        if args.sql:
+            report = generate_report_from_store(days=7, workers=args.workers)
+            print(f'🗄️ 已从查询库统计 {report["total_tests"]} 条最近数据')
+        else:
+            # 加载最近7天数据
+            with instrumentation.stage('load'):
+                recent_data = load_recent_data(days=7)
+            instrumentation.count('recent_records', len(recent_data))
+            print(f'📁 已加载 {len(recent_data)} 条最近数据')
+
+            # 生成报表
+            with instrumentation.stage('aggregate'):
+                report = generate_report_data(recent_data)
+        cache = ReportCache()
+
+        # 保存报表（今天的报表文件已存在且内容相同时跳过；内容未变化但今天还没有报表文件时照常写入，
+        # 以前几天的同内容文件仍记在同一个缓存条目中，一起淘汰）
+        report_key = report_digest(report)
+        cached = None if args.force else cache.lookup('daily_report', report_key)
+        if cached and str(report_path()) in cached['paths']:
+            print('♻️ 报表数据未变化，跳过保存')
+        else:
+            with instrumentation.stage('write'):
+                previous = [path for path in cached['paths'] if path != str(report_path())] if cached else []
+                cache.store('daily_report', report_key, previous + [save_report(report)])
+
+        # 生成图表（每张图表的输入数据未变化时跳过）
+        if HAS_VIZ and report['total_tests'] > 0:
+            from charts import CHARTS_DIR, chart_jobs, render_charts
+
+            with instrumentation.stage('render'):
+                chart_files, rendered, skipped = render_charts(chart_jobs(report), args.workers, args.force, cache=cache)
+            if rendered:
+                print(f'📊 图表已生成: {CHARTS_DIR}（绘制 {rendered} 张，数据未变化跳过 {skipped} 张）')
+            else:
+                print(f'♻️ 图表数据未变化，跳过绘制（{skipped} 张）')
+
+        # 打印摘要
+        print('\n📊 报表摘要:')
+        print(f'  - 最近7天测试数: {report["total_tests"]}')
+        if 'daily_counts' in report:
+            print(f'  - 日期范围: {min(report["daily_counts"].keys())} ~ {max(report["daily_counts"].keys())}')
+        if 'route_distribution' in report:
+            print(f'  - 最热门路线: {max(report["route_distribution"], key=report["route_distribution"].get)}')
 
 if __name__ == '__main__':
     main()
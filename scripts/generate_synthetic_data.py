@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+生成合成测试数据
+按 github-data-collector.js 提交的数据结构生成 test_*.json，随机种子和截止时间相同时生成的文件完全相同，
+路线结果由 scoring.py 按 app.js 的评分规则计算
+
+用法:
+  python scripts/generate_synthetic_data.py --count 10000 --days 90
+  python scripts/generate_synthetic_data.py --count 1000 --output-dir /tmp/bench/data/raw --seed 42
+"""
+
+import argparse
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+from data_loader import DIMENSIONS, RAW_DIR, partition_dir
+from scoring import ANSWER_COLUMNS, DEFAULT_WEIGHTS, score_answers
+
+ROUTE_NAMES = {
+    'T1': '基础夯实路线',
+    'T2': '技术突破路线',
+    'T3': '数据驱动路线',
+    'T4': '内容创作路线',
+    'T5': '战略领航路线'
+}
+
+# (设备类型, 占比, 浏览器UA, 屏幕分辨率, 视口大小)
+DEVICES = [
+    ('desktop', 0.55, 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                      '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36', '1920x1080', '1903x969'),
+    ('mobile', 0.40, 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 '
+                     '(KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1', '390x844', '390x664'),
+    ('tablet', 0.05, 'Mozilla/5.0 (iPad; CPU OS 17_1 like Mac OS X) AppleWebKit/605.1.15 '
+                     '(KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1', '820x1180', '820x1060')
+]
+
+REFERRERS = ['direct', 'https://www.xiaohongshu.com/', 'https://www.bilibili.com/', 'https://mp.weixin.qq.com/']
+
+PAGE_URL = 'https://calvin-yi3wood.github.io/AI-learning-self-test/AI自测表.html'
+
+
+def generate_answers(rng, count):
+    """
+    生成答题矩阵
+
+    每个用户有一个整体倾向，各维度再叠加偏好和噪声，使维度得分之间相关、路线分布不均匀。
+    """
+    tendency = rng.normal(3.3, 0.6, size=(count, 1))
+    preference = rng.normal(0, 0.5, size=(count, len(DIMENSIONS)))
+    noise = rng.normal(0, 0.7, size=(count, len(ANSWER_COLUMNS)))
+    latent = tendency + np.repeat(preference, len(ANSWER_COLUMNS) // len(DIMENSIONS), axis=1) + noise
+    answers = np.clip(np.rint(latent), 1, 5).astype(int)
+
+    b1 = rng.choice(['A', 'B'], size=count, p=[0.6, 0.4])
+    b2 = rng.choice(['A', 'B'], size=count, p=[0.55, 0.45])
+    return answers, b1, b2
+
+
+def generate_payloads(count, days=90, end=None, seed=0):
+    """
+    生成合成测试数据（生成器），按时间顺序产出与网页提交结构一致的字典
+
+    Args:
+        count: 数据条数
+        days: 时间跨度（截止到end之前的days天内均匀分布）
+        end: 截止时间（默认当前UTC时间）
+        seed: 随机种子
+    """
+    rng = np.random.default_rng(seed)
+    end = end or datetime.now(timezone.utc)
+    start = end - timedelta(days=days)
+
+    answers, b1, b2 = generate_answers(rng, count)
+    scored = score_answers(answers.astype(float), b1, b2, np.full(count, np.nan))
+
+    offsets = np.sort(rng.integers(0, days * 86400 * 1000, size=count))
+    device_index = rng.choice(len(DEVICES), size=count, p=[device[1] for device in DEVICES])
+    referrer_index = rng.integers(0, len(REFERRERS), size=count)
+    completion = rng.lognormal(np.log(5 * 60 * 1000), 0.5, size=count).astype(int)
+    page_load = rng.integers(300, 3000, size=count)
+    id_bytes = rng.bytes(16 * count)
+    routes = list(DEFAULT_WEIGHTS)
+
+    for i in range(count):
+        timestamp = start + timedelta(milliseconds=int(offsets[i]))
+        main_route = scored['main_route'][i]
+        sub_route = scored['sub_route'][i]
+        is_direct = bool(scored['is_direct'][i])
+        weighted = scored['weighted_scores'][i]
+        device_type, _, user_agent, screen, viewport = DEVICES[device_index[i]]
+
+        explanation = f'根据你的测试结果，你最适合 <strong>{ROUTE_NAMES[main_route]}</strong>'
+        explanation += '（直落路线，满足关口条件）。' if is_direct else f'（加权得分 {weighted[routes.index(main_route)]} 分）。'
+        if sub_route:
+            explanation += f' 同时，<strong>{ROUTE_NAMES[sub_route]}</strong> 也很适合你作为辅助方向。'
+
+        row = answers[i]
+        yield {
+            'timestamp': timestamp.strftime('%Y-%m-%dT%H:%M:%S.') + f'{timestamp.microsecond // 1000:03d}Z',
+            'anonymousId': str(uuid.UUID(bytes=id_bytes[16 * i:16 * (i + 1)], version=4)),
+            'answers': {
+                **{dim: row[j * 3:(j + 1) * 3].tolist() for j, dim in enumerate(DIMENSIONS)},
+                'B1': str(b1[i]),
+                'B2': str(b2[i])
+            },
+            'dimensionScores': {dim: float(score) for dim, score in zip(DIMENSIONS, scored['dimension_scores'][i])},
+            'result': {
+                'mainRoute': main_route,
+                'subRoute': sub_route,
+                'isDirect': is_direct,
+                'scores': {} if is_direct else {route: float(score) for route, score in zip(routes, weighted)},
+                'explanation': explanation,
+                'shareText': f'🤖 我完成了「嵩说AI | AI学习自测表」！\n\n✨ 我的学习路线：{ROUTE_NAMES[main_route]}'
+            },
+            'metadata': {
+                'deviceType': device_type,
+                'screenResolution': screen,
+                'viewportSize': viewport,
+                'userAgent': user_agent,
+                'language': 'zh-CN',
+                'timezone': 'Asia/Shanghai',
+                'referrer': REFERRERS[referrer_index[i]],
+                'pageUrl': PAGE_URL
+            },
+            'usageStats': {
+                'completionTime': int(completion[i]),
+                'pageLoadTime': int(page_load[i]),
+                'estimatedPageViews': 5
+            }
+        }
+
+
+def write_payloads(payloads, raw_dir=RAW_DIR):
+    """按日期分区写入 test_YYYYMMDD_HHMMSS_<id>.json，返回写入的文件数"""
+    written = 0
+    created_dirs = set()
+    for data in payloads:
+        test_time = datetime.fromisoformat(data['timestamp'].replace('Z', '+00:00'))
+        directory = partition_dir(test_time.date(), raw_dir)
+        if directory not in created_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            created_dirs.add(directory)
+
+        json_file = directory / f'test_{test_time.strftime("%Y%m%d_%H%M%S")}_{data["anonymousId"]}.json'
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        written += 1
+    return written
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='生成合成测试数据')
+    parser.add_argument('--count', type=int, default=1000, help='生成的数据条数（默认1000）')
+    parser.add_argument('--days', type=int, default=90, help='时间跨度天数（默认90天）')
+    parser.add_argument('--end', help='截止日期 YYYY-MM-DD（默认当前时间）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认0）')
+    parser.add_argument('--output-dir', default=str(RAW_DIR), help='输出目录（默认 data/raw）')
+
+    args = parser.parse_args()
+
+    end = datetime.fromisoformat(args.end).replace(tzinfo=timezone.utc) if args.end else None
+    print(f'🧪 开始生成 {args.count} 条合成测试数据...')
+    written = write_payloads(generate_payloads(args.count, args.days, end, args.seed), Path(args.output_dir))
+    print(f'✅ 已写入 {written} 个文件到 {args.output_dir}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+批量导入测试数据
+一次处理多条提交：校验后写入 data/raw 日期分区，只更新一次汇总统计，可选只产生一次git提交
+
+输入可以是：
+  - NDJSON文件（.ndjson / .jsonl，每行一条提交）
+  - JSON文件（单条提交或提交数组）
+  - 目录（其中每个 *.json 文件为一条提交，导入成功后删除，未通过校验的移到 data/quarantine）
+"""
+
+import argparse
+import json
+import subprocess
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import cube
+import instrumentation
+import sketches
+import update_summary
+from data_loader import file_key, parse_timestamp, partition_dir
+from quarantine import quarantine_file, quarantine_payload, validate_payload
+from records import decode_records
+from startup_profile import profile_startup
+
+def read_payloads(source):
+    """
+    读取一个输入源，产出 (来源描述, 数据或None, 错误原因或None, 源文件或None)
+
+    目录中的文件会作为源文件返回，导入成功后由调用方删除。
+    """
+    source = Path(source)
+
+    if source.is_dir():
+        for spool_file in sorted(source.glob('*.json')):
+            try:
+                with open(spool_file, 'r', encoding='utf-8') as f:
+                    yield spool_file.name, json.load(f), None, spool_file
+            except Exception as e:
+                yield spool_file.name, None, f'JSON解析失败: {e}', spool_file
+        return
+
+    if source.suffix in ('.ndjson', '.jsonl'):
+        with open(source, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield f'{source.name}:{line_no}', json.loads(line), None, None
+                except ValueError as e:
+                    yield f'{source.name}:{line_no}', None, f'JSON解析失败: {e}', None
+        return
+
+    try:
+        with open(source, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+    except Exception as e:
+        yield source.name, None, f'JSON解析失败: {e}', None
+        return
+
+    payloads = content if isinstance(content, list) else [content]
+    for index, data in enumerate(payloads):
+        yield f'{source.name}[{index}]', data, None, None
+
+
+def submission_name(test_time, anonymous_id):
+    """提交的文件名（批量导入和 collect-data.yml 的单条保存共用，由提交自身的时间戳得到）"""
+    return f'test_{test_time.strftime("%Y%m%d_%H%M%S")}_{anonymous_id}.json'
+
+
+def target_file(data):
+    """提交在日期分区中的文件路径"""
+    test_time = parse_timestamp(data['timestamp'])
+    return partition_dir(test_time.date()) / submission_name(test_time, data['anonymousId'])
+
+
+class CompactedIndex:
+    """
+    已压缩提交的文件名索引
+
+    原始文件被压缩进 data/compacted 后就不存在了，只检查文件是否存在会把重复提交当作新数据。
+    按需读取提交日期前后的分区（时间戳带时区偏移时分区可能相差一天），只读取时间戳和ID两列；
+    每个分区的索引按 (修改时间, 大小) 缓存，分区被追加后自动重新读取。
+    """
+
+    def __init__(self):
+        self._partitions = {}
+
+    def _names(self, partition_file):
+        """一个分区中全部提交的文件名"""
+        key = file_key(partition_file)
+        cached = self._partitions.get(partition_file)
+        if cached is None or cached[0] != key:
+            from columnar_store import read_partition
+
+            columns = read_partition(partition_file, ['timestamp', 'anonymousId'])
+            names = set()
+            for timestamp, anonymous_id in zip(columns['timestamp'].tolist(), columns['anonymousId'].tolist()):
+                try:
+                    names.add(submission_name(parse_timestamp(timestamp), anonymous_id))
+                except ValueError:
+                    continue
+            cached = self._partitions[partition_file] = (key, names)
+        return cached[1]
+
+    def __contains__(self, json_file):
+        """json_file 对应的提交是否已在某个压缩分区中"""
+        from columnar_store import COMPACTED_DIR
+
+        if not COMPACTED_DIR.exists():
+            return False
+        day = date(*(int(part) for part in json_file.parent.parts[-3:]))
+        for offset in (-1, 0, 1):
+            candidate = day + timedelta(days=offset)
+            for name in (candidate.strftime('%Y-%m'), candidate.isoformat()):
+                partition_file = COMPACTED_DIR / f'{name}.npz'
+                if partition_file.exists() and json_file.name in self._names(partition_file):
+                    return True
+        return False
+
+
+def is_duplicate(json_file, seen, compacted):
+    """本批已出现、原始文件已存在或已被压缩的提交都算重复"""
+    return json_file in seen or json_file.exists() or json_file in compacted
+
+
+def write_payload(json_file, data):
+    """写入一条提交"""
+    json_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(json_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def save_single(payload_file):
+    """
+    保存单条提交（collect-data.yml 使用），返回写入的文件；同一条提交已保存或已压缩时返回None
+
+    文件名与批量导入相同，同一条提交不论从哪条路径到达都只保存一次；时间戳无法解析时按当前UTC时间命名。
+    """
+    with open(payload_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    try:
+        json_file = target_file(data)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        now = datetime.now(timezone.utc)
+        json_file = partition_dir(now.date()) / submission_name(now, data.get('anonymousId', ''))
+
+    if is_duplicate(json_file, set(), CompactedIndex()):
+        return None
+    write_payload(json_file, data)
+    return json_file
+
+
+def ingest_batch(sources, dry_run=False):
+    """
+    批量导入
+
+    未通过校验的提交移到隔离目录（spool目录中的文件整个移走，不会在下次导入时再次被拒绝）。
+
+    Returns:
+        (已写入的文件列表, 已导入的数据列表, 被拒绝的 [(来源, 原因)], 重复条数)
+    """
+    written_files = []
+    accepted = []
+    rejected = []
+    duplicates = 0
+    spool_files = []
+    seen = set()
+    compacted = CompactedIndex()
+
+    for source in sources:
+        for label, data, error, spool_file in read_payloads(source):
+            reason = error or validate_payload(data)
+            if reason:
+                rejected.append((label, reason))
+                if not dry_run:
+                    if spool_file is not None:
+                        quarantine_file(spool_file, reason)
+                    else:
+                        quarantine_payload(label, data, reason)
+                continue
+
+            json_file = target_file(data)
+            if is_duplicate(json_file, seen, compacted):
+                duplicates += 1
+            else:
+                seen.add(json_file)
+                if not dry_run:
+                    with instrumentation.stage('write'):
+                        write_payload(json_file, data)
+                written_files.append(json_file)
+                accepted.append(data)
+
+            if spool_file is not None:
+                spool_files.append(spool_file)
+
+    # 写入全部成功后再清理spool目录
+    if not dry_run:
+        for spool_file in spool_files:
+            spool_file.unlink()
+
+    return written_files, accepted, rejected, duplicates
+
+
+def fold_into_summary(written_files, accepted):
+    """把本批数据一次性累加进汇总统计（并记录为已累加的文件）"""
+    state = update_summary.load_state()
+    if state is None:
+        # 没有增量状态时全量重建（已包含刚写入的文件），草图和立方体在同一次遍历中得到
+        aggregates = update_summary.rebuild_aggregates()
+        with instrumentation.stage('write'):
+            update_summary.save_state(aggregates.state)
+            update_summary.save_summary(aggregates.state.to_summary())
+            aggregates.save_derived()
+        return
+
+    records = list(decode_records(accepted))
+    with instrumentation.stage('aggregate'):
+        for record in records:
+            state.add(record)
+        state.folded_files.update(json_file.as_posix() for json_file in written_files)
+        state.prune_folded_files()
+
+    with instrumentation.stage('write'):
+        update_summary.save_state(state)
+        update_summary.save_summary(state.to_summary())
+        sketches.add_records(records)
+        cube.add_records(records)
+
+
+def add_to_query_store(written_files, accepted):
+    """查询库已启用（文件存在）时，把本批数据批量写入查询库"""
+    import query_store
+
+    if not query_store.STORE_FILE.exists():
+        return
+    with query_store.open_store(sync_first=False) as conn, instrumentation.stage('write'):
+        inserted = query_store.add_files(conn, zip(written_files, accepted))
+    print(f'🗄️ 已写入查询库: {inserted} 条')
+
+
+def git_commit(count):
+    """把本批数据作为一次提交"""
+    subprocess.run(['git', 'add', 'data/'], check=True)
+    staged = subprocess.run(['git', 'diff', '--cached', '--quiet'])
+    if staged.returncode == 0:
+        print('ℹ️ 无新数据需要提交')
+        return
+    subprocess.run(['git', 'commit', '-m', f'📊 批量新增测试数据 {count} 条'], check=True)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='批量导入测试数据')
+    parser.add_argument('sources', nargs='*', help='NDJSON/JSON文件或spool目录')
+    parser.add_argument('--dry-run', action='store_true', help='只校验不写入')
+    parser.add_argument('--commit', action='store_true', help='导入后产生一次git提交')
+    parser.add_argument('--single', metavar='FILE', help='只保存一条提交并输出文件路径，已存在时输出为空（不更新汇总，供 collect-data.yml 使用）')
+    parser.add_argument('--profile-startup', action='store_true', help='打印模块导入耗时后退出')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        profile_startup('ingest_batch')
+        return
+
+    if args.single:
+        json_file = save_single(args.single)
+        print(json_file or '')
+        return
+
+    if not args.sources:
+        parser.error('至少需要一个输入文件或目录')
+
+    with instrumentation.run('ingest_batch', args):
+        print('📥 开始批量导入测试数据...')
+        written_files, accepted, rejected, duplicates = ingest_batch(args.sources, dry_run=args.dry_run)
+        instrumentation.count('ingested_records', len(accepted))
+
+        print(f'  - 新增: {len(written_files)} 条')
+        print(f'  - 重复跳过: {duplicates} 条')
+        print(f'  - 校验失败: {len(rejected)} 条')
+        for label, reason in rejected[:10]:
+            print(f'    ❌ {label}: {reason}')
+        if len(rejected) > 10:
+            print(f'    ... 还有 {len(rejected) - 10} 条')
+
+        if args.dry_run:
+            print('\n🔍 预览模式，不会实际写入')
+            return
+
+        if accepted:
+            fold_into_summary(written_files, accepted)
+            add_to_query_store(written_files, accepted)
+            if args.commit:
+                git_commit(len(accepted))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+本地数据接收服务（asyncio）
+接收 github-data-collector.js 的 submitToBackend 提交的 dataPackage，可以代替外部API自行部署。
+
+每条提交先校验再放入内存队列，满N条或最早一条等待满T毫秒时成组提交（group commit）：
+一次写入全部文件、一次累加汇总状态、一次保存汇总、草图和计数立方体。数据写入后才返回响应，
+因此返回 {"success": true} 的提交都已落盘。未通过校验的请求每批合并写入隔离目录中的一个NDJSON文件，
+每批最多保留 MAX_REJECTED_PER_FLUSH 条，超出的只计数。
+
+接口:
+  POST /submit（或 /）  提交一条数据，返回 {"success": true, "status": "stored" | "duplicate"}
+  GET  /metrics         接收、写入、重复、拒绝计数和提交延迟分位数
+  GET  /health          存活检查
+
+用法:
+  python scripts/ingest_server.py --port 8787 --batch-size 500 --flush-ms 50
+  python scripts/ingest_server.py --load-test 20000 --concurrency 64   # 对已启动的服务压测
+"""
+
+import argparse
+import asyncio
+import json
+import signal
+import time
+from collections import Counter
+from datetime import datetime
+
+import cube
+import instrumentation
+import sketches
+import update_summary
+from ingest_batch import CompactedIndex, is_duplicate, target_file, write_payload
+from quarantine import quarantine_payloads, validate_payload
+from records import decode_records
+from sketches import Histogram
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8787
+
+# 成组提交的条数上限和最长等待时间
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_MS = 50
+
+# 单个请求体的大小上限
+MAX_BODY_SIZE = 1024 * 1024
+
+# 每批最多保留的被拒绝提交，超出的只计数、不写入隔离目录
+MAX_REJECTED_PER_FLUSH = 100
+
+STATUS_TEXT = {200: 'OK', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found',
+               413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+# 浏览器跨域提交需要的响应头
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'POST, GET, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type'
+}
+
+
+class GroupCommitWriter:
+    """
+    成组写入（在工作线程中执行，同一时间只有一次提交）
+
+    汇总状态和计数立方体常驻内存，每批只保存一次，不需要重新读取文件。
+    """
+
+    def __init__(self):
+        self.state = update_summary.load_state()
+        if self.state is None:
+            self.state = update_summary.rebuild_state()
+        self.cube = cube.load_cube() or cube.Cube()
+        self.compacted = CompactedIndex()
+
+    def commit(self, payloads, rejected=()):
+        """写入一批已校验的提交，返回每条的结果（'stored' 或 'duplicate'）"""
+        if rejected:
+            quarantine_payloads(f'requests_{datetime.now().strftime("%Y%m%d_%H%M%S_%f")}', rejected)
+
+        statuses = []
+        written_files = []
+        accepted = []
+        seen = set()
+        for data in payloads:
+            json_file = target_file(data)
+            if is_duplicate(json_file, seen, self.compacted):
+                statuses.append('duplicate')
+                continue
+            seen.add(json_file)
+            write_payload(json_file, data)
+            written_files.append(json_file)
+            accepted.append(data)
+            statuses.append('stored')
+
+        if accepted:
+            records = list(decode_records(accepted))
+            for record in records:
+                self.state.add(record)
+                self.cube.add(record)
+            self.state.folded_files.update(json_file.as_posix() for json_file in written_files)
+            update_summary.save_state(self.state)
+            update_summary.save_summary(self.state.to_summary(), quiet=True)
+            sketches.add_records(records)
+            cube.save_cube(self.cube)
+            self.add_to_query_store(written_files, accepted)
+        instrumentation.count('ingested_records', len(accepted))
+        return statuses
+
+    @staticmethod
+    def add_to_query_store(written_files, accepted):
+        """查询库已启用（文件存在）时同步写入"""
+        import query_store
+
+        if not query_store.STORE_FILE.exists():
+            return
+        with query_store.open_store(sync_first=False) as conn:
+            query_store.add_files(conn, zip(written_files, accepted))
+
+
+class IngestServer:
+    """HTTP接收服务：校验、排队，由后台任务按条数或时间成组提交"""
+
+    def __init__(self, writer, batch_size=DEFAULT_BATCH_SIZE, flush_ms=DEFAULT_FLUSH_MS):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.pending = []
+        self.rejected = []
+        self.counters = Counter()
+        # 从收到请求到写入完成的延迟、每次提交的耗时（毫秒，对数分桶）
+        self.commit_latency = Histogram('log')
+        self.flush_time = Histogram('log')
+        self.started = time.time()
+        self.stopping = False
+        self._has_pending = asyncio.Event()
+        self._full = asyncio.Event()
+
+    async def submit(self, data):
+        """排队一条已校验的提交，等待所在批次写入后返回结果"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((data, future, time.perf_counter()))
+        self._has_pending.set()
+        if len(self.pending) >= self.batch_size:
+            self._full.set()
+        return await future
+
+    async def flush(self):
+        """把当前队列作为一批写入"""
+        batch, self.pending = self.pending, []
+        rejected, self.rejected = self.rejected, []
+        self._has_pending.clear()
+        self._full.clear()
+        if not batch and not rejected:
+            return
+
+        start = time.perf_counter()
+        try:
+            statuses = await asyncio.get_running_loop().run_in_executor(
+                None, self.writer.commit, [data for data, _, _ in batch], rejected)
+        except Exception as e:
+            print(f'❌ 写入失败（{len(batch)} 条）: {e}')
+            self.counters['errors'] += len(batch)
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        finished = time.perf_counter()
+        self.flush_time.add((finished - start) * 1000)
+        self.counters['flushes'] += 1
+        for (_, future, received), status in zip(batch, statuses):
+            self.commit_latency.add((finished - received) * 1000)
+            self.counters[status] += 1
+            future.set_result(status)
+
+    async def flush_loop(self):
+        """后台任务：有数据后最多等待 flush_ms，或提前凑满 batch_size 条时提交；停止时写入剩余队列后退出"""
+        while not self.stopping:
+            await self._has_pending.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def stop(self, flusher):
+        """停止后台任务（等待正在进行的提交完成），再写入剩余队列"""
+        self.stopping = True
+        self._has_pending.set()
+        self._full.set()
+        await flusher
+        await self.flush()
+
+    def snapshot(self):
+        """当前指标"""
+        flushes = self.counters['flushes']
+        return {
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'pending': len(self.pending),
+            'requests': self.counters['requests'],
+            'accepted': self.counters['accepted'],
+            'rejected': self.counters['rejected'],
+            'rejected_not_quarantined': self.counters['rejected_dropped'],
+            'stored': self.counters['stored'],
+            'duplicates': self.counters['duplicate'],
+            'errors': self.counters['errors'],
+            'flushes': flushes,
+            'average_batch': round((self.counters['stored'] + self.counters['duplicate']) / flushes, 1)
+            if flushes else 0,
+            'commit_latency_ms': self.commit_latency.describe(),
+            'flush_ms': self.flush_time.describe()
+        }
+
+    async def dispatch(self, method, path, body):
+        """处理一个请求，返回 (状态码, 响应数据)"""
+        path = path.split('?', 1)[0]
+        if method == 'OPTIONS':
+            return 204, None
+        if method == 'GET' and path == '/metrics':
+            return 200, self.snapshot()
+        if method == 'GET' and path == '/health':
+            return 200, {'success': True}
+        if method != 'POST' or path not in ('/', '/submit'):
+            return 404, {'success': False, 'error': '未知接口'}
+
+        self.counters['requests'] += 1
+        try:
+            data = json.loads(body)
+            reason = validate_payload(data)
+        except ValueError as e:
+            data, reason = None, f'JSON解析失败: {e}'
+        if reason:
+            self.counters['rejected'] += 1
+            if len(self.rejected) < MAX_REJECTED_PER_FLUSH:
+                self.rejected.append((f'request_{self.counters["requests"]}', data, reason))
+                # 只有无效请求时也要按时写入隔离目录
+                self._has_pending.set()
+            else:
+                self.counters['rejected_dropped'] += 1
+            return 400, {'success': False, 'error': reason}
+
+        self.counters['accepted'] += 1
+        try:
+            status = await self.submit(data)
+        except Exception as e:
+            return 500, {'success': False, 'error': str(e)}
+        return 200, {'success': True, 'status': status}
+
+    async def handle_connection(self, reader, writer):
+        """处理一个连接（HTTP/1.1，支持keep-alive）"""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, path, version = lines[0].split(' ', 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.respond(writer, 400, {'success': False, 'error': 'Content-Length无效'}, keep_alive=False)
+                    break
+                if length > MAX_BODY_SIZE:
+                    await self.respond(writer, 413, {'success': False, 'error': '请求体过大'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload = await self.dispatch(method, path, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def respond(writer, status, payload, keep_alive=True):
+        """写出JSON响应"""
+        body = b'' if payload is None else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json; charset=utf-8',
+            'Content-Length': str(len(body)),
+            'Connection': 'keep-alive' if keep_alive else 'close',
+            **CORS_HEADERS
+        }
+        head = f'HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n'
+        head += ''.join(f'{name}: {value}\r\n' for name, value in headers.items()) + '\r\n'
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+async def serve(host, port, batch_size, flush_ms):
+    """启动服务，收到 SIGINT/SIGTERM 后写入剩余队列再退出"""
+    server_state = IngestServer(GroupCommitWriter(), batch_size, flush_ms)
+    flusher = asyncio.create_task(server_state.flush_loop())
+    server = await asyncio.start_server(server_state.handle_connection, host, port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f'🚀 接收服务已启动: http://{host}:{port}/submit（每 {batch_size} 条或 {flush_ms} 毫秒提交一次）')
+    async with server:
+        await stop.wait()
+        server.close()
+        await server_state.stop(flusher)
+
+    return server_state.snapshot()
+
+
+async def _request(reader, writer, method, path, body=b''):
+    """压测客户端：在keep-alive连接上发送一个请求，返回 (状态码, 响应体)"""
+    head = f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n'
+    head += f'Content-Length: {len(body)}\r\n\r\n'
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+    response = await reader.readuntil(b'\r\n\r\n')
+    lines = response.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ')[1])
+    length = 0
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, await reader.readexactly(length)
+
+
+async def load_test(host, port, count, concurrency, seed):
+    """用合成数据压测已启动的服务，返回 (结果统计, 服务端指标)"""
+    from generate_synthetic_data import generate_payloads
+
+    bodies = [json.dumps(data, ensure_ascii=False).encode('utf-8')
+              for data in generate_payloads(count, days=1, seed=seed)]
+    statuses = Counter()
+    latency = Histogram('log')
+
+    async def worker(chunk):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for body in chunk:
+                start = time.perf_counter()
+                status, _ = await _request(reader, writer, 'POST', '/submit', body)
+                latency.add((time.perf_counter() - start) * 1000)
+                statuses[status] += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(bodies[i::concurrency]) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await asyncio.open_connection(host, port)
+    _, body = await _request(reader, writer, 'GET', '/metrics')
+    writer.close()
+
+    result = {
+        'requests': count,
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 2),
+        'requests_per_second': round(count / elapsed, 1),
+        'statuses': {str(status): n for status, n in sorted(statuses.items())},
+        'latency_ms': latency.describe()
+    }
+    return result, json.loads(body)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='本地数据接收服务（成组提交）')
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f'监听地址（默认{DEFAULT_HOST}）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'监听端口（默认{DEFAULT_PORT}）')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f'凑满N条立即提交（默认{DEFAULT_BATCH_SIZE}）')
+    parser.add_argument('--flush-ms', type=int, default=DEFAULT_FLUSH_MS,
+                        help=f'最早一条等待满T毫秒后提交（默认{DEFAULT_FLUSH_MS}）')
+    parser.add_argument('--load-test', type=int, metavar='N', help='不启动服务，向已启动的服务发送N条合成提交')
+    parser.add_argument('--concurrency', type=int, default=64, help='压测的并发连接数（默认64）')
+    parser.add_argument('--seed', type=int, default=0, help='压测数据的随机种子（默认0）')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    if args.load_test:
+        print(f'🔥 压测 http://{args.host}:{args.port}/submit: {args.load_test} 条，{args.concurrency} 个连接...')
+        result, server_metrics = asyncio.run(
+            load_test(args.host, args.port, args.load_test, args.concurrency, args.seed))
+        print(json.dumps({'client': result, 'server': server_metrics}, ensure_ascii=False, indent=2))
+        return
+
+    with instrumentation.run('ingest_server', args):
+        metrics = asyncio.run(serve(args.host, args.port, args.batch_size, args.flush_ms))
+        print('\n🛑 服务已停止:')
+        print(json.dumps(metrics, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+运行指标
+记录各阶段（load/parse/aggregate/render/write/cleanup）的耗时、计数和峰值内存，
+通过 --metrics 写入JSON，通过 --profile 对指定阶段运行cProfile
+
+各脚本共享同一份指标：流水线在同一进程中调用其他脚本时，所有阶段都记录在一起，
+阶段按所属脚本区分。并行读取时子进程中的解析耗时和计数不会被统计。
+"""
+
+import json
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块，不记录峰值内存
+    resource = None
+
+STAGES = ['load', 'parse', 'aggregate', 'render', 'write', 'cleanup']
+
+# parse 按文件逐个累加耗时（json解析本身是C实现），不能用cProfile分析
+PROFILE_STAGES = [name for name in STAGES if name != 'parse']
+
+
+def peak_rss_mb():
+    """当前进程的峰值常驻内存（MB），无法获取时返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux上单位为KB，macOS上为字节
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class Metrics:
+    """
+    一次运行的指标
+
+    stages 以 (脚本, 阶段) 为键累加耗时和调用次数，并记录阶段结束时的峰值内存；
+    counters 记录数据条数、读取字节数等计数。
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.started_at = datetime.now().isoformat()
+        self.scripts = []
+        self._running = []
+        self.stages = {}
+        self.counters = Counter()
+        self.profile_stage = None
+        self.profiler = None
+        self._profile_depth = 0
+
+    @property
+    def script(self):
+        """当前正在运行的脚本"""
+        return self._running[-1] if self._running else None
+
+    def add_time(self, name, seconds):
+        """累加一个阶段的耗时"""
+        entry = self.stages.setdefault((self.script, name), {'seconds': 0.0, 'calls': 0, 'peak_rss_mb': None})
+        entry['seconds'] += seconds
+        entry['calls'] += 1
+        entry['peak_rss_mb'] = peak_rss_mb()
+
+    @contextmanager
+    def stage(self, name):
+        """计时一个阶段（可重复进入，耗时累加）"""
+        profiling = self.profile_stage == name and self.profiler is not None
+        if profiling:
+            self._profile_depth += 1
+            if self._profile_depth == 1:
+                self.profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+            if profiling:
+                self._profile_depth -= 1
+                if self._profile_depth == 0:
+                    self.profiler.disable()
+
+    def to_dict(self):
+        """导出为可JSON序列化的指标"""
+        return {
+            'started_at': self.started_at,
+            'scripts': self.scripts,
+            'total_seconds': round(time.perf_counter() - self.started, 3),
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': [
+                {'script': script, 'stage': name, 'seconds': round(entry['seconds'], 3),
+                 'calls': entry['calls'], 'peak_rss_mb': entry['peak_rss_mb']}
+                for (script, name), entry in self.stages.items()
+            ],
+            'counters': dict(self.counters)
+        }
+
+
+# 当前进程的指标（同一进程中的所有脚本共享）
+_METRICS = Metrics()
+
+
+def stage(name):
+    """计时一个阶段：with stage('load'): ..."""
+    return _METRICS.stage(name)
+
+
+def add_time(name, seconds):
+    """累加一个阶段的耗时（用于无法整体包裹的逐条计时，如解析每个文件）"""
+    _METRICS.add_time(name, seconds)
+
+
+def count(name, value=1):
+    """累加一个计数"""
+    _METRICS.counters[name] += value
+
+
+def add_arguments(parser):
+    """给脚本添加 --metrics 和 --profile 参数"""
+    parser.add_argument('--metrics', metavar='FILE', help='把各阶段耗时、计数和峰值内存写入JSON文件')
+    parser.add_argument('--profile', metavar='STAGE', choices=PROFILE_STAGES,
+                        help=f'用cProfile分析指定阶段并打印热点（{"/".join(PROFILE_STAGES)}）')
+
+
+@contextmanager
+def run(script, args):
+    """
+    包裹脚本主体：记录所属脚本，结束时按参数输出指标和cProfile结果
+
+    嵌套调用（流水线中调用其他脚本的main）时只由最外层输出。
+    """
+    metrics_file = getattr(args, 'metrics', None)
+    profile_stage = getattr(args, 'profile', None)
+    if profile_stage:
+        import cProfile
+
+        _METRICS.profile_stage = profile_stage
+        _METRICS.profiler = cProfile.Profile()
+
+    if script not in _METRICS.scripts:
+        _METRICS.scripts.append(script)
+    _METRICS._running.append(script)
+    try:
+        yield _METRICS
+    finally:
+        _METRICS._running.pop()
+        if profile_stage:
+            print_profile(profile_stage, metrics_file)
+        if metrics_file:
+            write_metrics(metrics_file)
+
+
+def print_profile(profile_stage, metrics_file=None, top=25):
+    """打印被分析阶段的热点函数，有指标文件时在旁边保存 .prof 文件"""
+    import pstats
+
+    profiler = _METRICS.profiler
+    _METRICS.profile_stage = None
+    _METRICS.profiler = None
+    if not any(name == profile_stage for _, name in _METRICS.stages):
+        print(f'⚠️ 本次运行没有经过阶段 {profile_stage}')
+        return
+
+    print(f'\n🔬 阶段 {profile_stage} 的cProfile热点（按累计耗时）:')
+    stats = pstats.Stats(profiler, stream=sys.stdout)
+    stats.sort_stats('cumulative').print_stats(top)
+    if metrics_file:
+        profile_file = Path(metrics_file).with_suffix(f'.{profile_stage}.prof')
+        profile_file.parent.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(profile_file)
+        print(f'💾 cProfile结果已保存: {profile_file}')
+
+
+def write_metrics(metrics_file):
+    """写入指标JSON"""
+    metrics_file = Path(metrics_file)
+    metrics_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(metrics_file, 'w', encoding='utf-8') as f:
+        json.dump(_METRICS.to_dict(), f, ensure_ascii=False, indent=2)
+    print(f'📏 运行指标已保存: {metrics_file}')
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+迁移原始数据目录结构
+把平铺在 data/raw 下的 test_*.json 移动到 data/raw/YYYY/MM/DD/ 日期分区
+"""
+
+import argparse
+
+from data_loader import RAW_DIR, file_date, parse_timestamp, partition_dir, read_test_file
+
+def partition_raw_data(dry_run=False):
+    """
+    把平铺的原始文件移动到日期分区
+
+    Args:
+        dry_run: 只预览不实际移动
+    """
+    if not RAW_DIR.exists():
+        print('⚠️ 数据目录不存在')
+        return
+
+    moved_count = 0
+    for json_file in sorted(RAW_DIR.glob('test_*.json')):
+        day = file_date(json_file)
+        if day is None:
+            # 文件名中没有日期时才读取时间戳
+            data = read_test_file(json_file)
+            if data is None:
+                continue
+            try:
+                day = parse_timestamp(data['timestamp']).date()
+            except Exception as e:
+                print(f"⚠️ 处理文件失败 {json_file}: {e}")
+                continue
+
+        target = partition_dir(day) / json_file.name
+        if dry_run:
+            print(f'  - {json_file.name} -> {target.parent}')
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            json_file.rename(target)
+        moved_count += 1
+
+    if dry_run:
+        print(f'\n🔍 预览模式，共 {moved_count} 个文件待迁移')
+    else:
+        print(f'✅ 已迁移 {moved_count} 个文件')
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='迁移原始数据到日期分区目录')
+    parser.add_argument('--dry-run', action='store_true', help='只预览不实际移动')
+
+    args = parser.parse_args()
+
+    print('📂 开始迁移原始数据目录...')
+    partition_raw_data(dry_run=args.dry_run)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+隔离无效的测试数据
+导入时未通过校验的提交、读取时发现的无效文件都移到 data/quarantine/，
+旁边的 <文件名>.reason.json 记录来源、原因和隔离时间，便于人工检查后修复或删除。
+
+用法:
+  python scripts/quarantine.py              # 列出已知无效的文件
+  python scripts/quarantine.py --move       # 把已知无效的文件从 data/raw 移到隔离目录
+"""
+
+import argparse
+import json
+import re
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+
+import instrumentation
+from data_loader import BAD_FILES_LOG, QUARANTINE_DIR, file_key, known_bad_files, load_test_file, validate_record
+
+# anonymousId 会出现在文件名中，只允许安全字符
+ANONYMOUS_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def validate_payload(data):
+    """
+    校验一条新提交，合法时返回None，否则返回原因
+
+    结构与 github-data-collector.js 的 dataPackage 一致，比 validate_record 更严格。
+    """
+    reason = validate_record(data)
+    if reason:
+        return reason
+
+    anonymous_id = data.get('anonymousId')
+    if not isinstance(anonymous_id, str) or not ANONYMOUS_ID_PATTERN.match(anonymous_id):
+        return 'anonymousId无效'
+
+    result = data.get('result')
+    if not isinstance(result, dict) or not isinstance(result.get('mainRoute'), str):
+        return '缺少result.mainRoute'
+
+    if not isinstance(data.get('dimensionScores'), dict):
+        return 'dimensionScores无效'
+
+    return None
+
+
+def _unique_target(name):
+    """隔离目录中不与已有文件重名的路径"""
+    target = QUARANTINE_DIR / name
+    index = 1
+    while target.exists():
+        target = QUARANTINE_DIR / f'{Path(name).stem}_{index}{Path(name).suffix}'
+        index += 1
+    return target
+
+
+def _write_reason(target, source, reason):
+    """在隔离文件旁边记录原因"""
+    info = {
+        'source': str(source),
+        'reason': reason,
+        'quarantined_at': datetime.now(timezone.utc).isoformat()
+    }
+    with open(target.with_name(target.name + '.reason.json'), 'w', encoding='utf-8') as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+
+
+def quarantine_file(json_file, reason):
+    """把一个文件移到隔离目录，返回新路径"""
+    json_file = Path(json_file)
+    QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+    target = _unique_target(json_file.name)
+    shutil.move(str(json_file), target)
+    _write_reason(target, json_file, reason)
+    return target
+
+
+def quarantine_payload(label, data, reason):
+    """
+    把一条没有对应文件的提交（NDJSON中的一行、JSON数组中的一项）写入隔离目录
+
+    JSON解析失败时没有数据，只记录来源和原因。
+    """
+    QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+    name = re.sub(r'[^A-Za-z0-9_.-]', '_', label)
+    target = _unique_target(f'{name}.json')
+    if data is not None:
+        with open(target, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+    _write_reason(target, label, reason)
+    return target
+
+
+def quarantine_payloads(label, entries):
+    """
+    把一批没有对应文件的提交写入隔离目录中的一个NDJSON文件，返回文件路径
+
+    每行记录来源、原因、隔离时间和数据（JSON解析失败时数据为null）。接收服务每次成组提交只写一个文件，
+    不为每个无效请求单独建文件。
+
+    Args:
+        entries: [(来源描述, 数据或None, 原因), ...]
+    """
+    QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+    target = _unique_target(f'{re.sub(r"[^A-Za-z0-9_.-]", "_", label)}.ndjson')
+    quarantined_at = datetime.now(timezone.utc).isoformat()
+    with open(target, 'w', encoding='utf-8') as f:
+        for source, data, reason in entries:
+            f.write(json.dumps({'source': str(source), 'reason': reason, 'quarantined_at': quarantined_at,
+                                'data': data}, ensure_ascii=False) + '\n')
+    return target
+
+
+def quarantine_invalid_files(files):
+    """校验新提交的文件，把无效的移到隔离目录，返回有效的文件列表"""
+    valid = []
+    for json_file in files:
+        data, reason = load_test_file(json_file)
+        reason = reason or validate_payload(data)
+        if reason:
+            target = quarantine_file(json_file, reason)
+            print(f'🚧 已隔离无效文件 {json_file} -> {target}: {reason}')
+            continue
+        valid.append(json_file)
+    return valid
+
+
+def read_bad_files_log():
+    """读取负缓存中每个路径的最后一条记录 {路径: 记录}"""
+    entries = {}
+    if BAD_FILES_LOG.exists():
+        with open(BAD_FILES_LOG, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    entries[entry['path']] = entry
+                except (ValueError, KeyError, TypeError):
+                    continue
+    return entries
+
+
+def write_bad_files_log(entries):
+    """重写负缓存（只保留仍然存在且未修改的文件）"""
+    kept = []
+    for path, entry in entries.items():
+        try:
+            if file_key(path) == (entry['mtime_ns'], entry['size']):
+                kept.append(entry)
+        except OSError:
+            continue
+
+    if not kept and not BAD_FILES_LOG.exists():
+        return kept
+    with open(BAD_FILES_LOG, 'w', encoding='utf-8') as f:
+        for entry in kept:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+    known_bad_files(reload=True)
+    return kept
+
+
+def move_known_bad():
+    """把负缓存中仍然无效的文件移到隔离目录，返回移动的文件数"""
+    entries = read_bad_files_log()
+    moved = 0
+    for path, entry in list(entries.items()):
+        try:
+            unchanged = file_key(path) == (entry['mtime_ns'], entry['size'])
+        except OSError:
+            continue
+        if unchanged:
+            quarantine_file(path, entry['reason'])
+            moved += 1
+    write_bad_files_log(entries)
+    return moved
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description='隔离无效的测试数据')
+    parser.add_argument('--move', action='store_true', help='把已知无效的文件移到隔离目录')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    with instrumentation.run('quarantine', args):
+        if args.move:
+            moved = move_known_bad()
+            print(f'🚧 已隔离 {moved} 个无效文件（{QUARANTINE_DIR}）')
+            return
+
+        entries = write_bad_files_log(read_bad_files_log())
+        if not entries:
+            print('✅ 没有已知的无效文件')
+            return
+        print(f'🚧 已知无效的文件 {len(entries)} 个:')
+        for entry in entries:
+            print(f'  - {entry["path"]}: {entry["reason"]}')
+
+
+if __name__ == '__main__':
+    main()
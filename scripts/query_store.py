@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+SQLite查询库
+把全部测试数据同步到 data/query_store.sqlite，每条提交一行、每个维度一列，
+时间、主路线、副路线和设备类型都建有索引，临时统计直接写SQL即可，不需要重新解析JSON
+
+库中记录了每个来源文件（原始JSON或压缩分区）的大小和修改时间，同步时只读取新增或变化的文件，
+已删除文件的数据随之删除；批量导入时直接写入本批数据。
+
+用法:
+  python scripts/query_store.py                # 同步数据
+  python scripts/query_store.py --rebuild      # 删除后全量重建
+  python scripts/query_store.py --query "SELECT device_type, COUNT(*) FROM submissions WHERE main_route = 'T3' GROUP BY 1"
+"""
+
+import argparse
+import sqlite3
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+import instrumentation
+from data_loader import DATA_DIR, DIMENSIONS, chunked, dataset_fingerprint, parse_timestamp, read_test_files
+from records import Submission
+
+STORE_FILE = DATA_DIR / 'query_store.sqlite'
+
+# 每个事务写入的来源文件数
+INSERT_BATCH_SIZE = 5000
+
+SCORE_COLUMNS = [f'dim_{dim}' for dim in DIMENSIONS]
+
+SUBMISSION_COLUMNS = ['source', 'timestamp', 'submitted_at', 'day', 'anonymous_id', 'main_route', 'sub_route',
+                      'is_direct', 'device_type', 'user_agent', 'completion_time'] + SCORE_COLUMNS
+
+# 允许分组统计的列
+GROUP_COLUMNS = {'day', 'main_route', 'sub_route', 'is_direct', 'device_type'}
+
+SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    source TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    submitted_at TEXT NOT NULL,
+    day TEXT NOT NULL,
+    anonymous_id TEXT,
+    main_route TEXT,
+    sub_route TEXT,
+    is_direct INTEGER NOT NULL,
+    device_type TEXT,
+    user_agent TEXT,
+    completion_time REAL,
+    {', '.join(f'{column} REAL' for column in SCORE_COLUMNS)}
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_submitted_at ON submissions (submitted_at);
+CREATE INDEX IF NOT EXISTS idx_submissions_main_route ON submissions (main_route);
+CREATE INDEX IF NOT EXISTS idx_submissions_sub_route ON submissions (sub_route);
+CREATE INDEX IF NOT EXISTS idx_submissions_device_type ON submissions (device_type);
+CREATE INDEX IF NOT EXISTS idx_submissions_source ON submissions (source);
+'''
+
+INSERT_SQL = (f'INSERT INTO submissions ({", ".join(SUBMISSION_COLUMNS)}) '
+              f'VALUES ({", ".join("?" for _ in SUBMISSION_COLUMNS)})')
+
+
+def connect(store_file=STORE_FILE):
+    """打开查询库（不存在时创建表和索引）"""
+    store_file = Path(store_file)
+    store_file.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(store_file)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    # 旧版查询库没有修改时间列：补上后所有来源都视为已变化，重新同步一次
+    if 'mtime_ns' not in {row[1] for row in conn.execute('PRAGMA table_info(sources)')}:
+        conn.execute('ALTER TABLE sources ADD COLUMN mtime_ns INTEGER')
+    return conn
+
+
+@contextmanager
+def open_store(store_file=STORE_FILE, workers=1, sync_first=True):
+    """打开查询库并先同步数据，退出时关闭连接"""
+    conn = connect(store_file)
+    try:
+        if sync_first:
+            sync(conn, workers=workers)
+        yield conn
+    finally:
+        conn.close()
+
+
+def submission_row(source, record):
+    """Submission 对应的一行（NaN得分存为NULL）"""
+    try:
+        submitted_at = parse_timestamp(record.timestamp).strftime('%Y-%m-%dT%H:%M:%S.%f')
+    except ValueError:
+        submitted_at = record.timestamp
+    scores = [score if score == score else None for score in record.scores]
+    return (source, record.timestamp, submitted_at, record.date, record.anonymous_id, record.main_route,
+            record.sub_route, int(record.is_direct), record.device_type, record.user_agent,
+            record.completion_time) + tuple(scores)
+
+
+def row_to_submission(row):
+    """查询结果行（SUBMISSION_COLUMNS 中 source 之后的列）还原为 Submission"""
+    timestamp, _, _, anonymous_id, main_route, sub_route, is_direct, device_type, user_agent, completion_time = row[:10]
+    scores = array('d', (float('nan') if score is None else score for score in row[10:]))
+    return Submission(timestamp, anonymous_id, main_route, sub_route, is_direct, device_type, user_agent,
+                      completion_time, scores)
+
+
+def insert_sources(conn, sources):
+    """
+    写入一批来源文件及其中的提交，每 INSERT_BATCH_SIZE 个文件一个事务
+
+    Args:
+        sources: [(文件路径, (文件大小, 修改时间ns), [Submission, ...]), ...]
+    """
+    inserted = 0
+    for batch in chunked(list(sources), INSERT_BATCH_SIZE):
+        rows = [submission_row(path, record) for path, _, records in batch for record in records]
+        with conn:
+            conn.executemany('DELETE FROM submissions WHERE source = ?', [(path,) for path, _, _ in batch])
+            conn.executemany('INSERT OR REPLACE INTO sources (path, size, mtime_ns) VALUES (?, ?, ?)',
+                             [(path, size, mtime_ns) for path, (size, mtime_ns), _ in batch])
+            conn.executemany(INSERT_SQL, rows)
+        inserted += len(rows)
+    return inserted
+
+
+def add_files(conn, files):
+    """写入新导入的原始文件：files 为 [(文件路径, 数据), ...]"""
+    sources = []
+    for json_file, data in files:
+        stat = Path(json_file).stat()
+        sources.append((Path(json_file).as_posix(), (stat.st_size, stat.st_mtime_ns), [Submission.from_payload(data)]))
+    return insert_sources(conn, sources)
+
+
+def _partition_records(partition_file):
+    """读取一个压缩分区中的全部提交"""
+    from columnar_store import columns_to_records, read_partition
+
+    return [Submission.from_payload(data) for data in columns_to_records(read_partition(partition_file))]
+
+
+def sync(conn, workers=1):
+    """
+    按数据集指纹同步查询库
+
+    删除已不存在或大小、修改时间变化的来源文件的数据，再写入新增和变化的文件。
+
+    Returns:
+        (删除的来源数, 写入的提交数)
+    """
+    current = {path: (size, mtime_ns) for path, size, mtime_ns in dataset_fingerprint()}
+    stored = {path: (size, mtime_ns) for path, size, mtime_ns in conn.execute('SELECT path, size, mtime_ns FROM sources')}
+
+    removed = [path for path, key in stored.items() if current.get(path) != key]
+    if removed:
+        with conn:
+            conn.executemany('DELETE FROM submissions WHERE source = ?', [(path,) for path in removed])
+            conn.executemany('DELETE FROM sources WHERE path = ?', [(path,) for path in removed])
+
+    added = [path for path, key in current.items() if stored.get(path) != key]
+    inserted = 0
+    raw_files = [path for path in added if path.endswith('.json')]
+    for batch in chunked(raw_files, INSERT_BATCH_SIZE):
+        parsed = {Path(json_file).as_posix(): data for json_file, data in read_test_files(batch, workers=workers)}
+        # 解析失败的文件也记录下来（没有数据行），文件不变时不再重复读取
+        inserted += insert_sources(conn, [
+            (path, current[path], [Submission.from_payload(parsed[path])] if path in parsed else [])
+            for path in batch
+        ])
+
+    for path in added:
+        if path.endswith('.npz'):
+            inserted += insert_sources(conn, [(path, current[path], _partition_records(path))])
+
+    return len(removed), inserted
+
+
+def _window(since=None):
+    """时间窗口条件：since 为UTC时间，只包含该时间及之后的提交"""
+    if since is None:
+        return '', ()
+    return 'WHERE submitted_at >= ?', (since.strftime('%Y-%m-%dT%H:%M:%S.%f'),)
+
+
+def count_submissions(conn, since=None):
+    """提交总数"""
+    where, params = _window(since)
+    return conn.execute(f'SELECT COUNT(*) FROM submissions {where}', params).fetchone()[0]
+
+
+def group_counts(conn, columns, since=None):
+    """
+    按列分组计数（空值也作为一组），按各组首次出现的时间排序
+
+    Returns:
+        [(取值1, 取值2, ..., 数量), ...]
+    """
+    unknown = set(columns) - GROUP_COLUMNS
+    if unknown:
+        raise ValueError(f'不支持分组的列: {", ".join(sorted(unknown))}')
+
+    where, params = _window(since)
+    names = ', '.join(columns)
+    return conn.execute(f'SELECT {names}, COUNT(*) FROM submissions {where} '
+                        f'GROUP BY {names} ORDER BY MIN(submitted_at)', params).fetchall()
+
+
+def value_counts(conn, column, since=None):
+    """一列的取值分布 {取值: 数量}（忽略空值）"""
+    return {value: count for value, count in group_counts(conn, [column], since) if value is not None}
+
+
+def score_value_counts(conn, since=None):
+    """各维度得分的取值分布 {维度: Counter({得分: 数量})}，没有得分的维度不包含在内"""
+    where, params = _window(since)
+    distributions = {}
+    for dim, column in zip(DIMENSIONS, SCORE_COLUMNS):
+        condition = f'{where} AND {column} IS NOT NULL' if where else f'WHERE {column} IS NOT NULL'
+        rows = conn.execute(f'SELECT {column}, COUNT(*) FROM submissions {condition} GROUP BY {column}', params)
+        counts = Counter(dict(rows.fetchall()))
+        if counts:
+            distributions[dim] = counts
+    return distributions
+
+
+def completion_value_counts(conn, since=None):
+    """完成时长（毫秒）的取值分布"""
+    where, params = _window(since)
+    condition = f'{where} AND completion_time IS NOT NULL' if where else 'WHERE completion_time IS NOT NULL'
+    rows = conn.execute(f'SELECT completion_time, COUNT(*) FROM submissions {condition} GROUP BY 1', params)
+    return Counter(dict(rows.fetchall()))
+
+
+def day_value_counts(conn, column):
+    """每天一列（维度得分或完成时长）的取值分布 [(日期, 取值, 数量), ...]（忽略空值）"""
+    if column not in SCORE_COLUMNS and column != 'completion_time':
+        raise ValueError(f'不支持的列: {column}')
+    return conn.execute(f'SELECT day, {column}, COUNT(*) FROM submissions '
+                        f'WHERE {column} IS NOT NULL GROUP BY day, {column}').fetchall()
+
+
+def summary_state(conn):
+    """汇总统计的累加状态（与 update_summary.SummaryState.to_dict 的结构相同）"""
+    total, first, last = conn.execute('SELECT COUNT(*), MIN(timestamp), MAX(timestamp) FROM submissions').fetchone()
+    sums = conn.execute(f'SELECT {", ".join(f"SUM({c}), COUNT({c})" for c in SCORE_COLUMNS)} FROM submissions').fetchone()
+
+    dimension_sums = {}
+    dimension_counts = {}
+    for i, dim in enumerate(DIMENSIONS):
+        total_score, count = sums[2 * i], sums[2 * i + 1]
+        if count:
+            dimension_sums[dim] = total_score
+            dimension_counts[dim] = count
+
+    return {
+        'total_tests': total,
+        'first_test_date': first,
+        'last_test_date': last,
+        'route_counts': value_counts(conn, 'main_route'),
+        'device_counts': value_counts(conn, 'device_type'),
+        'dimension_sums': dimension_sums,
+        'dimension_counts': dimension_counts,
+        'daily_counts': value_counts(conn, 'day')
+    }
+
+
+def iter_submissions(conn, since=None):
+    """
+    读取 Submission（生成器）
+
+    顺序与 data_loader.iter_submissions 相同：先是原始文件（按文件名），再是压缩分区
+    （按分区名，分区内保持写入顺序），导出结果与直接读取文件时逐行一致。
+    """
+    where, params = _window(since)
+    columns = ', '.join(SUBMISSION_COLUMNS[1:])
+    conn.create_function('file_name', 1, lambda path: path.rsplit('/', 1)[-1], deterministic=True)
+    order = "source LIKE '%.npz', file_name(source), rowid"
+    for row in conn.execute(f'SELECT {columns} FROM submissions {where} ORDER BY {order}', params):
+        yield row_to_submission(row)
+
+
+def print_query(conn, sql):
+    """执行一条SQL并以表格形式打印结果"""
+    cursor = conn.execute(sql)
+    rows = cursor.fetchall()
+    if cursor.description is None:
+        print('✅ 已执行')
+        return
+
+    headers = [column[0] for column in cursor.description]
+    cells = [[('' if value is None else str(value)) for value in row] for row in rows]
+    widths = [max([len(header)] + [len(row[i]) for row in cells]) for i, header in enumerate(headers)]
+    print('  '.join(header.ljust(width) for header, width in zip(headers, widths)))
+    for row in cells:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)))
+    print(f'({len(rows)} 行)')
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='同步和查询SQLite查询库')
+    parser.add_argument('--rebuild', action='store_true', help='删除查询库后全量重建')
+    parser.add_argument('--query', help='同步后执行一条SQL并打印结果')
+    parser.add_argument('--workers', type=int, default=1, help='并行读取数据的进程数（默认1）')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    with instrumentation.run('query_store', args):
+        if args.rebuild:
+            for suffix in ('', '-wal', '-shm'):
+                Path(f'{STORE_FILE}{suffix}').unlink(missing_ok=True)
+
+        print(f'🗄️ 同步查询库: {STORE_FILE}')
+        with open_store(workers=args.workers, sync_first=False) as conn:
+            with instrumentation.stage('load'):
+                removed, inserted = sync(conn, workers=args.workers)
+            print(f'  - 删除过期来源: {removed} 个')
+            print(f'  - 写入提交: {inserted} 条')
+            print(f'  - 库中提交总数: {count_submissions(conn)} 条')
+
+            if args.query:
+                print()
+                with instrumentation.stage('aggregate'):
+                    print_query(conn, args.query)
+
+
+if __name__ == '__main__':
+    main()
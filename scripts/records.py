@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+紧凑的测试提交记录
+原始JSON只解码一次，聚合脚本统一使用 Submission，不再逐层查找嵌套字典
+"""
+
+import sys
+from array import array
+
+from data_loader import DIMENSIONS
+
+_MISSING_SCORES = array('d', [float('nan')] * len(DIMENSIONS))
+_DIMENSION_INDEX = {dim: index for index, dim in enumerate(DIMENSIONS)}
+
+
+def _intern(value):
+    """驻留取值有限的字符串（路线、设备、浏览器），相同取值共享同一个对象"""
+    return sys.intern(value) if isinstance(value, str) else None
+
+
+class Submission:
+    """
+    一条测试提交
+
+    兼容两种数据格式：
+      - 网页收集：anonymousId / dimensionScores / result / metadata / usageStats
+      - sample_results：userId / dimension_scores / final.main_route / final.sub_route
+
+    八个维度得分按 DIMENSIONS 顺序存放在定长浮点数组中，缺失的维度为NaN；
+    缺失的路线、设备、完成时长为None。
+    """
+
+    __slots__ = ('timestamp', 'anonymous_id', 'main_route', 'sub_route', 'is_direct',
+                 'device_type', 'user_agent', 'completion_time', 'scores')
+
+    def __init__(self, timestamp, anonymous_id='', main_route=None, sub_route=None, is_direct=False,
+                 device_type=None, user_agent=None, completion_time=None, scores=None):
+        self.timestamp = timestamp
+        self.anonymous_id = anonymous_id
+        self.main_route = _intern(main_route)
+        self.sub_route = _intern(sub_route)
+        self.is_direct = bool(is_direct)
+        self.device_type = _intern(device_type)
+        self.user_agent = _intern(user_agent)
+        self.completion_time = completion_time
+        self.scores = scores if scores is not None else array('d', _MISSING_SCORES)
+
+    @classmethod
+    def from_payload(cls, data):
+        """从任一格式的原始数据解码"""
+        if 'final' in data or 'dimension_scores' in data:
+            final = data.get('final') or {}
+            result = {
+                'mainRoute': final.get('main_route'),
+                'subRoute': final.get('sub_route'),
+                'isDirect': final.get('isDirect', False)
+            }
+            dimension_scores = data.get('dimension_scores')
+        else:
+            result = data.get('result') or {}
+            dimension_scores = data.get('dimensionScores')
+
+        metadata = data.get('metadata') or {}
+        usage = data.get('usageStats') or {}
+
+        return cls(
+            timestamp=data['timestamp'],
+            anonymous_id=data.get('anonymousId') or data.get('userId') or '',
+            main_route=result.get('mainRoute'),
+            sub_route=result.get('subRoute'),
+            is_direct=result.get('isDirect', False),
+            device_type=metadata.get('deviceType'),
+            user_agent=metadata.get('userAgent'),
+            completion_time=usage.get('completionTime'),
+            scores=score_array(dimension_scores)
+        )
+
+    @property
+    def date(self):
+        """提交日期 YYYY-MM-DD"""
+        return self.timestamp[:10]
+
+    def iter_scores(self):
+        """按固定顺序产出已有的 (维度, 得分)"""
+        for dim, score in zip(DIMENSIONS, self.scores):
+            if score == score:  # 跳过NaN
+                yield dim, score
+
+
+def score_array(dimension_scores):
+    """把 {维度: 得分} 转换为定长数组（不在 DIMENSIONS 中的维度被忽略）"""
+    scores = array('d', _MISSING_SCORES)
+    for dim, score in (dimension_scores or {}).items():
+        index = _DIMENSION_INDEX.get(dim)
+        if index is not None:
+            scores[index] = score
+    return scores
+
+
+def decode_records(records):
+    """把原始数据逐条解码为 Submission"""
+    for data in records:
+        yield Submission.from_payload(data)
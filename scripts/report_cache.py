@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+报表缓存
+用输入聚合数据的摘要作为键，输入没有变化时跳过图表、报表和Excel的重新生成
+"""
+
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+
+from data_loader import DATA_DIR
+
+CACHE_FILE = DATA_DIR / 'reports' / '.cache' / 'manifest.json'
+
+# 每类产物最多保留的缓存条目数，超出后最早的条目连同其文件一起删除
+MAX_ENTRIES = 30
+
+
+def digest(payload):
+    """计算可JSON序列化数据的摘要（与键顺序无关）"""
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class ReportCache:
+    """
+    产物缓存清单
+
+    清单结构：{产物类型: [{digest, paths, created}, ...]}，每类按生成顺序排列。
+    命中时不更新清单，输入不变的运行不会产生任何文件改动。
+    """
+
+    def __init__(self, manifest_file=CACHE_FILE, max_entries=MAX_ENTRIES):
+        self.manifest_file = Path(manifest_file)
+        self.max_entries = max_entries
+        self.entries = {}
+        if self.manifest_file.exists():
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"⚠️ 读取缓存清单失败 {self.manifest_file}: {e}")
+
+    def lookup(self, kind, key):
+        """查找缓存，命中且产物文件都存在时返回条目，否则返回None"""
+        for entry in self.entries.get(kind, []):
+            if entry['digest'] == key and all(Path(p).exists() for p in entry['paths']):
+                return entry
+        return None
+
+    def store(self, kind, key, paths, save=True):
+        """记录新产物，并按条目数上限淘汰最早的产物（save=False 时由调用方统一调用 save）"""
+        entries = [entry for entry in self.entries.get(kind, []) if entry['digest'] != key]
+        entries.append({
+            'digest': key,
+            'paths': [str(p) for p in paths],
+            'created': datetime.now().isoformat()
+        })
+
+        evicted = entries[:-self.max_entries] if len(entries) > self.max_entries else []
+        self.entries[kind] = entries[len(evicted):]
+        self._remove_files(evicted)
+        if save:
+            self.save()
+
+    def _remove_files(self, evicted):
+        """删除被淘汰条目的产物（仍被其他条目引用的文件保留）"""
+        in_use = {p for entries in self.entries.values() for entry in entries for p in entry['paths']}
+        for entry in evicted:
+            for path in entry['paths']:
+                if path in in_use:
+                    continue
+                try:
+                    Path(path).unlink()
+                    print(f'🗑️ 已淘汰旧产物: {path}')
+                except FileNotFoundError:
+                    pass
+
+    def save(self):
+        """保存缓存清单"""
+        self.manifest_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
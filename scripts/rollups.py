@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+每日汇总（rollup）
+每个已结束的日期（UTC）生成一份汇总 data/rollups/YYYY-MM-DD.json：
+计数、路线和设备分布、维度得分总和（SummaryState）以及分位数草图（DaySketch）
+
+每份汇总记录了当天来源（原始JSON文件、压缩分区中当天的行数和首末时间戳）的指纹，
+只有补交了迟到数据、文件被压缩等导致指纹变化时才重新计算；原始数据已被清理的日期保留原有汇总。
+任意报表窗口（滚动7/30/90天、本周、本月、全部）都是若干份每日汇总的合并，当天的数据实时计算。
+
+用法:
+  python scripts/rollups.py                           # 更新每日汇总并生成全部窗口的报表
+  python scripts/rollups.py --windows rolling_7,month
+"""
+
+import argparse
+import json
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import instrumentation
+from data_loader import DATA_DIR, file_date, iter_submissions, iter_test_files, read_test_file
+from report_cache import digest
+from sketches import DaySketch
+from update_summary import SummaryState
+
+ROLLUP_DIR = DATA_DIR / 'rollups'
+
+# 报表窗口：名称 -> 根据当天日期计算 [起始日, 结束日)
+WINDOWS = {
+    'rolling_7': lambda today: (today - timedelta(days=6), today + timedelta(days=1)),
+    'rolling_30': lambda today: (today - timedelta(days=29), today + timedelta(days=1)),
+    'rolling_90': lambda today: (today - timedelta(days=89), today + timedelta(days=1)),
+    'week': lambda today: (today - timedelta(days=today.weekday()), today + timedelta(days=1)),
+    'month': lambda today: (today.replace(day=1), today + timedelta(days=1)),
+    'all_time': lambda today: (None, today + timedelta(days=1))
+}
+
+
+class DayRollup:
+    """一天（或合并后的一段时间）的汇总：累加状态 + 分位数草图"""
+
+    def __init__(self, fingerprint=None):
+        self.fingerprint = fingerprint
+        self.state = SummaryState()
+        self.sketch = DaySketch()
+
+    def add(self, record):
+        """累加一条测试数据（Submission）"""
+        self.state.add(record)
+        self.sketch.add(record)
+
+    def merge(self, other):
+        """合并另一份汇总"""
+        self.state.merge(other.state)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def to_dict(self):
+        """导出为可JSON序列化的字典"""
+        return {
+            'fingerprint': self.fingerprint,
+            'state': self.state.to_dict(),
+            'sketch': self.sketch.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, raw):
+        """从字典恢复"""
+        rollup = cls(raw['fingerprint'])
+        rollup.state = SummaryState.from_dict(raw['state'])
+        rollup.sketch = DaySketch.from_dict(raw['sketch'])
+        return rollup
+
+
+def rollup_file(day, rollup_dir=ROLLUP_DIR):
+    """某一天的汇总文件"""
+    return Path(rollup_dir) / f'{day.isoformat()}.json'
+
+
+def load_rollups(rollup_dir=ROLLUP_DIR):
+    """读取全部每日汇总 {日期: DayRollup}"""
+    rollups = {}
+    rollup_dir = Path(rollup_dir)
+    if not rollup_dir.exists():
+        return rollups
+    for path in sorted(rollup_dir.glob('*.json')):
+        try:
+            day = date.fromisoformat(path.stem)
+        except ValueError:
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            rollups[day] = DayRollup.from_dict(json.load(f))
+    return rollups
+
+
+def save_rollup(day, rollup, rollup_dir=ROLLUP_DIR):
+    """保存一天的汇总"""
+    path = rollup_file(day, rollup_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(rollup.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+
+
+def day_sources():
+    """
+    每天的来源指纹 {日期: [(路径, 大小, 修改时间ns), ...]}
+
+    原始文件按文件名中的日期归属（无法识别时读取时间戳）；
+    压缩分区按其中每天自己的内容记为 (路径, 行数, 最早时间戳, 最晚时间戳)，
+    向当月分区追加其他日期的数据时，已有日期的指纹不变，不会被重新计算。
+    """
+    sources = defaultdict(list)
+    for json_file in iter_test_files():
+        day = file_date(json_file)
+        if day is None:
+            data = read_test_file(json_file)
+            if data is None or not isinstance(data.get('timestamp'), str):
+                continue
+            try:
+                day = date.fromisoformat(data['timestamp'][:10])
+            except ValueError:
+                continue
+        stat = json_file.stat()
+        sources[day].append((json_file.as_posix(), stat.st_size, stat.st_mtime_ns))
+
+    if (DATA_DIR / 'compacted').exists():
+        from columnar_store import iter_partitions, partition_day_stats
+
+        for partition_file in iter_partitions():
+            for day, (rows, first, last) in partition_day_stats(partition_file).items():
+                try:
+                    sources[date.fromisoformat(day)].append((partition_file.as_posix(), rows, first, last))
+                except ValueError:
+                    continue
+    return sources
+
+
+def build_rollups(days):
+    """从原始数据计算指定日期的汇总 {日期: DayRollup}（只读取相关日期的分区）"""
+    days = set(days)
+    rollups = {day: DayRollup() for day in days}
+    if not days:
+        return rollups
+
+    # 时间戳带时区偏移时，文件所在分区可能与记录日期相差一天，前后各多读一天
+    since = min(days) - timedelta(days=1)
+    until = max(days) + timedelta(days=2)
+    for record in iter_submissions(since=since, until=until):
+        try:
+            day = date.fromisoformat(record.date)
+        except ValueError:
+            continue
+        if day in rollups:
+            rollups[day].add(record)
+    return rollups
+
+
+def refresh_rollups(today, rollup_dir=ROLLUP_DIR):
+    """
+    为已结束的日期生成或更新汇总
+
+    没有汇总或来源文件指纹变化（补交了迟到数据、被压缩等）的日期重新计算；
+    来源文件已不存在的日期保留原有汇总。
+
+    Returns:
+        ({日期: DayRollup}, 重新计算的日期列表)
+    """
+    rollups = load_rollups(rollup_dir)
+    stale = {}
+    for day, files in day_sources().items():
+        if day >= today:
+            continue
+        fingerprint = digest(sorted(files))
+        if day not in rollups or rollups[day].fingerprint != fingerprint:
+            stale[day] = fingerprint
+
+    for day, rollup in build_rollups(stale).items():
+        rollup.fingerprint = stale[day]
+        save_rollup(day, rollup, rollup_dir)
+        rollups[day] = rollup
+
+    return rollups, sorted(stale)
+
+
+def window_report(name, since, until, rollups):
+    """合并 [since, until) 内的每日汇总，生成一个窗口的报表"""
+    merged = DayRollup()
+    days = 0
+    for day, rollup in rollups.items():
+        if (since and day < since) or day >= until:
+            continue
+        merged.merge(rollup)
+        days += 1
+
+    summary = merged.state.to_summary()
+    summary.pop('last_updated', None)
+    summary.pop('estimated_completion_rate', None)
+    stats = merged.sketch.describe()
+
+    report = {
+        'window': name,
+        'since': since.isoformat() if since else None,
+        'until': (until - timedelta(days=1)).isoformat(),
+        'days': days,
+        **summary
+    }
+    if summary['total_tests']:
+        report['dimension_percentiles'] = stats['dimensions']
+        if stats['completion_minutes']:
+            report['completion_time_stats'] = stats['completion_minutes']
+    return report
+
+
+def generate_window_reports(windows, today=None):
+    """更新每日汇总后生成各窗口的报表，返回 {窗口: 报表}"""
+    today = today or datetime.now(timezone.utc).date()
+
+    with instrumentation.stage('load'):
+        rollups, rebuilt = refresh_rollups(today)
+        # 当天尚未结束，实时计算，不保存
+        rollups[today] = build_rollups([today])[today]
+    print(f'📦 每日汇总: 共 {len(rollups) - 1} 天，本次重新计算 {len(rebuilt)} 天')
+
+    with instrumentation.stage('aggregate'):
+        return {name: window_report(name, *WINDOWS[name](today), rollups) for name in windows}
+
+
+def save_window_reports(reports):
+    """保存全部窗口的报表到一个JSON文件"""
+    report_file = Path(f'data/reports/rollup_report_{datetime.now().strftime("%Y%m%d")}.json')
+    report_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump({'generated_at': datetime.now().isoformat(), 'windows': reports}, f, ensure_ascii=False, indent=2)
+    print(f'✅ 窗口报表已保存: {report_file}')
+    return report_file
+
+
+def main(argv=None):
+    """主函数"""
+    parser = argparse.ArgumentParser(description='更新每日汇总并生成各窗口报表')
+    parser.add_argument('--windows', default=','.join(WINDOWS),
+                        help=f'报表窗口，逗号分隔（默认全部：{",".join(WINDOWS)}）')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args(argv)
+
+    windows = [name for name in args.windows.split(',') if name]
+    unknown = set(windows) - set(WINDOWS)
+    if unknown:
+        parser.error(f'未知窗口: {", ".join(sorted(unknown))}')
+
+    with instrumentation.run('rollups', args):
+        print('📦 开始生成窗口报表...')
+        reports = generate_window_reports(windows)
+        with instrumentation.stage('write'):
+            save_window_reports(reports)
+
+        for name, report in reports.items():
+            top_route = max(report['route_distribution'], key=report['route_distribution'].get) \
+                if report.get('route_distribution') else 'N/A'
+            print(f'  - {name:<10} {report["total_tests"]:>8} 条，最热门路线 {top_route}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+每日数据流水线
+在同一进程内依次生成每日报表、Excel报表、各窗口报表，隔离读取时发现的无效文件并清理旧数据，
+所有步骤共享一次加载的测试数据
+"""
+
+import argparse
+
+import cleanup_old_data
+import instrumentation
+import export_to_excel
+import generate_daily_report
+import quarantine
+import rollups
+from data_loader import load_submissions
+from startup_profile import profile_startup
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='每日数据流水线')
+    parser.add_argument('--days', type=int, default=90, help='保留最近N天的数据（默认90天）')
+    parser.add_argument('--skip-cleanup', action='store_true', help='不清理旧数据')
+    parser.add_argument('--cold-archive', action='store_true', help='清理前把原始数据写入压缩冷归档')
+    parser.add_argument('--workers', type=int, default=1, help='并行读取数据和绘图的进程数（默认1）')
+    parser.add_argument('--profile-startup', action='store_true', help='打印模块导入耗时后退出')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        profile_startup('run_daily_pipeline')
+        return
+
+    # 各步骤的阶段指标按脚本区分，统一由流水线输出
+    with instrumentation.run('run_daily_pipeline', args):
+        print('🚀 开始运行每日数据流水线...')
+        records = load_submissions(workers=args.workers)
+        print(f'📁 已加载 {len(records)} 条数据（所有步骤共享）')
+
+        generate_daily_report.main(['--workers', str(args.workers)])
+        export_to_excel.main([])
+        # 清理前先把已结束的日期写入每日汇总
+        rollups.main([])
+        quarantine.main(['--move'])
+
+        if not args.skip_cleanup:
+            print(f'\n🧹 开始清理数据（保留最近 {args.days} 天）...')
+            with instrumentation.stage('cleanup'):
+                cleanup_old_data.cleanup_old_data(days=args.days, cold_archive=args.cold_archive)
+
+if __name__ == '__main__':
+    main()
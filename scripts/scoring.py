@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+批量评分引擎
+用NumPy对整批答题矩阵重新评分，逐条复现 app.js 中的
+calculateDimensionScores / checkGate / calculateWeightedScores
+
+边界情况同样按 app.js 处理：答案数不为3的维度不计分（JS中为undefined，这里为NaN）；
+hours_per_week 为 null 时按0计算（TI=10），为非数字字符串时所有比较都不成立（TI=100）。
+
+用法:
+  python scripts/scoring.py                 # 用 sample_results 中的样例校验
+  python scripts/scoring.py --corpus        # 对全部已存储数据重新评分，并与存储的结果对比
+"""
+
+import argparse
+import json
+import operator
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+
+import numpy as np
+
+from data_loader import DIMENSIONS, iter_records
+
+QUESTIONS_PER_DIMENSION = 3
+
+# 答题矩阵的列顺序：TB1, TB2, TB3, LS1, ..., CR3（共24列）
+ANSWER_COLUMNS = [f'{dim}{i + 1}' for dim in DIMENSIONS for i in range(QUESTIONS_PER_DIMENSION)]
+
+# 加权模型的权重矩阵（列顺序与 DIMENSIONS 一致），与 app.js 保持同步
+DEFAULT_WEIGHTS = {
+    'T1': [15, 20, 15, 15, 10, 5, 10, 10],
+    'T2': [25, 20, 20, 15, 30, 10, 0, 20],
+    'T3': [20, 10, 15, 20, 10, 30, 0, 5],
+    'T4': [10, 20, 10, 15, 5, 0, 35, 5],
+    'T5': [15, 0, 20, 35, 10, 10, 0, 10]
+}
+
+# 关口条件：同一关口内的条件同时满足才命中，命中多个时按优先级从高到低取主、副路线
+DEFAULT_GATES = [
+    {'route': 'T5', 'priority': 5, 'conditions': [('GO', '>=', 75), ('TI', '>=', 8)]},
+    {'route': 'T2', 'priority': 4, 'conditions': [('AI', '>=', 70), ('TB', '>=', 50)]},
+    {'route': 'T3', 'priority': 3, 'conditions': [('DM', '>=', 70), ('TI', '>=', 6)]},
+    {'route': 'T4', 'priority': 2, 'conditions': [('CC', '>=', 70)]},
+    {'route': 'T1', 'priority': 1, 'conditions': [('TB', '<', 40), ('TI', '<=', 6),
+                                                  ('GO', '<=', 50), ('AI', '<=', 50)]}
+]
+
+# 加权得分的主副路线差距小于该值时才给出副路线
+SUB_ROUTE_MARGIN = 8
+
+# 每周学习时长 -> TI得分（上限, 得分），超过最后一个上限时为100
+HOURS_TO_TI = [(2, 10), (5, 30), (8, 60), (12, 80)]
+
+OPERATORS = {'>=': operator.ge, '>': operator.gt, '<=': operator.le, '<': operator.lt}
+
+DIMENSION_INDEX = {dim: index for index, dim in enumerate(DIMENSIONS)}
+
+
+def to_fixed(values, digits=1):
+    """
+    复现 JavaScript 的 +x.toFixed(digits)
+
+    toFixed 按浮点数的精确十进制值舍入，恰好在中点时远离零舍入。
+    向量化计算后，对乘以10^digits后接近中点的元素改用Decimal逐个精确舍入。
+    """
+    values = np.asarray(values, dtype=float)
+    scale = 10.0 ** digits
+    scaled = values * scale
+    rounded = np.floor(scaled + 0.5) / scale
+
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_tie.any():
+        quantum = Decimal(1).scaleb(-digits)
+        for index in zip(*np.nonzero(near_tie)):
+            rounded[index] = float(Decimal(float(values[index])).quantize(quantum, rounding=ROUND_HALF_UP))
+    return rounded
+
+
+def js_hours(value):
+    """按 JavaScript 比较时的数值转换处理每周学习时长：null和空字符串为0，无法转换的取值为无穷大"""
+    if value is None:
+        return 0.0
+    if isinstance(value, (bool, int, float)):
+        return float(value)
+    if isinstance(value, str):
+        if not value.strip():
+            return 0.0
+        try:
+            return float(value)
+        except ValueError:
+            return np.inf
+    return np.inf
+
+
+def answer_matrix(records):
+    """
+    从原始数据中提取答题矩阵
+
+    Returns:
+        (answers, b1, b2, hours)：answers为N×24浮点矩阵（未作答为NaN），
+        b1/b2为分岔题选项（未作答为空字符串），hours为每周学习时长（未填写为NaN，其余见 js_hours）
+    """
+    rows = []
+    b1 = []
+    b2 = []
+    hours = []
+    for data in records:
+        answers = data.get('answers') or {}
+        row = []
+        for dim in DIMENSIONS:
+            values = answers.get(dim)
+            if isinstance(values, list) and len(values) == QUESTIONS_PER_DIMENSION:
+                # JS求和时null按0计算
+                row.extend(0 if value is None else value for value in values)
+            else:
+                row.extend([np.nan] * QUESTIONS_PER_DIMENSION)
+        rows.append(row)
+        b1.append(answers.get('B1') or '')
+        b2.append(answers.get('B2') or '')
+        hours.append(js_hours(answers['hours_per_week']) if 'hours_per_week' in answers else np.nan)
+
+    answers = np.array(rows, dtype=float).reshape(-1, len(ANSWER_COLUMNS))
+    return answers, np.array(b1, dtype=str), np.array(b2, dtype=str), np.array(hours, dtype=float)
+
+
+def answer_matrix_from_columns(columns):
+    """
+    从列式压缩分区的列中提取答题矩阵（答案0表示未作答）
+
+    放不进列的取值（答案数不为3、非数字的每周时长等）保存在 extra 中，这里按未作答处理。
+    """
+    answers = np.column_stack([columns[f'answer_{name}'] for name in ANSWER_COLUMNS]).astype(float)
+    answers[answers == 0] = np.nan
+    return answers, columns['answer_B1'], columns['answer_B2'], columns['answer_hours_per_week']
+
+
+def dimension_scores(answers, b1, b2, hours):
+    """
+    计算维度得分（calculateDimensionScores）
+
+    每维度3题平均值 × 25 保留一位小数；B1调整LS，B2调整AI或CC；
+    填写了每周学习时长（包括null）时TI按区间映射。答案数不为3的维度为NaN。
+
+    Returns:
+        N×8 矩阵，列顺序与 DIMENSIONS 一致
+    """
+    answers = np.asarray(answers, dtype=float)
+    grouped = answers.reshape(len(answers), len(DIMENSIONS), QUESTIONS_PER_DIMENSION)
+    # 按JS的求和顺序逐题相加后除以3
+    total = grouped[:, :, 0] + grouped[:, :, 1] + grouped[:, :, 2]
+    scores = to_fixed(total / 3 * 25)
+
+    ls = DIMENSION_INDEX['LS']
+    scores[:, ls] = np.where(b1 == 'A', np.minimum(100, scores[:, ls] + 10),
+                             np.where(b1 == 'B', np.maximum(0, scores[:, ls] - 10), scores[:, ls]))
+
+    ai = DIMENSION_INDEX['AI']
+    cc = DIMENSION_INDEX['CC']
+    scores[:, ai] = np.where(b2 == 'A', np.minimum(100, scores[:, ai] + 10), scores[:, ai])
+    scores[:, cc] = np.where(b2 == 'B', np.minimum(100, scores[:, cc] + 10), scores[:, cc])
+
+    hours = np.asarray(hours, dtype=float)
+    has_hours = ~np.isnan(hours)
+    with np.errstate(invalid='ignore'):
+        ti_from_hours = np.select([hours <= limit for limit, _ in HOURS_TO_TI],
+                                  [score for _, score in HOURS_TO_TI], default=100)
+    ti = DIMENSION_INDEX['TI']
+    scores[:, ti] = np.where(has_hours, ti_from_hours, scores[:, ti])
+
+    return scores
+
+
+def gate_indices(scores, gates=DEFAULT_GATES):
+    """
+    关口检测，返回路线索引（批量模拟时避免生成字符串数组）
+
+    Returns:
+        (按优先级排序的路线列表, 命中掩码, 主路线索引, 副路线索引)，索引不小于路线数表示没有
+    """
+    gates = sorted(gates, key=lambda gate: gate['priority'], reverse=True)
+    hits = np.zeros((len(scores), len(gates)), dtype=bool)
+    with np.errstate(invalid='ignore'):
+        for column, gate in enumerate(gates):
+            hit = np.ones(len(scores), dtype=bool)
+            for dim, op, threshold in gate['conditions']:
+                hit &= OPERATORS[op](scores[:, DIMENSION_INDEX[dim]], threshold)  # NaN比较为False
+            hits[:, column] = hit
+
+    # 末尾补两列恒命中的空路线：按优先级排序后第一、二个命中的列即为主、副路线
+    padded = np.column_stack([hits, np.ones((len(scores), 2), dtype=bool)])
+    rows = np.arange(len(scores))
+    main_index = padded.argmax(axis=1)
+    padded[rows, main_index] = False
+    return [gate['route'] for gate in gates], hits.any(axis=1), main_index, padded.argmax(axis=1)
+
+
+def check_gates(scores, gates=DEFAULT_GATES):
+    """
+    关口检测（checkGate）
+
+    Returns:
+        (命中掩码, 主路线, 副路线)：未命中的行主路线为None，只命中一个关口时副路线为None
+    """
+    routes, gate_hit, main_index, sub_index = gate_indices(scores, gates)
+    names = np.array(routes + [None, None], dtype=object)
+    return gate_hit, names[main_index], names[sub_index]
+
+
+def weighted_indices(scores, weights=DEFAULT_WEIGHTS):
+    """
+    加权模型，返回路线索引（批量模拟时避免生成字符串数组）
+
+    Returns:
+        (路线列表, N×路线数 得分矩阵, 主路线索引, 副路线索引)，副路线索引等于路线数表示没有
+    """
+    routes = list(weights)
+    matrix = np.array([weights[route] for route in routes], dtype=float).T / 100
+    values = np.nan_to_num(scores, nan=0.0)
+
+    weighted = np.zeros((len(scores), len(routes)))
+    for index in range(len(DIMENSIONS)):
+        weighted += values[:, index:index + 1] * matrix[index]
+    weighted = to_fixed(weighted)
+
+    # argmax取第一个最大值，与JS稳定排序同分时保持原顺序一致
+    rows = np.arange(len(scores))
+    main_index = weighted.argmax(axis=1)
+    if len(routes) > 1:
+        rest = weighted.copy()
+        rest[rows, main_index] = -np.inf
+        second_index = rest.argmax(axis=1)
+        gap = weighted[rows, main_index] - weighted[rows, second_index]
+        sub_index = np.where(gap < SUB_ROUTE_MARGIN, second_index, len(routes))
+    else:
+        sub_index = np.full(len(scores), len(routes))
+    return routes, weighted, main_index, sub_index
+
+
+def weighted_scores(scores, weights=DEFAULT_WEIGHTS):
+    """
+    加权模型（calculateWeightedScores）
+
+    按JS的运算顺序逐维度累加 得分 × (权重 / 100)，缺失维度按0计算，结果保留一位小数。
+    主路线取最高分（同分时按权重表顺序），与次高分差距小于8时给出副路线。
+
+    Returns:
+        (N×路线数 得分矩阵, 主路线, 副路线)
+    """
+    routes, weighted, main_index, sub_index = weighted_indices(scores, weights)
+    names = np.array(routes + [None], dtype=object)
+    return weighted, names[main_index], names[sub_index]
+
+
+def score_answers(answers, b1, b2, hours, weights=DEFAULT_WEIGHTS, gates=DEFAULT_GATES):
+    """
+    对一批答题重新评分（与 app.js 的 submitTest 流程一致）
+
+    Returns:
+        {'dimension_scores', 'weighted_scores', 'main_route', 'sub_route', 'is_direct'}，
+        命中关口的行 is_direct 为True，其加权得分为NaN（app.js中为空对象）
+    """
+    scores = dimension_scores(answers, b1, b2, hours)
+    gate_hit, gate_main, gate_sub = check_gates(scores, gates)
+    weighted, weighted_main, weighted_sub = weighted_scores(scores, weights)
+    weighted[gate_hit] = np.nan
+
+    return {
+        'dimension_scores': scores,
+        'weighted_scores': weighted,
+        'main_route': np.where(gate_hit, gate_main, weighted_main),
+        'sub_route': np.where(gate_hit, gate_sub, weighted_sub),
+        'is_direct': gate_hit
+    }
+
+
+def stored_result(data):
+    """原始数据中存储的评分结果（兼容两种数据格式）：(维度得分, 主路线, 副路线, 是否直达)"""
+    if 'final' in data:
+        final = data['final']
+        return data.get('dimension_scores') or {}, final.get('main_route'), final.get('sub_route'), final.get('isDirect')
+    result = data.get('result') or {}
+    return data.get('dimensionScores') or {}, result.get('mainRoute'), result.get('subRoute'), result.get('isDirect')
+
+
+def compare_with_stored(records, scored):
+    """逐条对比重新评分结果与存储的结果，返回 [(序号, [差异说明, ...]), ...]"""
+    mismatches = []
+    for i, data in enumerate(records):
+        expected_scores, main_route, sub_route, is_direct = stored_result(data)
+        differences = []
+        for dim, expected in expected_scores.items():
+            actual = scored['dimension_scores'][i, DIMENSION_INDEX[dim]] if dim in DIMENSION_INDEX else np.nan
+            if not np.isclose(actual, expected, atol=1e-9):
+                differences.append(f'{dim}: 存储 {expected} / 重算 {actual:g}')
+        actual_route = (scored['main_route'][i], scored['sub_route'][i], bool(scored['is_direct'][i]))
+        if (main_route, sub_route, is_direct) != actual_route:
+            differences.append(f'路线: 存储 {main_route}/{sub_route}/直达={is_direct} '
+                               f'/ 重算 {actual_route[0]}/{actual_route[1]}/直达={actual_route[2]}')
+        if differences:
+            mismatches.append((i, differences))
+    return mismatches
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='批量重新评分并与存储结果对比')
+    parser.add_argument('files', nargs='*', help='要校验的JSON文件（默认 sample_results/*.json）')
+    parser.add_argument('--corpus', action='store_true', help='对全部已存储的测试数据重新评分')
+
+    args = parser.parse_args()
+
+    if args.corpus:
+        labels = None
+        records = list(iter_records())
+    else:
+        files = [Path(f) for f in args.files] or sorted(Path('sample_results').glob('*.json'))
+        labels = [f.name for f in files]
+        records = []
+        for json_file in files:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                records.append(json.load(f))
+
+    # 没有存储答题的数据无法重新评分
+    answered = [data for data in records if data.get('answers')]
+    if len(answered) < len(records):
+        print(f'ℹ️ 跳过 {len(records) - len(answered)} 条没有答题记录的数据')
+        if labels:
+            labels = [label for label, data in zip(labels, records) if data.get('answers')]
+        records = answered
+
+    if not records:
+        print('⚠️ 没有可重新评分的数据')
+        return
+
+    print(f'🧮 重新评分 {len(records)} 条数据...')
+    scored = score_answers(*answer_matrix(records))
+    mismatches = compare_with_stored(records, scored)
+
+    routes, counts = np.unique(scored['main_route'].astype(str), return_counts=True)
+    print('  - 重算路线分布: ' + ', '.join(f'{route}: {count}' for route, count in zip(routes, counts)))
+    print(f'  - 直达比例: {scored["is_direct"].mean() * 100:.1f}%')
+
+    if not mismatches:
+        print('✅ 重新评分结果与存储结果一致')
+        return
+
+    print(f'⚠️ {len(mismatches)} 条数据与存储结果不一致:')
+    for i, differences in mismatches[:20]:
+        print(f'  - {labels[i] if labels else records[i].get("anonymousId", i)}')
+        for difference in differences:
+            print(f'      {difference}')
+    if len(mismatches) > 20:
+        print(f'  ... 还有 {len(mismatches) - 20} 条')
+
+
+if __name__ == '__main__':
+    main()
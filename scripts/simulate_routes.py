@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+路线规则模拟
+用历史答题数据评估候选的权重矩阵和关口阈值，报告路线分布、直达比例和主副路线组合的变化
+
+维度得分与权重、关口无关，只计算一次并保存为临时 .npy 文件，
+各子进程以只读内存映射方式共享，每个候选配置都是一次向量化计算。
+
+用法:
+  python scripts/simulate_routes.py --grid "T5.GO>=:60,70,75,80" --grid "T2.AI:20,30,40"
+  python scripts/simulate_routes.py --random 2000 --jitter 5 --workers 4
+  python scripts/simulate_routes.py --config candidates.json --output simulation.json
+"""
+
+import argparse
+import copy
+import itertools
+import json
+import re
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from data_loader import DATA_DIR, DIMENSIONS, chunked, iter_test_files, read_test_files
+from scoring import (DEFAULT_GATES, DEFAULT_WEIGHTS, answer_matrix, answer_matrix_from_columns,
+                     dimension_scores, gate_indices, weighted_indices)
+
+# 参数名：T2.AI 表示T2路线中AI维度的权重，T5.GO>= 表示T5关口中 GO>= 条件的阈值
+PARAMETER_PATTERN = re.compile(r'^(T\d+)\.([A-Z]{2})(>=|<=|>|<)?$')
+
+# 每个子进程任务评估的配置数
+CONFIGS_PER_TASK = 50
+
+# 子进程中共享的只读数据：维度得分矩阵、基准主路线编码
+_SHARED = {}
+
+
+def load_corpus_scores(workers=1):
+    """读取全部有答题记录的数据（原始文件 + 压缩分区），返回 N×8 维度得分矩阵"""
+    records = [data for _, data in read_test_files(iter_test_files(), workers=workers) if data.get('answers')]
+    parts = [dimension_scores(*answer_matrix(records))]
+
+    if (DATA_DIR / 'compacted').exists():
+        from columnar_store import iter_partitions, read_partition
+
+        for partition_file in iter_partitions():
+            answers, b1, b2, hours = answer_matrix_from_columns(read_partition(partition_file))
+            answered = ~np.isnan(answers).all(axis=1)
+            parts.append(dimension_scores(answers[answered], b1[answered], b2[answered], hours[answered]))
+
+    return np.vstack(parts)
+
+
+def parse_parameter(name):
+    """解析参数名，返回 (路线, 维度, 比较符或None)"""
+    match = PARAMETER_PATTERN.match(name)
+    if not match or match.group(2) not in DIMENSIONS:
+        raise ValueError(f'无效的参数名: {name}（示例：T2.AI 或 T5.GO>=）')
+    return match.groups()
+
+
+def apply_overrides(overrides, weights=DEFAULT_WEIGHTS, gates=DEFAULT_GATES):
+    """
+    在基准规则上应用参数覆盖
+
+    Args:
+        overrides: {参数名: 取值}，如 {'T2.AI': 40, 'T5.GO>=': 70}
+
+    Returns:
+        (权重矩阵, 关口列表)
+    """
+    weights = {route: list(values) for route, values in weights.items()}
+    gates = copy.deepcopy(gates)
+
+    for name, value in overrides.items():
+        route, dim, op = parse_parameter(name)
+        if op is None:
+            weights[route][DIMENSIONS.index(dim)] = value
+            continue
+
+        gate = next((gate for gate in gates if gate['route'] == route), None)
+        conditions = gate['conditions'] if gate else []
+        index = next((i for i, (d, o, _) in enumerate(conditions) if d == dim and o == op), None)
+        if index is None:
+            raise ValueError(f'关口 {route} 中没有条件 {dim}{op}')
+        conditions[index] = (dim, op, value)
+
+    return weights, gates
+
+
+def grid_configs(grid):
+    """
+    网格搜索：各参数取值的笛卡尔积
+
+    Args:
+        grid: ['T5.GO>=:60,70,75', 'T2.AI:20,30', ...]
+    """
+    names = []
+    choices = []
+    for spec in grid:
+        name, _, values = spec.partition(':')
+        parse_parameter(name)
+        names.append(name)
+        choices.append([float(value) for value in values.split(',') if value])
+
+    for values in itertools.product(*choices):
+        yield dict(zip(names, values))
+
+
+def random_configs(count, jitter, seed=0):
+    """随机搜索：每个权重和阈值在基准值上随机扰动 ±jitter（权重不小于0）"""
+    rng = np.random.default_rng(seed)
+    names = [f'{route}.{dim}' for route in DEFAULT_WEIGHTS for dim in DIMENSIONS]
+    names += [f'{gate["route"]}.{dim}{op}' for gate in DEFAULT_GATES for dim, op, _ in gate['conditions']]
+    base = [weight for values in DEFAULT_WEIGHTS.values() for weight in values]
+    base += [threshold for gate in DEFAULT_GATES for _, _, threshold in gate['conditions']]
+    base = np.array(base, dtype=float)
+    weight_count = len(DEFAULT_WEIGHTS) * len(DIMENSIONS)
+
+    for _ in range(count):
+        values = base + rng.integers(-jitter, jitter + 1, size=len(base))
+        values[:weight_count] = np.maximum(values[:weight_count], 0)
+        yield dict(zip(names, values.tolist()))
+
+
+def route_list(weights, gates):
+    """所有路线（编码顺序），最后一个编码表示没有路线"""
+    return sorted(set(weights) | {gate['route'] for gate in gates})
+
+
+def evaluate(scores, routes, weights, gates):
+    """
+    对全部数据评估一套规则
+
+    Returns:
+        (主路线编码, 副路线编码, 直达掩码)，编码为 routes 中的索引，len(routes) 表示没有
+    """
+    none = len(routes)
+    gate_routes, gate_hit, gate_main, gate_sub = gate_indices(scores, gates)
+    gate_codes = np.array([routes.index(route) for route in gate_routes] + [none, none])
+    weighted_routes, _, weighted_main, weighted_sub = weighted_indices(scores, weights)
+    weighted_codes = np.array([routes.index(route) for route in weighted_routes] + [none])
+
+    main_route = np.where(gate_hit, gate_codes[gate_main], weighted_codes[weighted_main])
+    sub_route = np.where(gate_hit, gate_codes[gate_sub], weighted_codes[weighted_sub])
+    return main_route, sub_route, gate_hit
+
+
+def summarize(routes, main_route, sub_route, is_direct, baseline_main=None):
+    """汇总一次评估的结果"""
+    names = routes + ['无']
+    size = len(names)
+    total = len(main_route)
+
+    distribution = np.bincount(main_route, minlength=size)
+    pairs = np.bincount(main_route * size + sub_route, minlength=size * size)
+
+    summary = {
+        'route_distribution': {names[i]: int(count) for i, count in enumerate(distribution) if count},
+        'direct_rate': round(float(is_direct.mean()), 4) if total else 0.0,
+        'route_pairs': {f'{names[i // size]}→{names[i % size]}': int(count) for i, count in enumerate(pairs) if count}
+    }
+    if baseline_main is not None:
+        summary['changed_rate'] = round(float((main_route != baseline_main).mean()), 4) if total else 0.0
+    return summary
+
+
+def _init_worker(scores_file):
+    """子进程初始化：以只读内存映射方式打开维度得分，并计算基准主路线"""
+    scores = np.load(scores_file, mmap_mode='r')
+    routes = route_list(DEFAULT_WEIGHTS, DEFAULT_GATES)
+    _SHARED['scores'] = scores
+    _SHARED['baseline_main'] = evaluate(scores, routes, DEFAULT_WEIGHTS, DEFAULT_GATES)[0]
+
+
+def _evaluate_chunk(configs):
+    """子进程任务：评估一批配置"""
+    scores = _SHARED['scores']
+    results = []
+    for overrides in configs:
+        weights, gates = apply_overrides(overrides)
+        routes = route_list(weights, gates)
+        main_route, sub_route, is_direct = evaluate(scores, routes, weights, gates)
+        summary = summarize(routes, main_route, sub_route, is_direct, _SHARED['baseline_main'])
+        summary['overrides'] = overrides
+        results.append(summary)
+    return results
+
+
+def simulate(scores, configs, workers=1):
+    """
+    评估全部候选配置（可多进程并行），按输入顺序返回结果
+
+    维度得分写入临时 .npy 文件，子进程以内存映射方式只读共享，不复制数据。
+    """
+    chunks = chunked(list(configs), CONFIGS_PER_TASK)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        scores_file = Path(tmp_dir) / 'scores.npy'
+        np.save(scores_file, scores)
+
+        if workers <= 1 or len(chunks) <= 1:
+            _init_worker(scores_file)
+            batches = [_evaluate_chunk(chunk) for chunk in chunks]
+            _SHARED.clear()
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_init_worker,
+                                     initargs=(scores_file,)) as executor:
+                batches = list(executor.map(_evaluate_chunk, chunks))
+
+    return [result for batch in batches for result in batch]
+
+
+def format_distribution(distribution, total):
+    """路线分布的简短文本"""
+    return ', '.join(f'{route} {count / total * 100:.1f}%' for route, count in sorted(distribution.items()))
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='用历史答题数据模拟候选权重和关口阈值')
+    parser.add_argument('--config', help='候选配置JSON文件：[{参数名: 取值}, ...]')
+    parser.add_argument('--grid', action='append', default=[], help='网格参数，如 "T5.GO>=:60,70,75"（可重复）')
+    parser.add_argument('--random', type=int, default=0, help='随机搜索的配置数')
+    parser.add_argument('--jitter', type=int, default=5, help='随机搜索时权重和阈值的扰动幅度（默认5）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认0）')
+    parser.add_argument('--workers', type=int, default=1, help='并行进程数（默认1）')
+    parser.add_argument('--top', type=int, default=10, help='打印路线变化最大的前N个配置（默认10）')
+    parser.add_argument('--output', help='把全部结果写入JSON文件')
+
+    args = parser.parse_args()
+
+    configs = []
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            configs.extend(json.load(f))
+    if args.grid:
+        configs.extend(grid_configs(args.grid))
+    if args.random:
+        configs.extend(random_configs(args.random, args.jitter, args.seed))
+    if not configs:
+        parser.error('请通过 --config、--grid 或 --random 提供候选配置')
+
+    for overrides in configs:
+        apply_overrides(overrides)  # 提前校验参数名
+
+    print('📁 加载历史答题数据...')
+    scores = load_corpus_scores(workers=args.workers)
+    if not len(scores):
+        print('⚠️ 没有包含答题记录的数据，退出')
+        return
+    print(f'  - 有答题记录的数据: {len(scores)} 条')
+
+    routes = route_list(DEFAULT_WEIGHTS, DEFAULT_GATES)
+    baseline = summarize(routes, *evaluate(scores, routes, DEFAULT_WEIGHTS, DEFAULT_GATES))
+    print('\n📏 当前规则:')
+    print(f'  - 路线分布: {format_distribution(baseline["route_distribution"], len(scores))}')
+    print(f'  - 直达比例: {baseline["direct_rate"] * 100:.1f}%')
+
+    print(f'\n🧪 评估 {len(configs)} 个候选配置...')
+    results = simulate(scores, configs, workers=args.workers)
+
+    print(f'\n📊 路线变化最大的 {min(args.top, len(results))} 个配置:')
+    for result in sorted(results, key=lambda r: r['changed_rate'], reverse=True)[:args.top]:
+        overrides = ', '.join(f'{name}{value:g}' if name[-1] in '<>=' else f'{name}={value:g}'
+                              for name, value in result['overrides'].items())
+        print(f'  - 变化 {result["changed_rate"] * 100:.1f}% | 直达 {result["direct_rate"] * 100:.1f}% | '
+              f'{format_distribution(result["route_distribution"], len(scores))}')
+        print(f'      {overrides if len(overrides) <= 200 else overrides[:200] + "..."}')
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'total': len(scores), 'baseline': baseline, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f'\n✅ 模拟结果已保存: {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+每日分位数草图
+每天一个可合并的固定分桶直方图：8个维度得分各一个、完成时长（分钟）一个，
+保存在 data/sketches/YYYY-MM-DD.json。任意日期范围的 p50/p90/p99 由几个小文件相加得到，
+不需要重新读取原始数据；每个直方图的桶数有上限，与提交数量无关。
+
+分桶方式:
+  - 维度得分：宽度0.1的线性分桶。得分由 app.js 保留一位小数，因此分桶是精确的
+  - 完成时长：对数分桶，相邻桶边界相差2%，分位数的相对误差不超过1%
+
+用法:
+  python scripts/sketches.py --rebuild
+  python scripts/sketches.py --since 2025-01-01 --until 2025-02-01
+"""
+
+import argparse
+import json
+import math
+from collections import Counter
+from datetime import date
+
+import instrumentation
+from data_loader import DATA_DIR, DIMENSIONS
+
+SKETCH_DIR = DATA_DIR / 'sketches'
+
+# 维度得分的分桶宽度
+SCORE_BIN_WIDTH = 0.1
+
+# 完成时长对数分桶的相邻边界比值（相对误差 (GAMMA - 1) / (GAMMA + 1) ≈ 1%）
+GAMMA = 1.02
+
+# 对数分桶的最小值（1秒），更小的完成时长都记入同一个桶
+MIN_MINUTES = 1 / 60
+
+QUANTILES = [0.5, 0.9, 0.99]
+
+
+class Histogram:
+    """
+    可合并的固定分桶直方图
+
+    bins 为 {桶编号: 次数}，只保存非空的桶；同时精确记录总数、总和、最小值和最大值。
+    linear 为等宽分桶（编号 = round(值 / 宽度)），log 为对数分桶（编号 = ceil(log_γ 值)）。
+    """
+
+    def __init__(self, scale='linear'):
+        self.scale = scale
+        self.bins = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def bin_index(self, value):
+        """值所在的桶编号"""
+        if self.scale == 'linear':
+            return round(value / SCORE_BIN_WIDTH)
+        return math.ceil(math.log(max(value, MIN_MINUTES), GAMMA))
+
+    def bin_value(self, index):
+        """桶的代表值（对数分桶取使相对误差最小的点）"""
+        if self.scale == 'linear':
+            return round(index * SCORE_BIN_WIDTH, 1)
+        return 2 * GAMMA ** index / (GAMMA + 1)
+
+    def add(self, value, weight=1):
+        """加入一个值（weight 为重复次数）"""
+        self.bins[self.bin_index(value)] += weight
+        self.count += weight
+        self.total += value * weight
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        """合并另一个同类直方图"""
+        self.bins.update(other.bins)
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        return self
+
+    def quantile(self, q):
+        """
+        估计分位数（与pandas相同的线性插值，插值点取桶的代表值，结果限制在最小值和最大值之间）
+        """
+        if not self.count:
+            return None
+
+        position = (self.count - 1) * q
+        lower_rank = math.floor(position)
+        upper_rank = math.ceil(position)
+        lower_value = upper_value = None
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if lower_value is None and seen > lower_rank:
+                lower_value = self.bin_value(index)
+            if seen > upper_rank:
+                upper_value = self.bin_value(index)
+                break
+
+        value = lower_value + (upper_value - lower_value) * (position - lower_rank)
+        return min(max(value, self.min), self.max)
+
+    def describe(self):
+        """统计量：样本数、平均值、最小值、最大值和各分位数"""
+        if not self.count:
+            return None
+        stats = {
+            'count': self.count,
+            'average': round(self.total / self.count, 2),
+            'min': round(self.min, 2),
+            'max': round(self.max, 2)
+        }
+        for q in QUANTILES:
+            stats[f'p{round(q * 100)}'] = round(self.quantile(q), 2)
+        return stats
+
+    def to_dict(self):
+        """导出为可JSON序列化的字典"""
+        return {
+            'scale': self.scale,
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'bins': {str(index): count for index, count in sorted(self.bins.items())}
+        }
+
+    @classmethod
+    def from_dict(cls, raw):
+        """从字典恢复"""
+        histogram = cls(raw['scale'])
+        histogram.bins.update({int(index): count for index, count in raw['bins'].items()})
+        histogram.count = raw['count']
+        histogram.total = raw['total']
+        histogram.min = raw['min']
+        histogram.max = raw['max']
+        return histogram
+
+
+class DaySketch:
+    """一天（或合并后的一段时间）的草图：各维度得分和完成时长的直方图"""
+
+    def __init__(self):
+        self.dimensions = {dim: Histogram('linear') for dim in DIMENSIONS}
+        self.completion_minutes = Histogram('log')
+
+    def add(self, record):
+        """累加一条测试数据（Submission）"""
+        for dim, score in record.iter_scores():
+            self.dimensions[dim].add(score)
+        if record.completion_time is not None:
+            self.completion_minutes.add(record.completion_time / 1000 / 60)
+
+    def merge(self, other):
+        """合并另一份草图"""
+        for dim, histogram in other.dimensions.items():
+            self.dimensions[dim].merge(histogram)
+        self.completion_minutes.merge(other.completion_minutes)
+        return self
+
+    def describe(self):
+        """{'dimensions': {维度: 统计量}, 'completion_minutes': 统计量}，没有数据的项省略"""
+        dimensions = {dim: histogram.describe() for dim, histogram in self.dimensions.items() if histogram.count}
+        return {'dimensions': dimensions, 'completion_minutes': self.completion_minutes.describe()}
+
+    def to_dict(self):
+        """导出为可JSON序列化的字典（空直方图省略）"""
+        return {
+            'dimensions': {dim: histogram.to_dict() for dim, histogram in self.dimensions.items() if histogram.count},
+            'completion_minutes': self.completion_minutes.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, raw):
+        """从字典恢复"""
+        sketch = cls()
+        for dim, histogram in raw['dimensions'].items():
+            sketch.dimensions[dim] = Histogram.from_dict(histogram)
+        sketch.completion_minutes = Histogram.from_dict(raw['completion_minutes'])
+        return sketch
+
+
+def sketch_file(day, sketch_dir=SKETCH_DIR):
+    """某一天的草图文件"""
+    return sketch_dir / f'{day}.json'
+
+
+def build_day_sketches(records):
+    """按提交日期累加草图，返回 {日期YYYY-MM-DD: DaySketch}"""
+    sketches = {}
+    for record in records:
+        sketch = sketches.get(record.date)
+        if sketch is None:
+            sketch = sketches[record.date] = DaySketch()
+        sketch.add(record)
+    return sketches
+
+
+def load_day_sketch(day, sketch_dir=SKETCH_DIR):
+    """读取某一天的草图，不存在时返回None"""
+    path = sketch_file(day, sketch_dir)
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return DaySketch.from_dict(json.load(f))
+
+
+def save_day_sketches(sketches, sketch_dir=SKETCH_DIR):
+    """保存 {日期: DaySketch}"""
+    sketch_dir.mkdir(parents=True, exist_ok=True)
+    for day, sketch in sketches.items():
+        with open(sketch_file(day, sketch_dir), 'w', encoding='utf-8') as f:
+            json.dump(sketch.to_dict(), f, ensure_ascii=False, separators=(',', ':'))
+
+
+def add_records(records, sketch_dir=SKETCH_DIR):
+    """把新数据累加进已保存的每日草图（只读写涉及的日期），返回涉及的日期数"""
+    sketches = build_day_sketches(records)
+    for day, sketch in sketches.items():
+        existing = load_day_sketch(day, sketch_dir)
+        if existing is not None:
+            sketch.merge(existing)
+    save_day_sketches(sketches, sketch_dir)
+    return len(sketches)
+
+
+def rebuild_sketches(records, sketch_dir=SKETCH_DIR):
+    """
+    从全部数据重建每日草图，返回天数
+
+    只覆盖数据中出现的日期；原始数据已被清理的日期保留原有草图，历史分位数不会丢失。
+    """
+    sketches = build_day_sketches(records)
+    save_day_sketches(sketches, sketch_dir)
+    return len(sketches)
+
+
+def iter_sketch_days(since=None, until=None, sketch_dir=SKETCH_DIR):
+    """按日期顺序列出 [since, until) 内已有草图的日期"""
+    if not sketch_dir.exists():
+        return []
+    days = []
+    for path in sorted(sketch_dir.glob('*.json')):
+        try:
+            day = date.fromisoformat(path.stem)
+        except ValueError:
+            continue
+        if (since and day < since) or (until and day >= until):
+            continue
+        days.append(day)
+    return days
+
+
+def merge_range(since=None, until=None, sketch_dir=SKETCH_DIR):
+    """合并 [since, until) 内每天的草图，返回 (DaySketch, 天数)"""
+    merged = DaySketch()
+    days = iter_sketch_days(since, until, sketch_dir)
+    for day in days:
+        merged.merge(load_day_sketch(day.isoformat(), sketch_dir))
+    return merged, len(days)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='每日分位数草图')
+    parser.add_argument('--rebuild', action='store_true', help='从全部数据重建每日草图')
+    parser.add_argument('--since', help='起始日期 YYYY-MM-DD（包含）')
+    parser.add_argument('--until', help='结束日期 YYYY-MM-DD（不包含）')
+    parser.add_argument('--workers', type=int, default=1, help='重建时并行读取数据的进程数（默认1）')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    with instrumentation.run('sketches', args):
+        if args.rebuild:
+            from data_loader import load_submissions
+
+            records = load_submissions(workers=args.workers)
+            with instrumentation.stage('write'):
+                days = rebuild_sketches(records)
+            print(f'✅ 已重建 {days} 天的草图（{len(records)} 条数据）')
+
+        since = date.fromisoformat(args.since) if args.since else None
+        until = date.fromisoformat(args.until) if args.until else None
+        with instrumentation.stage('aggregate'):
+            sketch, days = merge_range(since, until)
+            stats = sketch.describe()
+
+        print(f'\n📐 {args.since or "最早"} ~ {args.until or "最新"}（{days} 天）:')
+        for dim, dim_stats in stats['dimensions'].items():
+            print(f'  - {dim}: p50 {dim_stats["p50"]} | p90 {dim_stats["p90"]} | p99 {dim_stats["p99"]} '
+                  f'（{dim_stats["count"]} 条）')
+        minutes = stats['completion_minutes']
+        if minutes:
+            print(f'  - 完成时长(分钟): p50 {minutes["p50"]} | p90 {minutes["p90"]} | p99 {minutes["p99"]} '
+                  f'（{minutes["count"]} 条）')
+
+
+if __name__ == '__main__':
+    main()
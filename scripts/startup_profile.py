@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+启动耗时分析
+在子进程中用 python -X importtime 导入脚本模块，打印各模块的导入耗时
+"""
+
+import os
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+
+
+def parse_importtime(stderr):
+    """
+    解析 -X importtime 输出
+
+    Returns:
+        [(自身耗时us, 累计耗时us, 模块名, 嵌套层级), ...]
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        entries.append((int(self_us), int(cumulative_us), name.strip(), depth))
+    return entries
+
+
+def measure_imports(module_name):
+    """在全新解释器中导入模块，返回解析后的导入耗时"""
+    import subprocess
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(SCRIPTS_DIR), env.get('PYTHONPATH')]))
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+        capture_output=True, text=True, env=env
+    )
+    if completed.returncode != 0:
+        print(completed.stderr.splitlines()[-1] if completed.stderr else '导入失败')
+    return parse_importtime(completed.stderr)
+
+
+def profile_startup(module_name, top=15):
+    """打印模块导入耗时明细（类似 -X importtime，按累计耗时排序）"""
+    entries = measure_imports(module_name)
+    if not entries:
+        print('⚠️ 没有获取到导入耗时数据')
+        return
+
+    # 输出中子模块先于父模块出现：目标模块之前、层级为1的条目就是它的直接导入
+    target_index = next((i for i, entry in enumerate(entries) if entry[2] == module_name and entry[3] == 0), None)
+    if target_index is None:
+        print(f'⚠️ 没有找到模块 {module_name} 的导入记录')
+        return
+
+    start_index = target_index
+    while start_index > 0 and entries[start_index - 1][3] > 0:
+        start_index -= 1
+
+    target = entries[target_index]
+    module_entries = entries[start_index:target_index + 1]
+    direct = [entry for entry in module_entries if entry[3] == 1]
+
+    print(f'⏱️ 启动导入耗时: {module_name}')
+    print(f'  - 总计: {target[1] / 1000:.1f} ms（自身 {target[0] / 1000:.1f} ms）')
+
+    print('\n📦 直接导入（累计耗时）:')
+    for _, cumulative, name, _ in sorted(direct, key=lambda e: e[1], reverse=True)[:top]:
+        print(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+    print('\n🐢 单个模块自身耗时最多:')
+    for self_us, _, name, _ in sorted(module_entries, key=lambda e: e[0], reverse=True)[:top]:
+        print(f'  {self_us / 1000:8.1f} ms  {name}')
@@ -1,13 +1,46 @@
 #!/usr/bin/env python3
 """
 测试和验证GitHub Actions数据收集系统
+
+用法:
+  python scripts/test_system.py                        # 检查文件、配置和依赖
+  python scripts/test_system.py --perf                 # 性能回归测试，与基准文件比较耗时和峰值内存
+  python scripts/test_system.py --perf --update-baseline
 """
 
+import argparse
+import importlib.util
 import json
+import platform
+import shutil
 import sys
 import os
+import tempfile
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
+
+# pip包名与导入名不同的包
+MODULE_NAMES = {
+    'pyyaml': 'yaml'
+}
+
+PERF_BASELINE = Path(__file__).resolve().parent / 'perf_baseline.json'
+
+# 性能测试的固定语料：随机种子固定，截止到当天UTC零点（每日报表统计最近7天），
+# 每次生成的数据除日期整体平移外完全相同
+PERF_CORPUS = {'count': 5000, 'days': 90, 'seed': 0}
+
+# 性能测试依次运行的步骤 (名称, 参数)：导入、汇总、每日报表、Excel导出
+PERF_STEPS = [
+    ('ingest_batch', ['corpus.ndjson']),
+    ('update_summary', ['--rebuild']),
+    ('generate_daily_report', ['--force']),
+    ('export_to_excel', ['--force'])
+]
+
+# 比例容差之外再允许的绝对波动，避免很短的步骤因计时抖动误报
+TIME_SLACK_SECONDS = 0.1
+MEMORY_SLACK_MB = 5
 
 class SystemTester:
     def __init__(self):
@@ -141,24 +174,27 @@ class SystemTester:
             'pyyaml': 'YAML验证（可选）'
         }
 
+        # 只检查是否已安装，不实际导入（避免加载pandas/matplotlib的开销）
+        def is_installed(package):
+            module_name = MODULE_NAMES.get(package, package)
+            return importlib.util.find_spec(module_name) is not None
+
         # 必需包
         for package, desc in required_packages.items():
-            try:
-                __import__(package)
+            if is_installed(package):
                 print(f'  ✅ {package} - {desc}')
                 self.tests_passed += 1
-            except ImportError:
+            else:
                 print(f'  ❌ {package} - 未安装 ({desc})')
                 self.tests_failed += 1
                 self.warnings.append(f'安装命令: pip install {package}')
 
         # 可选包
         for package, desc in optional_packages.items():
-            try:
-                __import__(package)
+            if is_installed(package):
                 print(f'  ✅ {package} - {desc}')
                 self.tests_passed += 1
-            except ImportError:
+            else:
                 print(f'  ⚠️ {package} - 未安装 ({desc})')
                 self.warnings.append(f'可选安装: pip install {package}')
 
@@ -218,6 +254,92 @@ class SystemTester:
             print(f'  ❌ 模拟测试失败: {e}')
             self.tests_failed += 1
 
+    def test_compaction_roundtrip(self):
+        """压缩往返测试：sample_results 写入列式分区再读出，汇总统计不变"""
+        print('\n🗜️ 测试列式压缩往返...')
+
+        sys.path.insert(0, str(Path(__file__).resolve().parent))
+        try:
+            from columnar_store import columns_to_records, read_partition, records_to_columns, write_partition
+            from records import decode_records
+            from update_summary import calculate_statistics
+        except ImportError as e:
+            print(f'  ⚠️ 跳过（缺少依赖: {e}）')
+            self.warnings.append(f'列式压缩往返测试未运行: {e}')
+            return
+
+        samples = []
+        for sample_file in sorted(Path('sample_results').glob('*.json')):
+            with open(sample_file, 'r', encoding='utf-8') as f:
+                samples.append(json.load(f))
+        if not samples:
+            print('  ⚠️ sample_results 中没有示例数据')
+            return
+
+        # 放不进列的取值（超过3题的答案、超出int8的取值、非数字或null的每周时长）要原样保留
+        odd = json.loads(json.dumps(samples[0]))
+        odd_answers = odd.setdefault('answers', {})
+        odd_answers.update({'TB': [1, 2, 3, 4], 'LS': [300, 1, 2], 'B1': 5, 'hours_per_week': 'abc'})
+        odd_null = json.loads(json.dumps(odd))
+        odd_null['answers'].update({'TB': [0, 0, 0], 'hours_per_week': None})
+        odd_null.setdefault('usageStats', {})['completionTime'] = 'n/a'
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            partition_file = Path(tmp_dir) / '2025-11.npz'
+            write_partition(partition_file, records_to_columns(samples))
+            restored = list(columns_to_records(read_partition(partition_file)))
+            write_partition(partition_file, records_to_columns([odd, odd_null]))
+            restored_odd = list(columns_to_records(read_partition(partition_file)))
+
+        for original, back in zip([odd, odd_null], restored_odd):
+            if back.get('answers') != original['answers'] or \
+                    back.get('usageStats', {}).get('completionTime') != original.get('usageStats', {}).get('completionTime'):
+                print(f'  ❌ 异常取值压缩后发生变化: {original["answers"]} -> {back.get("answers")}')
+                self.tests_failed += 1
+                return
+
+        def summary(records):
+            stats = calculate_statistics(decode_records(records))
+            stats.pop('last_updated', None)
+            return stats
+
+        before, after = summary(samples), summary(restored)
+        if before == after:
+            print(f'  ✅ {len(samples)} 条示例数据压缩前后汇总一致（路线分布 {after.get("route_distribution")}）')
+            self.tests_passed += 1
+        else:
+            changed = sorted(key for key in set(before) | set(after) if before.get(key) != after.get(key))
+            print(f'  ❌ 压缩前后汇总不一致: {", ".join(changed)}')
+            self.tests_failed += 1
+
+    def test_scoring_edge_cases(self):
+        """评分边界测试：与 app.js 的 calculateDimensionScores 一致"""
+        print('\n🧮 测试评分边界情况...')
+
+        sys.path.insert(0, str(Path(__file__).resolve().parent))
+        try:
+            from scoring import DIMENSION_INDEX, answer_matrix, dimension_scores
+        except ImportError as e:
+            print(f'  ⚠️ 跳过（缺少依赖: {e}）')
+            self.warnings.append(f'评分边界测试未运行: {e}')
+            return
+
+        base = {'TB': [4, 5, 3], 'LS': [3, 4, 4], 'TI': [4, 4, 4]}
+        cases = [
+            # JS 只在恰好3个答案时计分，否则该维度为undefined
+            ('答案超过3个时不计分', {**base, 'TB': [4, 5, 3, 2]}, 'TB', None),
+            # null !== undefined，且 null <= 2 成立
+            ('hours_per_week 为 null 时 TI=10', {**base, 'hours_per_week': None}, 'TI', 10),
+        ]
+        for label, answers, dim, expected in cases:
+            score = dimension_scores(*answer_matrix([{'answers': answers}]))[0, DIMENSION_INDEX[dim]]
+            if (expected is None and score != score) or score == expected:
+                print(f'  ✅ {label}')
+                self.tests_passed += 1
+            else:
+                print(f'  ❌ {label}: {dim} = {score}')
+                self.tests_failed += 1
+
     def generate_report(self):
         """生成测试报告"""
         print('\n' + '=' * 60)
@@ -245,8 +367,207 @@ class SystemTester:
             print('⚠️ 存在问题，请先修复再部署')
             return 1
 
+class PerformanceTester:
+    """
+    性能回归测试
+
+    在临时目录中用固定语料依次运行导入、汇总、报表和导出，
+    每个步骤取多次运行中的最好成绩，与提交在仓库中的基准文件比较耗时和峰值内存。
+    """
+
+    def __init__(self, baseline_file=PERF_BASELINE, time_tolerance=0.3, memory_tolerance=0.15, repeat=3):
+        self.baseline_file = Path(baseline_file)
+        self.time_tolerance = time_tolerance
+        self.memory_tolerance = memory_tolerance
+        self.repeat = repeat
+        self.results = {}
+        self.failed_steps = []
+
+    def write_corpus(self, corpus_file):
+        """把固定语料写成NDJSON（导入脚本的输入）"""
+        from generate_synthetic_data import generate_payloads
+
+        end = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        payloads = generate_payloads(PERF_CORPUS['count'], PERF_CORPUS['days'], end, PERF_CORPUS['seed'])
+        with open(corpus_file, 'w', encoding='utf-8') as f:
+            for data in payloads:
+                f.write(json.dumps(data, ensure_ascii=False) + '\n')
+
+    def run_once(self, corpus_file):
+        """在新的临时目录中运行一遍全部步骤，返回 {步骤: 测量结果}"""
+        from benchmark import run_script
+
+        work_dir = tempfile.mkdtemp(prefix='perf_')
+        shutil.copy(corpus_file, Path(work_dir) / 'corpus.ndjson')
+        results = {}
+        for name, args in PERF_STEPS:
+            # 先把前面步骤写入的文件落盘，避免回写占用本步骤的计时
+            os.sync()
+            result = run_script(name, args, work_dir)
+            results[name] = result
+            if result['exit_code'] != 0:
+                print(f'  ❌ {name} 退出码 {result["exit_code"]}，日志: {result["log"]}')
+                return results
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return results
+
+    def run(self):
+        """运行 repeat 遍，每个步骤保留最短耗时和最小峰值内存"""
+        print(f'\n⏱️ 性能测试（{PERF_CORPUS["count"]} 条固定语料，每步取 {self.repeat} 次中的最好成绩）...')
+        corpus_dir = tempfile.mkdtemp(prefix='perf_corpus_')
+        corpus_file = Path(corpus_dir) / 'corpus.ndjson'
+        try:
+            self.write_corpus(corpus_file)
+            for attempt in range(self.repeat):
+                results = self.run_once(corpus_file)
+                for name, result in results.items():
+                    if result['exit_code'] != 0:
+                        self.failed_steps.append(name)
+                        return
+                    best = self.results.setdefault(name, {'wall_seconds': result['wall_seconds'],
+                                                          'peak_rss_mb': result['peak_rss_mb']})
+                    best['wall_seconds'] = min(best['wall_seconds'], result['wall_seconds'])
+                    best['peak_rss_mb'] = min(best['peak_rss_mb'], result['peak_rss_mb'])
+                print(f'  ✅ 第 {attempt + 1} 遍: ' +
+                      ', '.join(f'{name} {result["wall_seconds"]:.2f} s' for name, result in results.items()))
+        finally:
+            shutil.rmtree(corpus_dir, ignore_errors=True)
+
+    def load_baseline(self):
+        """读取基准文件，不存在时返回None"""
+        if not self.baseline_file.exists():
+            return None
+        with open(self.baseline_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_baseline(self):
+        """把本次结果写为新的基准"""
+        baseline = {
+            'generated_at': datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'corpus': PERF_CORPUS,
+            'steps': self.results
+        }
+        with open(self.baseline_file, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f'\n✅ 性能基准已更新: {self.baseline_file}')
+
+    def check(self, current, baseline, tolerance, slack):
+        """比较一个指标，返回 (变化比例, 状态)"""
+        if baseline is None or current is None:
+            return None, '⚠️ 无基准'
+        change = (current - baseline) / baseline if baseline else 0.0
+        if current > baseline * (1 + tolerance) + slack:
+            return change, '❌ 回退'
+        if current < baseline * (1 - tolerance) - slack:
+            return change, '🚀 变快'
+        return change, '✅'
+
+    def compare(self, baseline):
+        """
+        与基准比较，返回 (表格行, 是否回退)
+
+        某个指标超过 基准 × (1 + 容差) + 绝对余量 时判为回退；明显优于基准时提示更新基准。
+        """
+        rows = []
+        regressed = False
+        for name, _ in PERF_STEPS:
+            current = self.results.get(name, {})
+            expected = baseline['steps'].get(name, {})
+            for metric, unit, tolerance, slack in (
+                ('wall_seconds', 's', self.time_tolerance, TIME_SLACK_SECONDS),
+                ('peak_rss_mb', 'MB', self.memory_tolerance, MEMORY_SLACK_MB)
+            ):
+                change, status = self.check(current.get(metric), expected.get(metric), tolerance, slack)
+                regressed = regressed or status.startswith('❌')
+                rows.append({
+                    'step': name,
+                    'metric': f'{"耗时" if metric == "wall_seconds" else "峰值内存"}({unit})',
+                    'baseline': expected.get(metric),
+                    'current': current.get(metric),
+                    'change': change,
+                    'tolerance': tolerance,
+                    'status': status
+                })
+        return rows, regressed
+
+    def format_table(self, rows):
+        """把比较结果格式化为Markdown表格"""
+        lines = [
+            '| 步骤 | 指标 | 基准 | 本次 | 变化 | 容差 | 状态 |',
+            '| --- | --- | ---: | ---: | ---: | ---: | --- |'
+        ]
+        for row in rows:
+            baseline = 'N/A' if row['baseline'] is None else f'{row["baseline"]:.2f}'
+            current = 'N/A' if row['current'] is None else f'{row["current"]:.2f}'
+            change = 'N/A' if row['change'] is None else f'{row["change"]:+.1%}'
+            lines.append(f'| {row["step"]} | {row["metric"]} | {baseline} | {current} | {change} | '
+                         f'±{row["tolerance"]:.0%} | {row["status"]} |')
+        return '\n'.join(lines)
+
+    def generate_report(self, report_file=None, update_baseline=False):
+        """比较并输出结果，返回退出码（有步骤失败或回退时为1）"""
+        if self.failed_steps:
+            print(f'\n❌ 步骤 {self.failed_steps[0]} 运行失败，无法比较性能')
+            return 1
+
+        if update_baseline:
+            self.save_baseline()
+            return 0
+
+        baseline = self.load_baseline()
+        if baseline is None:
+            print(f'\n⚠️ 基准文件不存在: {self.baseline_file}，请先运行 --perf --update-baseline')
+            return 1
+        if baseline.get('corpus') != PERF_CORPUS:
+            print('\n⚠️ 基准文件的语料与当前不同，请用 --perf --update-baseline 重新生成基准')
+            return 1
+
+        rows, regressed = self.compare(baseline)
+        table = self.format_table(rows)
+        print(f'\n📊 与基准比较（{baseline["python"]}，{baseline["cpu_count"]} 核，{baseline["generated_at"][:10]}）:\n')
+        print(table)
+
+        if report_file:
+            report_file = Path(report_file)
+            report_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(report_file, 'w', encoding='utf-8') as f:
+                f.write(f'# 性能回归测试\n\n- 时间: {datetime.now().isoformat()}\n'
+                        f'- 语料: {PERF_CORPUS["count"]} 条（种子 {PERF_CORPUS["seed"]}，{PERF_CORPUS["days"]} 天）\n'
+                        f'- 基准: {self.baseline_file.name}（{baseline["generated_at"]}）\n\n{table}\n')
+            print(f'\n💾 比较结果已保存: {report_file}')
+
+        if regressed:
+            print('\n❌ 性能回退，超出容差的指标见上表')
+            return 1
+        if any(row['status'].startswith('🚀') for row in rows):
+            print('\n🚀 部分指标明显优于基准，可运行 --perf --update-baseline 更新基准')
+        print('\n🎉 性能测试通过！')
+        return 0
+
 def main():
     """主函数"""
+    parser = argparse.ArgumentParser(description='GitHub Actions数据收集系统验证工具')
+    parser.add_argument('--perf', action='store_true', help='运行性能回归测试，与基准文件比较耗时和峰值内存')
+    parser.add_argument('--baseline', default=str(PERF_BASELINE), help='性能基准文件（默认 scripts/perf_baseline.json）')
+    parser.add_argument('--update-baseline', action='store_true', help='把本次性能测试结果写为新的基准')
+    parser.add_argument('--time-tolerance', type=float, default=0.3, help='允许的耗时增长比例（默认0.3，即30%%）')
+    parser.add_argument('--memory-tolerance', type=float, default=0.15, help='允许的峰值内存增长比例（默认0.15）')
+    parser.add_argument('--repeat', type=int, default=3, help='性能测试的运行次数，每步取最好成绩（默认3）')
+    parser.add_argument('--report', default='perf_report.md', help='比较结果表格的输出文件（默认 perf_report.md）')
+
+    args = parser.parse_args()
+
+    if args.perf:
+        print('⏱️ 性能回归测试')
+        print('=' * 60)
+        tester = PerformanceTester(args.baseline, args.time_tolerance, args.memory_tolerance, args.repeat)
+        tester.run()
+        sys.exit(tester.generate_report(args.report, args.update_baseline))
+
     print('🔍 GitHub Actions数据收集系统验证工具')
     print('=' * 60)
 
@@ -259,6 +580,8 @@ def main():
     tester.test_frontend_files()
     tester.test_python_dependencies()
     tester.test_data_simulation()
+    tester.test_compaction_roundtrip()
+    tester.test_scoring_edge_cases()
 
     # 生成报告
     exit_code = tester.generate_report()
@@ -2,112 +2,394 @@
 """
 更新汇总统计
 每次有新数据提交时自动运行
+
+用法:
+  python scripts/update_summary.py data/raw/test_xxx.json   # 增量累加新文件（未通过校验的移到 data/quarantine）
+  python scripts/update_summary.py --rebuild                # 全量重建并校验增量结果
+  python scripts/update_summary.py --rebuild --sql          # 在SQLite查询库中聚合
 """
 
+import argparse
 import json
 import os
 from datetime import datetime
 from pathlib import Path
 from collections import Counter, defaultdict
 
+import cube
+import instrumentation
+import sketches
+from data_loader import (DATA_DIR, iter_compacted_records, iter_test_files, load_submissions,
+                         map_file_chunks, read_submission)
+from quarantine import quarantine_invalid_files
+from records import decode_records
+from startup_profile import profile_startup
+
+STATE_FILE = DATA_DIR / 'summary_state.json'
+
+# 已被清理的数据的永久累加状态（cleanup_old_data 删除文件前写入）
+ARCHIVE_STATE_FILE = DATA_DIR / 'archive' / 'summary_state.json'
+
 def load_all_test_data():
     """加载所有测试数据"""
-    data_dir = Path('data/raw')
-    all_data = []
+    return load_submissions()
 
-    if not data_dir.exists():
-        return all_data
+class SummaryState:
+    """
+    汇总统计的累加状态
 
-    for json_file in data_dir.glob('test_*.json'):
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                all_data.append(data)
-        except Exception as e:
-            print(f"⚠️ 读取文件失败 {json_file}: {e}")
+    保存路线/设备计数、各维度得分总和与样本数、每日计数和首末时间戳，
+    每条新数据都以O(1)代价累加进来，无需重新扫描全部文件。
 
-    return all_data
+    folded_files 记录已累加的原始文件（路径），同一文件再次传入时跳过，不会重复计数；
+    已不存在（被压缩或清理）的文件在保存前移除，集合大小只与当前原始文件数有关。
+    """
+
+    def __init__(self):
+        self.total_tests = 0
+        self.first_test_date = None
+        self.last_test_date = None
+        self.route_counts = Counter()
+        self.device_counts = Counter()
+        self.dimension_sums = defaultdict(float)
+        self.dimension_counts = defaultdict(int)
+        self.daily_counts = defaultdict(int)
+        self.folded_files = set()
+
+    def add(self, record):
+        """累加一条测试数据（Submission）"""
+        timestamp = record.timestamp
+        self.total_tests += 1
+        if self.first_test_date is None or timestamp < self.first_test_date:
+            self.first_test_date = timestamp
+        if self.last_test_date is None or timestamp > self.last_test_date:
+            self.last_test_date = timestamp
+
+        if record.main_route is not None:
+            self.route_counts[record.main_route] += 1
+
+        for dim, score in record.iter_scores():
+            self.dimension_sums[dim] += score
+            self.dimension_counts[dim] += 1
+
+        if record.device_type is not None:
+            self.device_counts[record.device_type] += 1
+
+        self.daily_counts[record.date] += 1
+
+    def merge(self, other):
+        """合并另一份累加状态（用于并行计算后的汇总）"""
+        self.total_tests += other.total_tests
+        for timestamp in (other.first_test_date, other.last_test_date):
+            if timestamp is None:
+                continue
+            if self.first_test_date is None or timestamp < self.first_test_date:
+                self.first_test_date = timestamp
+            if self.last_test_date is None or timestamp > self.last_test_date:
+                self.last_test_date = timestamp
+
+        self.route_counts.update(other.route_counts)
+        self.device_counts.update(other.device_counts)
+        for dim, total in other.dimension_sums.items():
+            self.dimension_sums[dim] += total
+        for dim, count in other.dimension_counts.items():
+            self.dimension_counts[dim] += count
+        for day, count in other.daily_counts.items():
+            self.daily_counts[day] += count
+        return self
+
+    def to_dict(self):
+        """导出为可JSON序列化的状态"""
+        return {
+            'total_tests': self.total_tests,
+            'first_test_date': self.first_test_date,
+            'last_test_date': self.last_test_date,
+            'route_counts': dict(self.route_counts),
+            'device_counts': dict(self.device_counts),
+            'dimension_sums': dict(self.dimension_sums),
+            'dimension_counts': dict(self.dimension_counts),
+            'daily_counts': dict(self.daily_counts),
+            'folded_files': sorted(self.folded_files)
+        }
+
+    @classmethod
+    def from_dict(cls, raw):
+        """从状态文件内容恢复"""
+        state = cls()
+        state.total_tests = raw['total_tests']
+        state.first_test_date = raw['first_test_date']
+        state.last_test_date = raw['last_test_date']
+        state.route_counts.update(raw['route_counts'])
+        state.device_counts.update(raw['device_counts'])
+        state.dimension_sums.update(raw['dimension_sums'])
+        state.dimension_counts.update(raw['dimension_counts'])
+        state.daily_counts.update(raw['daily_counts'])
+        state.folded_files.update(raw.get('folded_files', []))
+        return state
+
+    def prune_folded_files(self):
+        """移除已不存在的原始文件的记录"""
+        self.folded_files = {path for path in self.folded_files if Path(path).exists()}
+
+    def to_summary(self):
+        """生成 summary.json 的内容"""
+        if not self.total_tests:
+            return {
+                'total_tests': 0,
+                'last_updated': datetime.now().isoformat()
+            }
 
-def calculate_statistics(all_data):
-    """计算统计数据"""
-    if not all_data:
         return {
-            'total_tests': 0,
-            'last_updated': datetime.now().isoformat()
+            'total_tests': self.total_tests,
+            'last_updated': datetime.now().isoformat(),
+            'first_test_date': self.first_test_date,
+            'last_test_date': self.last_test_date,
+            'route_distribution': dict(self.route_counts),
+            'dimension_averages': {
+                dim: round(total / self.dimension_counts[dim], 2)
+                for dim, total in self.dimension_sums.items()
+            },
+            'device_distribution': dict(self.device_counts),
+            'daily_counts': dict(sorted(self.daily_counts.items())),
+            'estimated_completion_rate': '95%'  # 基于实际完成测试的数据
         }
 
-    # 基础统计
-    stats = {
-        'total_tests': len(all_data),
-        'last_updated': datetime.now().isoformat(),
-        'first_test_date': min(d['timestamp'] for d in all_data),
-        'last_test_date': max(d['timestamp'] for d in all_data)
-    }
-
-    # 路线分布统计
-    main_routes = [d['result']['mainRoute'] for d in all_data if 'result' in d]
-    stats['route_distribution'] = dict(Counter(main_routes))
-
-    # 维度得分统计
-    dimension_scores = defaultdict(list)
-    for data in all_data:
-        if 'dimensionScores' in data:
-            for dim, score in data['dimensionScores'].items():
-                dimension_scores[dim].append(score)
-
-    stats['dimension_averages'] = {
-        dim: round(sum(scores) / len(scores), 2)
-        for dim, scores in dimension_scores.items()
-    }
-
-    # 设备类型统计
-    device_types = [d['metadata']['deviceType'] for d in all_data if 'metadata' in d]
-    stats['device_distribution'] = dict(Counter(device_types))
-
-    # 每日统计
-    daily_counts = defaultdict(int)
-    for data in all_data:
-        date_str = data['timestamp'][:10]  # 提取日期部分 YYYY-MM-DD
-        daily_counts[date_str] += 1
-
-    stats['daily_counts'] = dict(sorted(daily_counts.items()))
-
-    # 完成率统计（估算）
-    stats['estimated_completion_rate'] = '95%'  # 基于实际完成测试的数据
-
-    return stats
-
-def save_summary(stats):
-    """保存汇总统计"""
+def calculate_statistics(all_data):
+    """计算统计数据"""
+    state = SummaryState()
+    for record in all_data:
+        state.add(record)
+    return state.to_summary()
+
+def load_state(state_file=STATE_FILE):
+    """读取累加状态，不存在时返回None"""
+    if not state_file.exists():
+        return None
+
+    try:
+        with open(state_file, 'r', encoding='utf-8') as f:
+            return SummaryState.from_dict(json.load(f))
+    except Exception as e:
+        print(f"⚠️ 读取状态文件失败 {state_file}: {e}")
+        return None
+
+def save_state(state, state_file=STATE_FILE):
+    """保存累加状态（先写临时文件再替换，中途中断不会留下不完整的状态文件）"""
+    state_file.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_file = state_file.with_name(state_file.name + '.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state.to_dict(), f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, state_file)
+
+def merge_archived(state):
+    """把已清理数据的归档状态合并进全量计算的结果"""
+    archived = load_state(ARCHIVE_STATE_FILE)
+    if archived is not None:
+        state.merge(archived)
+    return state
+
+class Aggregates:
+    """
+    全量重建的全部结果：累加状态、每日分位数草图和计数立方体
+
+    一次遍历同时累加三者，并行时各进程返回局部结果再按文件顺序合并。
+    """
+
+    def __init__(self):
+        self.state = SummaryState()
+        self.sketches = {}
+        self.cube = cube.Cube()
+
+    def add(self, record):
+        """累加一条测试数据（Submission）"""
+        self.state.add(record)
+        sketch = self.sketches.get(record.date)
+        if sketch is None:
+            sketch = self.sketches[record.date] = sketches.DaySketch()
+        sketch.add(record)
+        self.cube.add(record)
+
+    def merge(self, other):
+        """合并另一份局部结果"""
+        self.state.merge(other.state)
+        for day, sketch in other.sketches.items():
+            self.sketches.setdefault(day, sketches.DaySketch()).merge(sketch)
+        self.cube.merge(other.cube)
+        return self
+
+    def save_derived(self):
+        """保存每日草图和计数立方体（只替换数据中出现的日期），返回 (天数, 格子数)"""
+        sketches.save_day_sketches(self.sketches)
+        return len(self.sketches), len(cube.replace_days(self.cube).cells)
+
+def _aggregate_chunk(files):
+    """子进程任务：读取一块文件并计算局部结果"""
+    aggregates = Aggregates()
+    for json_file in files:
+        record = read_submission(json_file)
+        if record is not None:
+            aggregates.add(record)
+    return aggregates
+
+def rebuild_aggregates(workers=1):
+    """
+    从全部原始数据一次遍历重新计算累加状态、每日草图和计数立方体（状态包含已清理数据的归档状态）
+
+    Args:
+        workers: 大于1时多进程并行读取，各进程的局部结果按文件顺序合并
+    """
+    aggregates = Aggregates()
+    if workers <= 1:
+        records = load_all_test_data()
+        with instrumentation.stage('aggregate'):
+            for record in records:
+                aggregates.add(record)
+    else:
+        # 并行时读取和累加都在子进程中完成
+        with instrumentation.stage('aggregate'):
+            for partial in map_file_chunks(_aggregate_chunk, iter_test_files(), workers):
+                aggregates.merge(partial)
+            for record in decode_records(iter_compacted_records()):
+                aggregates.add(record)
+    merge_archived(aggregates.state)
+    aggregates.state.folded_files = current_raw_files()
+    return aggregates
+
+def current_raw_files():
+    """当前全部原始文件的路径（全量重建后都视为已累加）"""
+    return {json_file.as_posix() for json_file in iter_test_files()}
+
+def rebuild_state(workers=1):
+    """从全部原始数据重新计算累加状态（包含已清理数据的归档状态）"""
+    return rebuild_aggregates(workers).state
+
+def fold_files(state, files):
+    """把新的测试数据文件累加到已有状态（已累加过的文件跳过），返回累加的 Submission 列表"""
+    folded = []
+    skipped = 0
+    with instrumentation.stage('aggregate'):
+        for json_file in files:
+            path = Path(json_file).as_posix()
+            if path in state.folded_files:
+                skipped += 1
+                continue
+            record = read_submission(json_file)
+            if record is None:
+                continue
+            state.add(record)
+            state.folded_files.add(path)
+            folded.append(record)
+    if skipped:
+        print(f'♻️ 跳过已累加的文件: {skipped} 个')
+    instrumentation.count('folded_records', len(folded))
+    return folded
+
+def aggregates_from_store(workers=1):
+    """同步SQLite查询库后用SQL分组统计出累加状态、每日草图和计数立方体，不读取原始数据"""
+    import query_store
+    from data_loader import DIMENSIONS
+
+    aggregates = Aggregates()
+    with query_store.open_store(workers=workers, sync_first=False) as conn:
+        with instrumentation.stage('load'):
+            query_store.sync(conn, workers=workers)
+        with instrumentation.stage('aggregate'):
+            aggregates.state = merge_archived(SummaryState.from_dict(query_store.summary_state(conn)))
+
+            def day_sketch(day):
+                return aggregates.sketches.setdefault(day, sketches.DaySketch())
+
+            for dim, column in zip(DIMENSIONS, query_store.SCORE_COLUMNS):
+                for day, score, count in query_store.day_value_counts(conn, column):
+                    day_sketch(day).dimensions[dim].add(score, count)
+            for day, milliseconds, count in query_store.day_value_counts(conn, 'completion_time'):
+                day_sketch(day).completion_minutes.add(milliseconds / 1000 / 60, count)
+
+            for *values, count in query_store.group_counts(conn, cube.AXES):
+                values[cube.AXES.index('is_direct')] = bool(values[cube.AXES.index('is_direct')])
+                aggregates.cube.add_cell(values, count)
+    aggregates.state.folded_files = current_raw_files()
+    return aggregates
+
+def compare_summaries(expected, actual):
+    """比较两份汇总统计，返回不一致的字段"""
+    ignored = {'last_updated'}
+    keys = (set(expected) | set(actual)) - ignored
+    return sorted(key for key in keys if expected.get(key) != actual.get(key))
+
+def save_summary(stats, quiet=False):
+    """保存汇总统计（quiet为True时不打印）"""
     summary_file = Path('data/summary.json')
     summary_file.parent.mkdir(parents=True, exist_ok=True)
 
     with open(summary_file, 'w', encoding='utf-8') as f:
         json.dump(stats, f, ensure_ascii=False, indent=2)
 
-    print(f'✅ 汇总统计已更新: {stats["total_tests"]} 条测试数据')
+    if not quiet:
+        print(f'✅ 汇总统计已更新: {stats["total_tests"]} 条测试数据')
 
 def main():
     """主函数"""
-    print('📊 开始更新汇总统计...')
+    parser = argparse.ArgumentParser(description='更新汇总统计')
+    parser.add_argument('files', nargs='*', help='新增的测试数据文件（增量累加）')
+    parser.add_argument('--rebuild', action='store_true', help='从全部原始数据重新计算，并与增量结果对比')
+    parser.add_argument('--workers', type=int, default=1, help='全量重建时的并行进程数（默认1）')
+    parser.add_argument('--sql', action='store_true', help='全量计算时改用SQLite查询库聚合（先增量同步查询库）')
+    parser.add_argument('--profile-startup', action='store_true', help='打印模块导入耗时后退出')
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        profile_startup('update_summary')
+        return
+
+    with instrumentation.run('update_summary', args):
+        print('📊 开始更新汇总统计...')
+
+        state = None if args.rebuild else load_state()
+
+        if state is not None and args.files:
+            # 增量模式：只累加通过校验的新文件
+            folded = fold_files(state, quarantine_invalid_files(args.files))
+            state.prune_folded_files()
+            print(f'➕ 已增量累加 {len(folded)} 条数据')
+            with instrumentation.stage('write'):
+                sketches.add_records(folded)
+                cube.add_records(folded)
+        else:
+            previous = load_state() if args.rebuild else None
+            # 累加状态、每日草图和计数立方体在同一次遍历（或同一批SQL统计）中得到
+            aggregates = aggregates_from_store(args.workers) if args.sql else rebuild_aggregates(args.workers)
+            state = aggregates.state
+            print(f'📁 已加载 {state.total_tests} 条数据')
+
+            if previous is not None:
+                mismatched = compare_summaries(state.to_summary(), previous.to_summary())
+                if mismatched:
+                    print(f'⚠️ 增量结果与全量重建不一致: {", ".join(mismatched)}')
+                else:
+                    print('✅ 增量结果与全量重建一致')
 
-    # 加载所有数据
-    all_data = load_all_test_data()
-    print(f'📁 已加载 {len(all_data)} 条数据')
+            with instrumentation.stage('write'):
+                days, cells = aggregates.save_derived()
+            print(f'📐 已更新 {days} 天的分位数草图，计数立方体共 {cells} 个格子')
 
-    # 计算统计
-    stats = calculate_statistics(all_data)
+        stats = state.to_summary()
 
-    # 保存结果
-    save_summary(stats)
+        # 保存结果
+        with instrumentation.stage('write'):
+            save_state(state)
+            save_summary(stats)
 
-    # 打印关键指标
-    print('\n📈 关键指标:')
-    print(f'  - 总测试数: {stats["total_tests"]}')
-    if stats['total_tests'] > 0:
-        print(f'  - 路线分布: {stats["route_distribution"]}')
-        print(f'  - 设备分布: {stats["device_distribution"]}')
-        print(f'  - 每日平均: {len(all_data) / max(len(stats["daily_counts"]), 1):.1f} 次')
+        # 打印关键指标
+        print('\n📈 关键指标:')
+        print(f'  - 总测试数: {stats["total_tests"]}')
+        if stats['total_tests'] > 0:
+            print(f'  - 路线分布: {stats["route_distribution"]}')
+            print(f'  - 设备分布: {stats["device_distribution"]}')
+            print(f'  - 每日平均: {stats["total_tests"] / max(len(stats["daily_counts"]), 1):.1f} 次')
 
 if __name__ == '__main__':
     main()